@@ -0,0 +1,91 @@
+"""
+Benchmark specialized compile functions against the interpretive compiler.
+
+Builds a few typical selects and compiles each of them with the default
+compiler, the :class:`~lessql.expr.cache.StatementCache` and the
+:class:`~lessql.expr.codegen.CodegenCompiler`. The cache and the code
+generating compiler are warmed up first, which means the time reported for them
+is the time of a hit. New trees with different parameter values are built
+before timing, since that is how applications use them.
+
+Run from the repository root using::
+
+    python -m benchmarks.bench_codegen
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from lessql.expr import (
+    And, CodegenCompiler, In, Or, StatementCache, compile, state_factory)
+from lessql.expr.query import Column, Select, Table
+
+
+def by_id(i):
+    return Select(
+        columns=[Column(u"id"), Column(u"name"), Column(u"email")],
+        tables=[Table(u"users")],
+        where=Column(u"id") == i)
+
+
+def search(i):
+    return Select(
+        columns=[Column(u"id"), Column(u"name")],
+        tables=[Table(u"users")],
+        where=And(
+            Column(u"name") == u"user{}".format(i),
+            Column(u"age") > 18,
+            Or(Column(u"active") == True, Column(u"admin") == True)),
+        order_by=[Column(u"name")],
+        limit=10)
+
+
+def in_list(i):
+    return Select(
+        columns=[Column(u"id")],
+        tables=[Table(u"orders")],
+        where=And(
+            In(Column(u"user_id"), [i, i + 1, i + 2, i + 3, i + 4]),
+            Column(u"total") >= 100))
+
+
+def bench(compiler, trees, number):
+    def run():
+        for tree in trees:
+            compiler(tree, state_factory())
+
+    seconds = min(timeit.repeat(run, number=number, repeat=5))
+    return seconds / (number * len(trees)) * 1e6
+
+
+def main():
+    count, number = 100, 20
+
+    print(u"{:<10} {:>12} {:>12} {:>12} {:>8}".format(
+        u"", u"compile us", u"cache us", u"codegen us", u"speedup"))
+
+    for factory in [by_id, search, in_list]:
+        trees = [factory(i) for i in range(count)]
+
+        cache = StatementCache()
+        codegen = CodegenCompiler()
+        for compiler in [cache, codegen]:
+            compiler(factory(-1), state_factory())
+
+        for tree in trees:
+            expected = state_factory()
+            actual = state_factory()
+            assert compile(tree, expected) == codegen(tree, actual)
+            assert expected.parameters == actual.parameters
+
+        interpretive = bench(compile, trees, number)
+        cached = bench(cache, trees, number)
+        generated = bench(codegen, trees, number)
+        print(u"{:<10} {:>12.2f} {:>12.2f} {:>12.2f} {:>7.2f}x".format(
+            factory.__name__, interpretive, cached, generated,
+            interpretive / generated))
+
+
+if __name__ == "__main__":
+    main()
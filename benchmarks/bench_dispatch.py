@@ -0,0 +1,122 @@
+"""
+Benchmark rule dispatch in :class:`lessql.expr.base.Compiler`.
+
+Resolves the rule for every node of a large ``WHERE`` tree, and compiles the
+tree, once using the memoized class lookup and once using a plain method
+resolution order walk for every node. The time spent per node is reported for
+both.
+
+Run from the repository root using::
+
+    python -m benchmarks.bench_dispatch
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from lessql.expr import And, Equal, Or, compile
+from lessql.utils import ClassDict, get_class
+
+
+class UncachedClassDict(ClassDict):
+    """
+    ClassDict that inspects the key and walks the method resolution order on
+    every lookup, like ClassDict did before lookups were memoized.
+    """
+
+    def resolve(self, cls):
+        for parent in get_class(cls).__mro__:
+            if parent in self.data:
+                return self.data[parent]
+        raise KeyError(cls.__name__)
+
+
+class Forgetful(dict):
+    """
+    Dispatch table that never remembers anything, which forces the compiler to
+    resolve the rule of every node.
+    """
+
+    def __setitem__(self, key, value):
+        pass
+
+
+def where_tree(width, depth):
+    """
+    Return a tree of ``width`` ORs of ``depth`` ANDs of equality comparisons.
+    The returned tree contains ``width * depth * 3 + width + 1`` nodes.
+    """
+
+    return Or(*[
+        And(*[Equal(i, j) for j in range(depth)])
+        for i in range(width)])
+
+
+def node_classes(expr):
+    """
+    Return the class of every node in the tree in the order they are compiled.
+    """
+
+    if isinstance(expr, (And, Or)):
+        classes = [expr.__class__]
+        for e in expr.exprs:
+            classes.extend(node_classes(e))
+        return classes
+    return [expr.__class__, expr.left.__class__, expr.right.__class__]
+
+
+def bench(func, nodes, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    return seconds / nodes * 1e9
+
+
+def bench_lookup(rules, classes, number):
+    resolve = rules.resolve
+
+    def lookup():
+        for cls in classes:
+            resolve(cls)
+
+    return bench(lookup, len(classes), number)
+
+
+def bench_compile(expr, nodes, number):
+    return bench(lambda: compile(expr), nodes, number)
+
+
+def main():
+    width, depth, number = 50, 20, 20
+    expr = where_tree(width, depth)
+    nodes = width * depth * 3 + width + 1
+
+    classes = node_classes(expr)
+    assert len(classes) == nodes
+
+    rules = compile._map
+    uncached_rules = UncachedClassDict(rules.data)
+
+    results = [
+        (u"rule lookup", bench_lookup(uncached_rules, classes, number),
+            bench_lookup(rules, classes, number)),
+    ]
+
+    cached = bench_compile(expr, nodes, number)
+    dispatch = compile._dispatch
+    compile._map, compile._dispatch = uncached_rules, Forgetful()
+    try:
+        uncached = bench_compile(expr, nodes, number)
+    finally:
+        compile._map, compile._dispatch = rules, dispatch
+    results.append((u"compile", uncached, cached))
+
+    print(u"WHERE tree with {} nodes (ns/node)".format(nodes))
+    print(u"{:<12} {:>10} {:>10} {:>8}".format(
+        u"", u"uncached", u"cached", u"speedup"))
+    for name, uncached, cached in results:
+        print(u"{:<12} {:>10.1f} {:>10.1f} {:>7.2f}x".format(
+            name, uncached, cached, uncached / cached))
+
+
+if __name__ == "__main__":
+    main()
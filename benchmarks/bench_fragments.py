@@ -0,0 +1,155 @@
+"""
+Benchmark fragment output against nested string formatting.
+
+Rules that return parts let the compiler write every fragment to one list that
+is joined once. Before that, rules formatted the compiled SQL of their children
+into new strings, which means the SQL of deep sub-trees was copied once per
+level. This compares both approaches on a large query.
+
+Run from the repository root using::
+
+    python -m benchmarks.bench_fragments
+"""
+
+from __future__ import print_function
+
+import timeit
+
+from lessql.expr import (
+    And, Add, BinaryOperator, ComparableOperator, Compiler, Equal, Function,
+    Max, Multiply, Or, Select, UnaryOperator, compile)
+from lessql.expr.query import Column, Table
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def string_compiler():
+    """
+    Return a compiler where rules format the SQL of their children into
+    strings, like the default compiler did before rules returned parts.
+    """
+
+    legacy = Compiler()
+    for cls, rule in compile._map.items():
+        legacy.when(cls)(rule)
+
+    @legacy.when(UnaryOperator)
+    def compile_unary_operator(compile, expr, state):
+        return u"{}{}".format(expr.operator, compile(expr.operand, state))
+
+    @legacy.when(BinaryOperator)
+    def compile_binary_operator(compile, expr, state):
+        left = compile(expr.left, state)
+        right = compile(expr.right, state)
+
+        return u"{} {} {}".format(left, expr.operator, right)
+
+    @legacy.when(Equal)
+    def compile_equal(compile, expr, state):
+        new_expr = BinaryOperator(expr.left, expr.right)
+        new_expr.operator = "="
+
+        return compile(new_expr, state)
+
+    @legacy.when(ComparableOperator)
+    def compile_comparable_operator(compile, expr, state):
+        return u" {} ".format(expr.operator).join(
+            compile(e, state) for e in expr.exprs)
+
+    @legacy.when(Function)
+    def compile_function(compile, expr, state):
+        return u"{}({})".format(expr.name, u", ".join(
+            compile(arg, state) for arg in expr.args))
+
+    @legacy.when(Select)
+    def compile_select(compile, expr, state):
+        tokens = [u"SELECT"]
+        tokens.append(u", ".join(compile(col, state) for col in expr.columns))
+        tokens.append(u"FROM")
+        tokens.append(u", ".join(compile(t, state) for t in expr.tables))
+        tokens.append(u"WHERE")
+        tokens.append(compile(expr.where, state))
+        return u" ".join(tokens)
+
+    return legacy
+
+
+def large_select(width, depth):
+    """
+    Return a select of ``width`` columns and a where clause of ``width``
+    comparisons that each contain arithmetic ``depth`` levels deep.
+    """
+
+    def arithmetic(i):
+        expr = Column(u"c{}".format(i))
+        for j in range(depth):
+            expr = Multiply(Add(expr, j), 2)
+        return expr
+
+    return Select(
+        columns=[Max(Column(u"c{}".format(i)), i) for i in range(width)],
+        tables=[Table(u"t")],
+        where=Or(*[
+            And(Equal(arithmetic(i), i), Column(u"c{}".format(i)) > 0)
+            for i in range(width)]))
+
+
+def copied_characters(compiler, expr):
+    """
+    Return the number of characters in all strings returned by rules, which is
+    a measure of how much SQL is copied before the final result is produced.
+    """
+
+    counting = Compiler()
+    total = [0]
+
+    def wrap(rule):
+        def counting_rule(compile, expr, state):
+            compiled = rule(compile, expr, state)
+            if not isinstance(compiled, list):
+                total[0] += len(compiled)
+            return compiled
+        return counting_rule
+
+    for cls, rule in compiler._map.items():
+        counting.when(cls)(wrap(rule))
+
+    sql = counting(expr)
+    return total[0] + len(sql)
+
+
+def peak_memory(compiler, expr):
+    if tracemalloc is None:
+        return None
+
+    tracemalloc.start()
+    try:
+        compiler(expr)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    expr = large_select(200, 20)
+    compilers = [(u"strings", string_compiler()), (u"fragments", compile)]
+
+    assert compilers[0][1](expr) == compile(expr)
+
+    print(u"SELECT with {} characters of SQL".format(len(compile(expr))))
+    print(u"{:<10} {:>10} {:>16} {:>12}".format(
+        u"", u"ms", u"chars copied", u"peak KiB"))
+    for name, compiler in compilers:
+        ms = min(timeit.repeat(
+            lambda: compiler(expr), number=10, repeat=5)) / 10 * 1e3
+        peak = peak_memory(compiler, expr)
+        print(u"{:<10} {:>10.2f} {:>16} {:>12}".format(
+            name, ms, copied_characters(compiler, expr),
+            u"n/a" if peak is None else u"{:.1f}".format(peak / 1024.0)))
+
+
+if __name__ == "__main__":
+    main()
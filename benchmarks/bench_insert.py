@@ -0,0 +1,83 @@
+"""
+Benchmark bulk inserts against an in-memory sqlite3 database.
+
+Compares inserting rows one statement at a time, with ``executemany`` of an
+insert template, and as multi-row inserts split to respect SQLite's parameter
+limit. Results are reported as rows per second.
+
+Run from the repository root using::
+
+    python -m benchmarks.bench_insert [rows]
+"""
+
+from __future__ import print_function
+
+import sqlite3
+import sys
+import timeit
+
+from lessql.connection import Connection
+from lessql.expr.dialects import sqlite
+from lessql.expr.query import Insert
+
+
+columns = [u"id", u"name", u"score"]
+
+
+def make_rows(count):
+    return [(i, u"name{}".format(i), i * 2) for i in range(count)]
+
+
+def connect():
+    conn = Connection(sqlite3.connect(":memory:"), sqlite)
+    conn.execute_sql(u"CREATE TABLE t (id INTEGER, name TEXT, score INTEGER)")
+    return conn
+
+
+def single_rows(conn, rows):
+    for row in rows:
+        conn.execute(Insert(u"t", columns, [row]))
+
+
+def executemany(conn, rows):
+    conn.executemany(Insert(u"t", columns), rows)
+
+
+def multi_row(conn, rows):
+    conn.insert(Insert(u"t", columns, iter(rows)))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    count = int(argv[0]) if argv else 10000
+    rows = make_rows(count)
+
+    print(u"Inserting {} rows".format(count))
+    print(u"{:<12} {:>10} {:>14} {:>10}".format(
+        u"", u"ms", u"rows/s", u"prepares"))
+    for name, func in [
+            (u"single", single_rows),
+            (u"executemany", executemany),
+            (u"multi-row", multi_row)]:
+        timings = []
+        for _ in range(3):
+            conn = connect()
+            start = timeit.default_timer()
+            func(conn, rows)
+            conn.commit()
+            timings.append(timeit.default_timer() - start)
+
+            # Don't count the CREATE TABLE statement
+            prepares = conn.statements.prepares - 1
+
+            inserted = conn.execute_sql(u"SELECT COUNT(*) FROM t").fetchone()
+            assert inserted == (count,)
+            conn.close()
+
+        seconds = min(timings)
+        print(u"{:<12} {:>10.2f} {:>14,.0f} {:>10}".format(
+            name, seconds * 1e3, count / seconds, prepares))
+
+
+if __name__ == "__main__":
+    main()
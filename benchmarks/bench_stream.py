@@ -0,0 +1,143 @@
+"""
+Benchmark streaming a large table from sqlite3 against fetching all rows.
+
+Rows are read from a temporary database file using :meth:`Connection.stream`
+and using ``fetchall()``. Streaming keeps peak memory flat regardless of the
+number of rows, while ``fetchall()`` grows with it. Peak memory is measured
+using ``tracemalloc`` where available.
+
+Run from the repository root using::
+
+    python -m benchmarks.bench_stream [rows]
+"""
+
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import timeit
+
+from lessql.connection import Connection
+from lessql.expr.dialects import sqlite
+from lessql.expr.query import Column, Select, Table
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def create_database(path, count):
+    conn = sqlite3.connect(path)
+    conn.execute(u"CREATE TABLE t (id INTEGER, name TEXT)")
+    conn.execute(
+        u"INSERT INTO t "
+        u"WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c "
+        u"WHERE x < ?) SELECT x, 'name' || x FROM c", (count,))
+    conn.commit()
+    conn.close()
+
+
+def stream(conn, expr):
+    count = 0
+    for _ in conn.stream(expr, batch_size=1000):
+        count += 1
+    return count
+
+
+def fetchall(conn, expr):
+    return len(conn.execute(expr).fetchall())
+
+
+def measure(func):
+    """
+    Run the given function and return its result, the number of seconds it
+    took and its peak memory use in bytes. Without ``tracemalloc`` the function
+    runs in a child process and the growth of its maximum resident set size is
+    reported instead.
+    """
+
+    if tracemalloc is None:
+        return measure_rss(func)
+
+    tracemalloc.start()
+    try:
+        start = timeit.default_timer()
+        result = func()
+        seconds = timeit.default_timer() - start
+        return result, seconds, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure_rss(func):
+    if resource is None:
+        start = timeit.default_timer()
+        result = func()
+        return result, timeit.default_timer() - start, None
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = timeit.default_timer()
+        result = func()
+        seconds = timeit.default_timer() - start
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        os.write(write, json.dumps(
+            [result, seconds, (after - before) * 1024]).encode("ascii"))
+        os._exit(0)
+
+    os.close(write)
+    chunks = []
+    while True:
+        chunk = os.read(read, 4096)
+        if not chunk:
+            break
+        chunks.append(chunk)
+    os.close(read)
+    os.waitpid(pid, 0)
+    return tuple(json.loads(b"".join(chunks).decode("ascii")))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    counts = [int(arg) for arg in argv] or [10000, 100000, 1000000]
+
+    expr = Select(
+        columns=[Column(u"id"), Column(u"name")], tables=[Table(u"t")])
+
+    print(u"{:<10} {:>10} {:>10} {:>14} {:>12}".format(
+        u"", u"rows", u"ms", u"rows/s", u"peak KiB"))
+
+    directory = tempfile.mkdtemp()
+    try:
+        for count in counts:
+            path = os.path.join(directory, u"{}.db".format(count))
+            create_database(path, count)
+            conn = Connection(sqlite3.connect(path), sqlite)
+
+            for name, func in [(u"stream", stream), (u"fetchall", fetchall)]:
+                rows, seconds, peak = measure(lambda: func(conn, expr))
+                assert rows == count
+                print(u"{:<10} {:>10} {:>10.1f} {:>14,.0f} {:>12}".format(
+                    name, count, seconds * 1e3, count / seconds,
+                    u"n/a" if peak is None else u"{:.1f}".format(
+                        peak / 1024.0)))
+            conn.close()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    main()
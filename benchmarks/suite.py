@@ -0,0 +1,259 @@
+"""
+Benchmark suite for the expression compiler.
+
+Every benchmark builds an expression tree once and measures how long it takes
+to compile it. Results are reported as time per compile, nodes compiled per
+second and peak memory allocated while compiling. Memory is measured using
+``tracemalloc`` where it is available. Python 2 has no ``tracemalloc``, and
+reports how much the first compile raises the peak resident set size of the
+process instead. That is coarser, and is zero when an earlier benchmark reached
+a higher peak.
+
+Results can be saved and compared against later runs to catch regressions::
+
+    python -m benchmarks --save before.json
+    python -m benchmarks --compare before.json
+
+``--compare`` exits with a non-zero status if any benchmark is slower than the
+saved one by more than ``--threshold``.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import sys
+import timeit
+
+from lessql.expr import (
+    And, Max, Min, Or, Select, Sqrt, StatementCache, compile)
+from lessql.expr.common import Expression, get_layout
+from lessql.expr.query import Column, Table
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+#: Registered benchmarks as ``(name, setup)`` tuples. Setup functions return an
+#: expression and a function that compiles it
+benchmarks = []
+
+
+def benchmark(func):
+    benchmarks.append((func.__name__, func))
+    return func
+
+
+def count_nodes(expr):
+    """
+    Return the number of nodes in the given expression tree, including leaf
+    values such as parameters.
+    """
+
+    nodes = 0
+    stack = [expr]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Expression):
+            nodes += 1
+            stack.extend(
+                getattr(item, name, None)
+                for name, literal in get_layout(item.__class__)
+                if not literal)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif item is not None:
+            nodes += 1
+    return nodes
+
+
+@benchmark
+def wide_select():
+    expr = Select(
+        columns=[Column(u"c{}".format(i), u"t") for i in range(1000)],
+        tables=[Table(u"t")])
+    return expr, compile
+
+
+@benchmark
+def deep_and_or():
+    expr = Column(u"a") == 0
+    for i in range(1, 2000):
+        cls = And if i % 2 else Or
+        expr = cls(expr, Column(u"a") == i)
+    return expr, compile
+
+
+@benchmark
+def wide_and_or():
+    expr = Or(*[
+        And(*[Column(u"c{}".format(j)) == i for j in range(10)])
+        for i in range(200)])
+    return expr, compile
+
+
+@benchmark
+def arithmetic_chain():
+    expr = Column(u"a")
+    for i in range(1000):
+        expr = (expr + i) * 2 - Column(u"b") / 3
+    return expr, compile
+
+
+@benchmark
+def literal_list():
+    expr = Select(
+        columns=list(range(2500)) + [u"s{}".format(i) for i in range(2500)])
+    return expr, compile
+
+
+@benchmark
+def function_calls():
+    expr = Select(columns=[
+        Max(Min(Column(u"a"), i), Sqrt(Column(u"b") * i))
+        for i in range(500)])
+    return expr, compile
+
+
+@benchmark
+def cached_select():
+    cache = StatementCache()
+    expr = Select(
+        columns=[Column(u"id"), Column(u"name")],
+        tables=[Table(u"users")],
+        where=And(Column(u"name") == u"foo", Column(u"age") > 18),
+        limit=10)
+    return expr, cache
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def peak_rss_growth(func):
+    if resource is None:
+        return None
+
+    # Linux reports kilobytes and macOS bytes
+    scale = 1 if sys.platform == "darwin" else 1024
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    func()
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) * scale
+
+
+def run(name, setup, repeat=5):
+    """
+    Run a single benchmark.
+
+    :return: Dict of results
+    """
+
+    expr, compiler = setup()
+    func = lambda: compiler(expr)
+
+    # Warm up dispatch tables and caches. Without tracemalloc, memory is
+    # measured on this compile, since the resident set size of the process
+    # rarely grows after the first one.
+    if tracemalloc is None:
+        peak = peak_rss_growth(func)
+    else:
+        func()
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange() if hasattr(timer, "autorange") else (10, None)
+    seconds = min(timer.repeat(number=number, repeat=repeat)) / number
+
+    if tracemalloc is not None:
+        peak = peak_memory(func)
+
+    nodes = count_nodes(expr)
+    return {
+        "name": name,
+        "nodes": nodes,
+        "seconds": seconds,
+        "nodes_per_second": nodes / seconds,
+        "peak_memory": peak,
+    }
+
+
+def format_result(result, baseline=None):
+    peak = result["peak_memory"]
+    line = u"{:<18} {:>7} {:>10.3f} {:>14,.0f} {:>10}".format(
+        result["name"],
+        result["nodes"],
+        result["seconds"] * 1e3,
+        result["nodes_per_second"],
+        u"n/a" if peak is None else u"{:.1f}".format(peak / 1024.0))
+
+    if baseline is not None:
+        line += u" {:>+8.1%}".format(
+            result["seconds"] / baseline["seconds"] - 1)
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "names", nargs="*", help="benchmarks to run, defaults to all")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of timing runs")
+    parser.add_argument(
+        "--save", metavar="FILE", help="save results as JSON")
+    parser.add_argument(
+        "--compare", metavar="FILE", help="compare with saved results")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1,
+        help="relative slowdown to report as a regression (default 0.1)")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if args.compare:
+        with open(args.compare) as fp:
+            baselines = {r["name"]: r for r in json.load(fp)}
+
+    print(u"{:<18} {:>7} {:>10} {:>14} {:>10}{}".format(
+        u"benchmark", u"nodes", u"ms", u"nodes/s", u"peak KiB",
+        u" {:>8}".format(u"change") if args.compare else u""))
+
+    results = []
+    regressions = []
+    for name, setup in benchmarks:
+        if args.names and name not in args.names:
+            continue
+
+        result = run(name, setup, args.repeat)
+        results.append(result)
+
+        baseline = baselines.get(name)
+        print(format_result(result, baseline))
+
+        if baseline is not None and \
+                result["seconds"] > baseline["seconds"] * (1 + args.threshold):
+            regressions.append(name)
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+    if regressions:
+        print(u"Regressions: {}".format(u", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,7 @@
+from .connection import *
 from .expr import *
+from .pool import *
+from .rows import *
 from .types import *
 
 __version__ = "0.1.0"
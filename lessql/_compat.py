@@ -8,6 +8,7 @@ from sys import version_info
 
 __all__ = [
     "ChainMap",
+    "MutableMapping",
     "is_python2",
     "add_metaclass",
     "rewrite_magic_methods",
@@ -26,6 +27,11 @@ try:
 except ImportError:
     from chainmap import ChainMap
 
+try:
+    from collections.abc import MutableMapping
+except ImportError:
+    from collections import MutableMapping
+
 
 is_python2 = version_info.major == 2
 
@@ -98,7 +104,6 @@ def rewrite_magic_methods(cls):
             delattr(cls, "__bytes__")
 
         if has_bool:
-            print cls_bool, parent_bool
             cls.__nonzero__ = cls_bool
             delattr(cls, "__bool__")
 
@@ -0,0 +1,165 @@
+"""
+LesSQL asyncio support
+----------------------
+:class:`AsyncDatabase` runs expressions on a :class:`~lessql.pool.Database`
+from asyncio code. Queries run in a bounded pool of threads, which means
+independent queries overlap rather than run one after another, while at most
+``max_in_flight`` queries run at the same time.
+
+.. code-block:: python
+
+    adb = AsyncDatabase(db)
+
+    async def handler(request):
+        users, orders = await asyncio.gather(
+            adb.fetch(Select(tables=[Table("users")])),
+            adb.fetch(Select(tables=[Table("orders")])))
+
+All methods return awaitable futures. Cancelling a future that has not started
+yet prevents the query from running. Cancelling a running query interrupts it
+if the driver supports that, using ``interrupt()`` for ``sqlite3`` or
+``cancel()`` for psycopg2.
+
+This module requires Python 3.4 or later.
+"""
+
+import threading
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+
+
+__all__ = [
+    "AsyncDatabase",
+]
+
+
+def interrupt(conn):
+    """
+    Abort the statement that is running on the given DB-API connection, if the
+    driver supports it.
+
+    :param conn: DB-API connection
+    :return: ``True`` if the driver supports interrupting statements
+    """
+
+    for name in ("interrupt", "cancel"):
+        method = getattr(conn, name, None)
+        if method is not None:
+            method()
+            return True
+    return False
+
+
+class AsyncDatabase(object):
+    """
+    Asyncio interface to a connection pool.
+
+    :param database: :class:`~lessql.pool.Database` to run queries on
+    :param max_in_flight: Maximum number of queries that run at the same time.
+                          Defaults to the ``max_size`` of the database, since
+                          more queries would only wait for connections.
+    :param executor: Executor to run queries in, instead of a thread pool of
+                     ``max_in_flight`` threads
+    """
+
+    def __init__(self, database, max_in_flight=None, executor=None):
+        if asyncio is None or ThreadPoolExecutor is None:
+            raise RuntimeError(u"AsyncDatabase requires asyncio")
+
+        if max_in_flight is None:
+            max_in_flight = database.max_size
+
+        self.database = database
+        self.max_in_flight = max_in_flight
+        self._own_executor = executor is None
+        self.executor = ThreadPoolExecutor(max_in_flight) \
+            if executor is None else executor
+
+    def _submit(self, func, expr):
+        lock = threading.Lock()
+        running = []
+        submitted = []
+
+        def run():
+            # Cancellation only reaches the executor once the event loop runs
+            # again, which may be after a worker has picked up the query
+            if submitted and submitted[0].cancelled():
+                return None
+
+            with self.database.connection() as conn:
+                with lock:
+                    running.append(conn)
+                try:
+                    return func(conn, expr)
+                finally:
+                    with lock:
+                        running.pop()
+
+        def on_done(future):
+            if future.cancelled():
+                with lock:
+                    if running:
+                        interrupt(running[0].connection)
+
+        future = asyncio.get_event_loop().run_in_executor(self.executor, run)
+        future.add_done_callback(on_done)
+        submitted.append(future)
+        return future
+
+    def execute(self, expr):
+        """
+        Execute an expression, such as an insert, and commit.
+
+        :param expr: Expression tree
+        :return: Future of the number of affected rows, as reported by the
+                 driver
+        """
+
+        return self._submit(_execute, expr)
+
+    def fetch(self, expr):
+        """
+        Execute an expression and fetch all rows.
+
+        :param expr: Expression tree
+        :return: Future of a list of rows
+        """
+
+        return self._submit(_fetch, expr)
+
+    def fetch_many(self, exprs):
+        """
+        Fetch the rows of many expressions concurrently.
+
+        :param exprs: Iterable of expression trees
+        :return: Future of a list with one list of rows per expression
+        """
+
+        return asyncio.gather(*[self.fetch(expr) for expr in exprs])
+
+    def close(self):
+        """
+        Shut down the executor if it was created by this object. Queries that
+        have been submitted run to completion.
+        """
+
+        if self._own_executor:
+            self.executor.shutdown(wait=True)
+
+
+def _execute(conn, expr):
+    return conn.execute(expr).rowcount
+
+def _fetch(conn, expr):
+    cursor = conn.execute(expr)
+    if cursor.description is None:
+        return []
+    return cursor.fetchall()
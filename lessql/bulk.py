@@ -0,0 +1,286 @@
+"""
+LesSQL bulk loading
+-------------------
+PostgreSQL's ``COPY ... FROM STDIN`` loads rows much faster than ``INSERT``.
+:class:`CopyEncoder` turns an iterable of rows into a ``COPY`` payload in text
+or binary format. Rows are encoded lazily into chunks of roughly
+``buffer_size`` bytes, which means generators of any length can be loaded with
+bounded memory.
+
+.. code-block:: python
+
+    encoder = CopyEncoder(u"users", [u"id", u"name"])
+    rows = ((i, u"user{}".format(i)) for i in range(10 ** 7))
+
+    # psycopg2
+    cursor.copy_expert(encoder.statement(), encoder.reader(rows))
+
+Values are handled like parameters by :func:`lessql.expr.types.compile_builtins`.
+``None`` is ``NULL``, booleans, integers and text are supported, and binary
+strings are ``bytea`` on Python 3. Other types raise :exc:`KeyError`, like they
+do when compiling.
+"""
+
+import struct
+
+from binascii import hexlify
+
+from ._compat import bstr, is_python2, longint, ustr
+from .utils import ClassDict
+
+
+__all__ = [
+    "CopyEncoder",
+    "CopyReader",
+]
+
+
+#: Header of the binary format: signature, flags and header extension length
+binary_header = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+
+#: Trailer of the binary format
+binary_trailer = struct.pack("!h", -1)
+
+
+# Text format
+_text_escapes = [
+    (u"\\", u"\\\\"),
+    (u"\n", u"\\n"),
+    (u"\r", u"\\r"),
+    (u"\t", u"\\t"),
+]
+
+def _escape_text(value):
+    for char, escaped in _text_escapes:
+        if char in value:
+            value = value.replace(char, escaped)
+    return value
+
+def _encode_text_int(value):
+    return ustr(int(value))
+
+def _encode_text_bool(value):
+    return u"t" if value else u"f"
+
+def _encode_text_bytea(value):
+    # The backslash of the hex format is escaped like any other
+    return u"\\\\x" + hexlify(value).decode("ascii")
+
+text_encoders = ClassDict({
+    int: _encode_text_int,
+    longint: _encode_text_int,
+    bool: _encode_text_bool,
+    ustr: _escape_text,
+})
+
+if is_python2:
+    # Python 2 strings are passed to the database as text
+    text_encoders[bstr] = lambda value: _escape_text(value.decode("utf-8"))
+else:
+    text_encoders[bstr] = _encode_text_bytea
+
+
+# Binary format. Integers are sent as bigint unless the column type is given
+_binary_types = {
+    u"int2": lambda value: struct.pack("!h", value),
+    u"int4": lambda value: struct.pack("!i", value),
+    u"int8": lambda value: struct.pack("!q", value),
+    u"bool": lambda value: b"\x01" if value else b"\x00",
+    u"text": lambda value: value.encode("utf-8") \
+        if isinstance(value, ustr) else value,
+    u"bytea": bytes,
+}
+
+binary_types = ClassDict({
+    int: u"int8",
+    longint: u"int8",
+    bool: u"bool",
+    ustr: u"text",
+    bstr: u"text" if is_python2 else u"bytea",
+})
+
+
+class CopyEncoder(object):
+    """
+    Encoder of rows into a PostgreSQL ``COPY FROM STDIN`` payload.
+
+    :param table: Name of the table to load into
+    :param columns: Names of the columns every row has a value for
+    :param format: ``"text"`` or ``"binary"``
+    :param types: Column types for the binary format, one of ``int2``,
+                  ``int4``, ``int8``, ``bool``, ``text`` or ``bytea`` per
+                  column. Types are derived from the values when not given,
+                  which means integers are sent as ``int8``.
+    :param buffer_size: Approximate size of the chunks that are produced
+    """
+
+    def __init__(
+            self, table, columns, format=u"text", types=None,
+            buffer_size=65536):
+        if format not in (u"text", u"binary"):
+            raise ValueError(u"Unknown COPY format '{}'".format(format))
+
+        if types is not None:
+            if len(types) != len(columns):
+                raise ValueError(u"Expected one type per column")
+            for type_ in types:
+                if type_ not in _binary_types:
+                    raise ValueError(u"Unknown type '{}'".format(type_))
+
+        self.table = table
+        self.columns = tuple(columns)
+        self.format = format
+        self.types = None if types is None else tuple(types)
+        self.buffer_size = buffer_size
+
+    def statement(self):
+        """
+        Return the ``COPY`` statement that reads this encoder's payload.
+        """
+
+        sql = u"COPY {} ({}) FROM STDIN".format(
+            self.table, u", ".join(self.columns))
+        if self.format == u"binary":
+            sql += u" WITH (FORMAT binary)"
+        return sql
+
+    def encode_row(self, row):
+        """
+        Return a single row encoded in this encoder's format.
+
+        :param row: Sequence of one value per column
+        :return: Encoded row as bytes
+        """
+
+        if len(row) != len(self.columns):
+            raise ValueError(u"Expected {} values, got {}".format(
+                len(self.columns), len(row)))
+
+        if self.format == u"text":
+            return self._encode_text_row(row)
+        return self._encode_binary_row(row)
+
+    def _encode_text_row(self, row):
+        fields = []
+        for value in row:
+            if value is None:
+                fields.append(u"\\N")
+            else:
+                fields.append(text_encoders.resolve(value.__class__)(value))
+        return (u"\t".join(fields) + u"\n").encode("utf-8")
+
+    def _encode_binary_row(self, row):
+        types = self.types
+        fields = [struct.pack("!h", len(row))]
+        for i, value in enumerate(row):
+            if value is None:
+                fields.append(struct.pack("!i", -1))
+                continue
+
+            if types is None:
+                type_ = binary_types.resolve(value.__class__)
+            else:
+                type_ = types[i]
+
+            data = _binary_types[type_](value)
+            fields.append(struct.pack("!i", len(data)))
+            fields.append(data)
+        return b"".join(fields)
+
+    def chunks(self, rows):
+        """
+        Encode the given rows lazily.
+
+        :param rows: Iterable of rows
+        :return: Iterator of byte strings of roughly :attr:`buffer_size` bytes,
+                 including header and trailer for the binary format
+        """
+
+        buffer_size = self.buffer_size
+        encode_row = self.encode_row
+
+        buf = []
+        size = 0
+        if self.format == u"binary":
+            buf.append(binary_header)
+            size = len(binary_header)
+
+        for row in rows:
+            data = encode_row(row)
+            buf.append(data)
+            size += len(data)
+
+            if size >= buffer_size:
+                yield b"".join(buf)
+                buf = []
+                size = 0
+
+        if self.format == u"binary":
+            buf.append(binary_trailer)
+
+        if buf:
+            yield b"".join(buf)
+
+    def reader(self, rows):
+        """
+        Return a file-like object with the payload for the given rows, as
+        expected by ``copy_expert`` of psycopg2.
+        """
+
+        return CopyReader(self.chunks(rows))
+
+    def __repr__(self):
+        return "{0.__class__.__name__}({0.table!r}, {0.columns!r}, " \
+            "format={0.format!r})".format(self)
+
+
+class CopyReader(object):
+    """
+    Read-only file-like object over an iterator of byte strings.
+
+    :param chunks: Iterable of byte strings
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        """
+        Read at most ``size`` bytes, or everything if ``size`` is negative.
+        Returns an empty byte string at the end of the payload.
+        """
+
+        if size is None or size < 0:
+            data = self._buffer + b"".join(self._chunks)
+            self._buffer = b""
+            return data
+
+        buf = self._buffer
+        while len(buf) < size:
+            try:
+                buf += next(self._chunks)
+            except StopIteration:
+                break
+
+        data, self._buffer = buf[:size], buf[size:]
+        return data
+
+    def readline(self, size=-1):
+        """
+        Read up to and including the next newline, which is how drivers read
+        the text format.
+        """
+
+        buf = self._buffer
+        while b"\n" not in buf:
+            try:
+                buf += next(self._chunks)
+            except StopIteration:
+                break
+
+        end = buf.find(b"\n") + 1 or len(buf)
+        if size is not None and 0 <= size < end:
+            end = size
+        data, self._buffer = buf[:end], buf[end:]
+        return data
@@ -0,0 +1,611 @@
+"""
+LesSQL connections
+------------------
+:class:`Connection` wraps a DB-API 2.0 connection and executes expression trees
+on it. Statements are tracked per connection in a bounded LRU, which means that
+a statement that is executed repeatedly is only prepared the first time.
+
+.. code-block:: python
+
+    import sqlite3
+
+    conn = Connection(sqlite3.connect(":memory:"))
+    cursor = conn.execute(Select(
+        columns=[Column("name")],
+        tables=[Table("users")],
+        where=Column("id") == 1))
+
+The DB-API has no notion of prepared statements. By default a statement is
+only its SQL text and the driver is left to reuse what it parsed, which
+``sqlite3`` does for as many statements as its ``cached_statements`` argument
+allows. It should be at least ``maxsize``:
+
+.. code-block:: python
+
+    conn = Connection(sqlite3.connect(path, cached_statements=64), maxsize=64)
+
+:class:`PostgresStatementManager` prepares statements explicitly using
+``PREPARE`` and deallocates them when they are evicted. Every execution gets a
+cursor of its own, which means results of one execution are never affected by
+another one.
+"""
+
+import re
+
+from collections import OrderedDict
+from timeit import default_timer
+
+from .expr.base import compile as default_compile, state_factory
+from .expr.cache import StatementCache
+from .expr.paramstyles import qmark
+from .expr.prepared import Prepared, prepare
+from .rows import row_type_for
+
+
+__all__ = [
+    "Connection",
+    "PostgresStatementManager",
+    "Result",
+    "StatementManager",
+]
+
+
+class StatementManager(object):
+    """
+    Bounded LRU of prepared statements for a single connection, keyed on SQL
+    text. When more than ``maxsize`` statements are prepared the least recently
+    used one is deallocated.
+
+    Statements are the SQL text by default, which relies on the driver caching
+    parsed statements. Subclasses prepare statements explicitly by overriding
+    :meth:`prepare`, :meth:`deallocate` and :meth:`run`.
+
+    :param connection: DB-API connection to prepare statements on
+    :param maxsize: Maximum number of statements to keep prepared
+    """
+
+    def __init__(self, connection, maxsize=64):
+        self.connection = connection
+        self.maxsize = maxsize
+
+        #: Number of executions that used an already prepared statement
+        self.hits = 0
+
+        #: Number of executions that had to prepare a statement
+        self.misses = 0
+
+        #: Number of statements deallocated to make room for new ones
+        self.evictions = 0
+
+        self._statements = OrderedDict()
+
+    @property
+    def prepares(self):
+        """
+        Number of statements that have been prepared.
+        """
+
+        return self.misses
+
+    @property
+    def hit_rate(self):
+        """
+        Fraction of executions that used an already prepared statement.
+        """
+
+        total = self.hits + self.misses
+        return self.hits / float(total) if total else 0.0
+
+    def prepare(self, sql):
+        """
+        Return a new prepared statement for the given SQL. Override to use
+        explicit preparation, such as PostgreSQL's ``PREPARE``.
+
+        :param sql: SQL text
+        :return: Statement object, the SQL text by default
+        """
+
+        return sql
+
+    def deallocate(self, sql, statement):
+        """
+        Release a statement returned by :meth:`prepare`. Cursors returned by
+        earlier executions of the statement must keep working.
+        """
+
+    def run(self, sql, statement, parameters, cursor):
+        """
+        Execute a prepared statement with the given parameters on the given
+        cursor.
+        """
+
+        cursor.execute(sql, parameters)
+
+    def run_many(self, sql, statement, parameters, cursor):
+        """
+        Execute a prepared statement once for every set of parameters on the
+        given cursor.
+        """
+
+        cursor.executemany(sql, parameters)
+
+    def get(self, sql):
+        """
+        Return the prepared statement for the given SQL, preparing it if
+        needed.
+        """
+
+        statements = self._statements
+        statement = statements.pop(sql, None)
+        if statement is not None:
+            self.hits += 1
+            statements[sql] = statement
+            return statement
+
+        self.misses += 1
+        statement = statements[sql] = self.prepare(sql)
+
+        while len(statements) > self.maxsize:
+            old_sql, old_statement = statements.popitem(last=False)
+            self.evictions += 1
+            self.deallocate(old_sql, old_statement)
+
+        return statement
+
+    def execute(self, sql, parameters=(), cursor=None):
+        """
+        Execute the given SQL using its prepared statement.
+
+        :param sql: SQL text
+        :param parameters: Parameters in the form expected by the driver
+        :param cursor: Cursor to execute on. A new cursor is used by default.
+        :return: Cursor with the results
+        """
+
+        return self._execute(self.run, sql, parameters, cursor)
+
+    def executemany(self, sql, parameters, cursor=None):
+        """
+        Execute the given SQL once for every set of parameters using its
+        prepared statement.
+
+        :param sql: SQL text
+        :param parameters: Iterable of parameters
+        :param cursor: Cursor to execute on. A new cursor is used by default.
+        :return: Cursor
+        """
+
+        return self._execute(self.run_many, sql, parameters, cursor)
+
+    def _execute(self, run, sql, parameters, cursor):
+        statement = self.get(sql)
+        if cursor is not None:
+            run(sql, statement, parameters, cursor)
+            return cursor
+
+        cursor = self.connection.cursor()
+        try:
+            run(sql, statement, parameters, cursor)
+        except:
+            cursor.close()
+            raise
+        return cursor
+
+    def clear(self):
+        """
+        Deallocate all statements and reset hit, miss and eviction counters.
+        """
+
+        statements = self._statements
+        while statements:
+            self.deallocate(*statements.popitem(last=False))
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __contains__(self, sql):
+        return sql in self._statements
+
+    def __len__(self):
+        return len(self._statements)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(hits={0.hits}, misses={0.misses}, " \
+            "evictions={0.evictions}, size={1}, maxsize={0.maxsize})".format(
+                self, len(self))
+
+
+class PostgresStatementManager(StatementManager):
+    """
+    Statement manager that prepares statements using PostgreSQL's ``PREPARE``,
+    executes them using ``EXECUTE`` and releases them using ``DEALLOCATE`` when
+    they are evicted. Statements must be compiled using the
+    :data:`~lessql.expr.paramstyles.format_` parameter style, which is used by
+    psycopg2.
+
+    .. code-block:: python
+
+        conn = Connection(
+            psycopg2.connect(dsn),
+            postgresql,
+            paramstyle=format_,
+            statement_manager=PostgresStatementManager)
+
+    Server-side cursors execute the SQL as is, since PostgreSQL can only
+    declare cursors for queries.
+    """
+
+    def __init__(self, connection, maxsize=64):
+        super(PostgresStatementManager, self).__init__(connection, maxsize)
+        self._prepared = 0
+
+    def prepare(self, sql):
+        self._prepared += 1
+        name = u"lessql_statement_{:d}".format(self._prepared)
+
+        # PREPARE uses numbered placeholders, and is executed without
+        # parameters which means percent signs must not be escaped
+        count = [0]
+        def replace(match):
+            if match.group(0) == u"%%":
+                return u"%"
+            count[0] += 1
+            return u"${:d}".format(count[0])
+        query = _format_placeholder.sub(replace, sql)
+
+        self._run_sql(u"PREPARE {} AS {}".format(name, query))
+        return name, count[0]
+
+    def deallocate(self, sql, statement):
+        self._run_sql(u"DEALLOCATE {}".format(statement[0]))
+
+    def run(self, sql, statement, parameters, cursor):
+        cursor.execute(self._execute_sql(sql, statement, cursor), parameters)
+
+    def run_many(self, sql, statement, parameters, cursor):
+        cursor.executemany(
+            self._execute_sql(sql, statement, cursor), parameters)
+
+    def _execute_sql(self, sql, statement, cursor):
+        if getattr(cursor, "name", None):
+            return sql
+
+        name, count = statement
+        if not count:
+            return u"EXECUTE {}".format(name)
+        return u"EXECUTE {} ({})".format(name, u", ".join([u"%s"] * count))
+
+    def _run_sql(self, sql):
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(sql)
+        finally:
+            cursor.close()
+
+
+_format_placeholder = re.compile(u"%[%s]")
+
+
+class Result(object):
+    """
+    Rows of a query that are fetched lazily in batches of ``batch_size`` rows,
+    which means memory use does not depend on the number of rows. The cursor
+    is closed when all rows have been read, when iteration stops early or when
+    :meth:`close` is called.
+
+    .. code-block:: python
+
+        with conn.stream(Select(tables=[Table("events")])) as result:
+            for row in result:
+                ...
+
+    :param cursor: Cursor that has executed the query
+    :param batch_size: Number of rows to fetch at a time
+    :param row_type: Row type to return rows as, see :mod:`lessql.rows`.
+                     Rows are returned as the driver returns them if ``None``.
+    """
+
+    def __init__(self, cursor, batch_size=1000, row_type=None):
+        self.cursor = cursor
+        self.batch_size = batch_size
+        self.row_type = row_type
+        self.closed = False
+
+    @property
+    def description(self):
+        return self.cursor.description
+
+    def __iter__(self):
+        cursor = self.cursor
+        batch_size = self.batch_size
+        row_type = self.row_type
+        new = tuple.__new__
+        try:
+            while not self.closed:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+
+                if row_type is None:
+                    for row in rows:
+                        yield row
+                else:
+                    for row in rows:
+                        yield new(row_type, row)
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Close the cursor. Rows that have not been read are discarded.
+        """
+
+        if not self.closed:
+            self.closed = True
+            self.cursor.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def _tree(expr):
+    # Prepared queries know the tree they were compiled from
+    if expr.__class__ is Prepared:
+        return expr.expr
+    return expr
+
+
+class Connection(object):
+    """
+    Executes expression trees on a DB-API 2.0 connection.
+
+    :param connection: DB-API connection
+    :param compile: Compiler to use, usually a dialect compiler such as
+                    :data:`lessql.expr.dialects.sqlite`
+    :param paramstyle: Parameter style of the driver, see
+                       :mod:`lessql.expr.paramstyles`
+    :param maxsize: Maximum number of prepared statements to keep
+    :param statement_manager: Class to manage prepared statements with
+    :param timer: Function returning the current time in seconds, used to time
+                  statements for hooks
+    """
+
+    def __init__(
+            self, connection, compile=None, paramstyle=qmark, maxsize=64,
+            statement_manager=StatementManager, timer=None):
+        self.connection = connection
+        self.paramstyle = paramstyle
+        self.compiler = StatementCache(
+            default_compile if compile is None else compile)
+        self.statements = statement_manager(connection, maxsize)
+        self.timer = default_timer if timer is None else timer
+
+        #: Whether the driver supports named cursors, ``None`` until the first
+        #: server-side cursor is requested
+        self.named_cursors = None
+        self._cursors = 0
+
+        #: Debug hooks called as ``hook(connection, sql, parameters, seconds)``
+        #: after every statement executed on this connection. Statements are
+        #: only timed when there are hooks.
+        self.hooks = []
+
+    def compile(self, expr):
+        """
+        Compile the given expression for this connection.
+
+        :param expr: Expression tree
+        :return: Tuple of SQL and parameters in the form expected by the driver
+        """
+
+        state = state_factory(paramstyle=self.paramstyle)
+        sql = self.compiler(expr, state)
+        return sql, self.paramstyle.format_parameters(state.parameters)
+
+    def prepare(self, expr):
+        """
+        Compile the given expression once for executing it with different
+        values for its :class:`~lessql.expr.prepared.Param` placeholders.
+
+        .. code-block:: python
+
+            by_id = conn.prepare(Select(
+                tables=[Table("users")], where=Column("id") == Param("id")))
+            conn.fetch(by_id, values={"id": 1})
+
+        :param expr: Expression tree
+        :return: :class:`~lessql.expr.prepared.Prepared` that can be passed to
+                 :meth:`execute`, :meth:`stream` and :meth:`fetch`
+        """
+
+        return prepare(expr, self.compiler.compile, self.paramstyle)
+
+    def _compile(self, expr, values):
+        if expr.__class__ is Prepared:
+            return expr(values)
+        return self.compile(expr)
+
+    def execute(self, expr, values=None):
+        """
+        Compile and execute the given expression.
+
+        :param expr: Expression tree, or query returned by :meth:`prepare`
+        :param values: Mapping of placeholder names to values for prepared
+                       queries
+        :return: Cursor with the results
+        """
+
+        sql, parameters = self._compile(expr, values)
+        return self.execute_sql(sql, parameters)
+
+    def executemany(self, expr, rows):
+        """
+        Compile the given expression once and execute it for every row, which
+        is how inserts without rows are meant to be used.
+
+        .. code-block:: python
+
+            conn.executemany(Insert("users", ["id", "name"]), rows)
+
+        :param expr: Expression tree whose placeholders the rows fill in
+        :param rows: Iterable of parameter sequences
+        :return: Cursor
+        """
+
+        sql, _ = self.compile(expr)
+        format_parameters = self.paramstyle.format_parameters
+        parameters = (format_parameters(row) for row in rows)
+
+        if not self.hooks:
+            return self.statements.executemany(sql, parameters)
+
+        parameters = list(parameters)
+        start = self.timer()
+        cursor = self.statements.executemany(sql, parameters)
+        self._call_hooks(sql, parameters, self.timer() - start)
+        return cursor
+
+    def stream(self, expr, batch_size=1000, named=False, values=None):
+        """
+        Execute the given expression on a cursor of its own and return its
+        rows as a lazily fetched :class:`Result`.
+
+        Drivers that support named cursors, such as psycopg2, use a server-side
+        cursor, which means rows are only sent by the database as they are
+        fetched. Other drivers fetch rows from the client-side cursor in
+        batches.
+
+        :param expr: Expression tree, or query returned by :meth:`prepare`
+        :param batch_size: Number of rows to fetch at a time
+        :param named: Return rows with attribute access by column name, see
+                      :func:`lessql.rows.row_type_for`
+        :param values: Mapping of placeholder names to values for prepared
+                       queries
+        :return: Result
+        """
+
+        sql, parameters = self._compile(expr, values)
+        cursor = self.cursor(server_side=True)
+        if hasattr(cursor, "itersize"):
+            cursor.itersize = batch_size
+
+        try:
+            if not self.hooks:
+                self.statements.execute(sql, parameters, cursor)
+            else:
+                start = self.timer()
+                self.statements.execute(sql, parameters, cursor)
+                self._call_hooks(sql, parameters, self.timer() - start)
+        except:
+            cursor.close()
+            raise
+
+        row_type = None
+        if named:
+            row_type = row_type_for(_tree(expr), cursor.description)
+        return Result(cursor, batch_size, row_type)
+
+    def fetch(self, expr, named=True, values=None):
+        """
+        Execute the given expression and return all rows.
+
+        :param expr: Expression tree, or query returned by :meth:`prepare`
+        :param named: Return rows with attribute access by column name, see
+                      :func:`lessql.rows.row_type_for`
+        :param values: Mapping of placeholder names to values for prepared
+                       queries
+        :return: List of rows
+        """
+
+        cursor = self.execute(expr, values)
+        rows = cursor.fetchall()
+        if not named or cursor.description is None:
+            return rows
+
+        new = tuple.__new__
+        row_type = row_type_for(_tree(expr), cursor.description)
+        return [new(row_type, row) for row in rows]
+
+    def cursor(self, server_side=False):
+        """
+        Return a new cursor of the underlying connection.
+
+        :param server_side: Return a named, server-side cursor if the driver
+                            supports them
+        :return: DB-API cursor
+        """
+
+        if server_side and self.named_cursors is not False:
+            self._cursors += 1
+            try:
+                cursor = self.connection.cursor(
+                    name=u"lessql_{:d}".format(self._cursors))
+            except TypeError:
+                self.named_cursors = False
+            else:
+                self.named_cursors = True
+                return cursor
+        return self.connection.cursor()
+
+    def insert(self, insert):
+        """
+        Execute an insert of many rows as multi-row inserts that respect the
+        parameter limit of the compiler.
+
+        :param insert: :class:`~lessql.expr.query.Insert` with rows
+        :return: Number of rows inserted
+        """
+
+        count = 0
+        for batch in insert.batches(self.compiler.compile.max_parameters):
+            self.execute(batch)
+            count += len(batch.rows)
+        return count
+
+    def execute_sql(self, sql, parameters=()):
+        """
+        Execute SQL text as is.
+
+        :param sql: SQL text
+        :param parameters: Parameters in the form expected by the driver
+        :return: Cursor with the results
+        """
+
+        if not self.hooks:
+            return self.statements.execute(sql, parameters)
+
+        start = self.timer()
+        cursor = self.statements.execute(sql, parameters)
+        self._call_hooks(sql, parameters, self.timer() - start)
+        return cursor
+
+    def _call_hooks(self, sql, parameters, seconds):
+        for hook in self.hooks:
+            hook(self, sql, parameters, seconds)
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        """
+        Deallocate all statements and close the connection.
+        """
+
+        self.statements.clear()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
@@ -1,5 +1,13 @@
 from .base import *
+from .cache import *
+from .codegen import *
+from .dialects import *
 from .functions import *
+from .interning import *
 from .operators import *
+from .paramstyles import *
+from .prepared import *
+from .profiling import *
 from .query import *
+from .simplify import *
 from .types import *
@@ -6,9 +6,11 @@ from copy import copy
 from enum import Enum
 from functools import total_ordering
 from itertools import chain
+from weakref import WeakSet
 
-from .._compat import ChainMap
+from .._compat import ustr
 from ..utils import get_class, ClassDict
+from .paramstyles import Parameters, qmark
 
 
 class OrderedEnum(Enum):
@@ -84,7 +86,7 @@ class Precedence(namedtuple("_Precedence", ["precedence", "associativity"])):
     def __new__(cls, precedence=None, associativity=None):
         return super(Precedence, cls).__new__(
             cls,
-            sys.maxint if precedence is None else precedence,
+            sys.maxsize if precedence is None else precedence,
             Associativity.none if associativity is None else associativity)
 
     def __repr__(self):
@@ -96,6 +98,9 @@ class Precedence(namedtuple("_Precedence", ["precedence", "associativity"])):
             return NotImplemented
         return self[0] == other[0] and self[1] == other[1]
 
+    # Python 3 drops the inherited hash of classes that define __eq__
+    __hash__ = tuple.__hash__
+
     def __lt__(self, other):
         if not isinstance(other, self.__class__):
             return NotImplemented
@@ -105,43 +110,211 @@ class Precedence(namedtuple("_Precedence", ["precedence", "associativity"])):
             self.associativity < other.associativity)
 
 
+class Sql(ustr):
+    """
+    SQL fragment that is written verbatim to the output of a compiler.
+
+    Rules may return a list of parts instead of a string. Parts that are
+    :class:`Sql` instances are written as is, while all other parts are
+    compiled as sub-expressions in the order they appear.
+
+    .. code-block:: python
+
+        @compile.when(Add)
+        def compile_add(compile, expr, state):
+            return [expr.left, Sql(u" + "), expr.right]
+
+    """
+
+    __slots__ = ()
+
+
+def separated(separator, exprs):
+    """
+    Return a list of parts where the given separator is placed between every
+    expression.
+
+    :param separator: :class:`Sql` instance to put between expressions
+    :param exprs: Iterable of expressions
+    :return: List of parts to return from a rule
+    """
+
+    parts = []
+    for expr in exprs:
+        parts.append(expr)
+        parts.append(separator)
+
+    if parts:
+        parts.pop()
+    return parts
+
+
+# Work stack marker for restoring the precedence of an enclosing expression
+_Restore = type("Restore", (), {})()
+_close_bracket = Sql(u")")
+
+
 class Compiler(object):
     """
     Translates AST into SQL strings.
 
     Constructor should not be called directly.
 
+    Compilers that have a parent use all rules of the parent, unless they
+    register rules of their own for the same classes. Rules of the compiler and
+    its parents are flattened into a single table when it is first used, which
+    means that dispatching is as fast as for a compiler without a parent. The
+    table is rebuilt if the compiler or any of its parents register new rules.
+
     :param parent: A Compiler instance to inherit compilation rules from
+    :param max_parameters: Maximum number of parameters the database accepts in
+                           a single statement. Inherited from the parent when
+                           not given. ``None`` means there is no limit.
     """
 
     _default_precedence = Precedence()
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_parameters=None):
+        if max_parameters is None and parent is not None:
+            max_parameters = parent.max_parameters
+
         self.parent = parent
+        self.max_parameters = max_parameters
         self._map = ClassDict()
+        self._profiler = None
+        self._children = WeakSet()
+
+        # Rules of this compiler and its parents, built on first use
+        self._table = None
+
+        # Rule and precedence for every class that has been compiled
+        self._dispatch = {}
+
+        if parent is not None:
+            parent._children.add(self)
+
+    @property
+    def profiler(self):
+        """
+        Profiler that rule calls of this compiler are reported to, see
+        :class:`lessql.expr.profiling.Profiler`. Rules are wrapped when they are
+        first dispatched to, which means compiling has no overhead when this is
+        ``None``.
+        """
+
+        return self._profiler
+
+    @profiler.setter
+    def profiler(self, profiler):
+        self._profiler = profiler
+        self._dispatch.clear()
 
     def when(self, *classes):
         def decorator(func):
             for cls in classes:
                 self._map[cls] = func
+            self._invalidate()
+            return func
         return decorator
 
+    def _invalidate(self):
+        self._table = None
+        self._dispatch.clear()
+        for child in self._children:
+            child._invalidate()
+
+    def _get_table(self):
+        table = self._table
+        if table is None:
+            table = ClassDict()
+            if self.parent is not None:
+                table.data.update(self.parent._get_table().data)
+            table.data.update(self._map.data)
+            self._table = table
+        return table
+
+    def _resolve(self, cls):
+        rule = self._get_table().resolve(cls)
+        if self._profiler is not None:
+            rule = self._profiler.wrap(cls, rule)
+
+        entry = self._dispatch[cls] = (rule, self._get_precedence(cls))
+        return entry
+
     def _get_precedence(self, cls):
         return Precedence(
             getattr(cls, "precedence", self._default_precedence.precedence),
             getattr(cls, "associativity", self._default_precedence.associativity))
 
     def __call__(self, expr, state=None):
+        """
+        Compile the given expression.
+
+        Sub-expressions returned as parts by rules are compiled from an explicit
+        work stack rather than by recursion, and all SQL fragments are joined
+        once at the end. This means that trees of any depth can be compiled in
+        linear time, as long as their rules return parts.
+
+        :param expr: Expression to compile
+        :param state: State to compile in. A new state is created when none is
+                      given.
+        :return: Compiled SQL
+        """
+
         if state is None:
             state = state_factory()
 
-        precedence = self._get_precedence(expr)
-        with state(precedence=precedence):
-            compiled = self._map[expr](self, expr, state)
-
-        if precedence < state.precedence:
-            return u"({})".format(compiled)
-        return compiled
+        dispatch = self._dispatch
+        precedences = state._precedence
+        undo = state._undo
+        out = []
+        stack = [expr]
+
+        # Push a level of our own which is used to keep track of the precedence
+        # of the expression whose parts are currently being compiled
+        state.push()
+        while stack:
+            item = stack.pop()
+            cls = item.__class__
+
+            if cls is Sql:
+                out.append(item)
+                continue
+
+            if item is _Restore:
+                precedences[-1] = stack.pop()
+                continue
+
+            try:
+                rule, precedence = dispatch[cls]
+            except KeyError:
+                rule, precedence = self._resolve(cls)
+
+            outer = precedences[-1]
+            if precedence < outer:
+                out.append(u"(")
+                stack.append(_close_bracket)
+
+            # Same as state.push(precedence=precedence) and state.pop(), but
+            # without allocating unless the rule replaces state attributes
+            precedences.append(precedence)
+            undo.append(_precedence_only)
+            compiled = rule(self, item, state)
+            precedences.pop()
+            saved = undo.pop()
+            if saved is not _precedence_only:
+                _restore(state._values, saved)
+
+            if compiled.__class__ is list:
+                stack.append(outer)
+                stack.append(_Restore)
+                precedences[-1] = precedence
+                stack.extend(reversed(compiled))
+            else:
+                out.append(compiled)
+        state.pop()
+
+        return u"".join(out)
 
 
 #: Default compiler
@@ -149,27 +322,88 @@ compile = Compiler()
 
 
 class State(object):
-    __slots__ = ("_state")
+    """
+    Attributes shared between compilation rules. State is organized as a stack
+    of levels where attributes pushed onto a level shadow those of outer levels
+    until the level is popped again.
+
+    The current value of every attribute is kept in a single dict, and pushing
+    a level only records the values it replaces. Looking up an attribute never
+    depends on the number of levels, and pushing or popping a level that does
+    not replace any values does not allocate. Precedence has a stack of its own
+    since it changes for every compiled expression.
+
+    :param mapping_or_iterable: Initial attributes like the first argument of
+                                ``dict()``.
+    """
+
+    __slots__ = ("_values", "_undo", "_precedence")
     Undef = type("Undef", (), {})()
 
     def __init__(self, *args, **kwargs):
-        # Prevent __setattr__ from intercepting _state
-        super(State, self).__setattr__(
-            "_state", ChainMap(dict(*args, **kwargs)))
+        values = dict(*args, **kwargs)
+
+        # Prevent __setattr__ from intercepting private attributes
+        init = super(State, self).__setattr__
+        init("_precedence", [values.pop("precedence", self.Undef)])
+        init("_values", values)
+
+        # Values replaced by every level but the first one. None is used for
+        # levels that do not replace anything
+        init("_undo", [])
+
+    @property
+    def precedence(self):
+        precedence = self._precedence[-1]
+        if precedence is self.Undef:
+            raise AttributeError(
+                u"type object '{}' has no attribute 'precedence'".format(
+                    self.__class__.__name__))
+        return precedence
 
     @property
     def parent(self):
         parent = self.__class__.__new__(self.__class__)
-        super(State, parent).__setattr__("_state", self._state.parents)
+        init = super(State, parent).__setattr__
+
+        if self._undo:
+            values = dict(self._values)
+            saved = self._undo[-1]
+            if saved is not None:
+                _restore(values, saved)
+        else:
+            values = {}
+
+        init("_values", values)
+        init("_undo", self._undo[:-1])
+        init("_precedence", self._precedence[:-1] or [self.Undef])
         return parent
 
     def getall(self, attr, missing=None, default=None):
         if missing is None:
             missing = False
 
-        return (
-            d.get(attr, default)
-            for d in self._state.maps if missing or attr in d)
+        # Walk levels from the innermost one outwards and undo replaced values
+        # as we go
+        found = []
+        value = self._values.get(attr, self.Undef)
+        for i in range(len(self._undo), -1, -1):
+            saved = self._undo[i - 1] if i else None
+            if attr == "precedence":
+                value = self._precedence[i]
+
+            if i:
+                defined = saved is not None and attr in saved
+            else:
+                defined = value is not self.Undef
+
+            if defined:
+                found.append(value)
+                if saved is not None and attr != "precedence":
+                    value = saved[attr]
+            elif missing:
+                found.append(default)
+        return iter(found)
 
     def compact(self):
         """
@@ -180,19 +414,49 @@ class State(object):
                   associated with the current state.
         """
 
-        return {k: v for k, v in self._state.items()}
+        compact = dict(self._values)
+        if self._precedence[-1] is not self.Undef:
+            compact["precedence"] = self._precedence[-1]
+        return compact
 
     def push(self, *args, **kwargs):
-        if args:
-            mapping = [(attr, copy(self._state[attr])) for attr in args]
+        precedence = kwargs.pop("precedence", self.Undef)
+
+        if not args and not kwargs:
+            if precedence is self.Undef:
+                self._precedence.append(self._precedence[-1])
+                self._undo.append(None)
+            else:
+                self._precedence.append(precedence)
+                self._undo.append(_precedence_only)
+            return
+
+        values = self._values
+        saved = {}
+
+        if precedence is self.Undef:
+            self._precedence.append(self._precedence[-1])
         else:
-            mapping = []
+            self._precedence.append(precedence)
+            saved["precedence"] = self.Undef
 
-        super(State, self).__setattr__(
-            "_state", self._state.new_child(dict(mapping, **kwargs)))
+        for attr in args:
+            if attr == "precedence":
+                continue
+            saved[attr] = values[attr]
+            values[attr] = copy(values[attr])
+
+        for attr, value in kwargs.items():
+            saved.setdefault(attr, values.get(attr, self.Undef))
+            values[attr] = value
+
+        self._undo.append(saved)
 
     def pop(self):
-        super(State, self).__setattr__("_state", self._state.parents)
+        self._precedence.pop()
+        saved = self._undo.pop()
+        if saved is not None:
+            _restore(self._values, saved)
 
     @contextmanager
     def __call__(self, *args, **kwargs):
@@ -202,33 +466,59 @@ class State(object):
 
     def __getattr__(self, attr):
         try:
-            return self._state[attr]
+            return self._values[attr]
         except KeyError:
             raise AttributeError(u"type object '{}' has no attribute '{}'".format(
                 self.__class__.__name__, attr))
 
     def __setattr__(self, attr, value):
-        try:
-            # Check if attribute exists on instance directly. This allows us to
-            # assign directly to self._state.
-            super(State, self).__getattr__(attr)
-        except AttributeError:
-            self._state[attr] = value
+        # Remember the value being replaced unless we are on the first level,
+        # or the value has been replaced on this level already
+        if self._undo:
+            saved = self._undo[-1]
+            if saved is None or saved is _precedence_only:
+                saved = self._undo[-1] = dict(saved or ())
+
+            if attr == "precedence":
+                saved[attr] = self.Undef
+            else:
+                saved.setdefault(attr, self._values.get(attr, self.Undef))
+
+        if attr == "precedence":
+            self._precedence[-1] = value
         else:
-            super(State, self).__setattr__(attr, value)
+            self._values[attr] = value
 
     def __len__(self):
-        return len(self._state.maps)
+        return len(self._undo) + 1
 
     def __repr__(self):
-        return '{0.__class__.__name__}({1!r})'.format(
-            self, dict(self._state.items()))
+        return '{0.__class__.__name__}({1!r})'.format(self, self.compact())
+
+
+# Undo record for levels that only change precedence. It must never be mutated
+_precedence_only = {"precedence": State.Undef}
+
+
+def _restore(values, saved):
+    """
+    Restore values replaced by a state level.
+    """
+
+    for attr, value in saved.items():
+        if attr == "precedence":
+            continue
+        elif value is State.Undef:
+            values.pop(attr, None)
+        else:
+            values[attr] = value
 
 
 def state_factory(*args, **kwargs):
     state = State(
         precedence=Precedence(0),
-        parameters=[])
+        parameters=Parameters(),
+        paramstyle=qmark)
     state.push(*args, **kwargs)
 
     return state
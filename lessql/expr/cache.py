@@ -0,0 +1,308 @@
+"""
+LesSQL statement cache
+----------------------
+Applications tend to compile the same query shapes over and over, where only
+the values passed as parameters differ. :class:`StatementCache` remembers the
+SQL for every shape it compiles, which means a cache hit only has to extract
+the parameters from the expression tree.
+
+The shape of a tree is its fingerprint, as returned by :func:`fingerprint`.
+It contains node classes, the values of slots listed in
+:attr:`~lessql.expr.common.Expression.literals`, such as column and table names,
+and ``None`` values, but not the values that are passed to the database as
+parameters. When the parameter style binds identical values only once, which
+values are identical is part of the key as well.
+
+The cache relies on compilation rules compiling sub-expressions in the same
+order as the slots are declared, and only binding values taken from the tree.
+Rules may repeat the previous value or pass a run of values as a single list,
+see :func:`align`. Compiled parameters are matched to the values of the
+fingerprint by identity, which is ambiguous when a value occurs more than once,
+as small integers and interned strings tend to. Which values are identical is
+therefore part of the key, see :func:`identities`. Shapes whose parameters can
+not be derived from the fingerprint are never cached.
+"""
+
+from .base import compile as default_compile, state_factory
+from .common import Expression, get_layout
+from .paramstyles import deduplicate, get_paramstyle
+from .types import parameter_types
+
+
+__all__ = [
+    "StatementCache",
+    "fingerprint",
+]
+
+
+# Placeholder for parameter values in fingerprints
+Parameter = type("Parameter", (), {})()
+Unset = type("Unset", (), {})()
+Uncacheable = type("Uncacheable", (), {})()
+
+
+def fingerprint(expr):
+    """
+    Return the fingerprint of the given expression tree and the parameter values
+    it contains. Trees that only differ in their parameter values have equal
+    fingerprints.
+
+    :param expr: Expression tree
+    :return: Tuple of hashable fingerprint and list of parameter values in
+             compilation order
+    """
+
+    key = []
+    values = []
+    append = key.append
+    kinds = _kinds
+
+    stack = [expr]
+    pop = stack.pop
+    extend = stack.extend
+    while stack:
+        item = pop()
+        cls = item.__class__
+
+        try:
+            kind = kinds[cls]
+        except KeyError:
+            kind = _kind(cls)
+
+        if kind is _parameter:
+            append(Parameter)
+            values.append(item)
+        elif kind is _sequence:
+            append(cls)
+            append(len(item))
+            extend(reversed(item))
+        elif kind is _value:
+            append(cls)
+            append(item)
+        else:
+            append(cls)
+            literals, children = kind
+            for name in literals:
+                value = getattr(item, name, Unset)
+                append(value.__class__)
+                append(value)
+            extend([getattr(item, name, Unset) for name in children])
+
+    return tuple(key), values
+
+
+# How fingerprint() handles values of every class it has seen. Expressions are
+# represented by the names of their literal slots and the names of their other
+# slots in reverse order.
+_kinds = {}
+_parameter = "parameter"
+_sequence = "sequence"
+_value = "value"
+
+
+def _kind(cls):
+    if issubclass(cls, parameter_types):
+        kind = _parameter
+    elif issubclass(cls, Expression):
+        layout = get_layout(cls)
+        kind = (
+            tuple(name for name, literal in layout if literal),
+            tuple(name for name, literal in reversed(layout) if not literal))
+    elif issubclass(cls, (list, tuple)):
+        kind = _sequence
+    else:
+        kind = _value
+    _kinds[cls] = kind
+    return kind
+
+
+def align(parameters, values):
+    """
+    Return how compiled parameters are derived from the parameter values of a
+    fingerprint. Rules may repeat the previous value, which is done when lists
+    of values are padded, or pass a run of values as a single list, which is
+    done for array parameters.
+
+    :param parameters: Parameters bound when compiling the tree
+    :param values: Parameter values of the fingerprint
+    :return: Tuple where every item is either the index of a value, or a
+             ``(start, stop)`` tuple of a list of values. ``None`` if the
+             parameters can not be derived unambiguously.
+    """
+
+    mapping = []
+    position = 0
+    for parameter in parameters:
+        if parameter.__class__ is list:
+            stop = position + len(parameter)
+            if stop > len(values) or not all(
+                    p is v for p, v in zip(parameter, values[position:stop])):
+                return None
+            mapping.append((position, stop))
+            position = stop
+            continue
+
+        following = position < len(values) and values[position] is parameter
+        repeated = position > 0 and values[position - 1] is parameter
+        if following and repeated:
+            # Identical values next to each other make it impossible to tell
+            # whether the previous one was repeated
+            return None
+        elif following:
+            mapping.append(position)
+            position += 1
+        elif repeated:
+            mapping.append(position - 1)
+        else:
+            return None
+
+    if position != len(values):
+        return None
+    return tuple(mapping)
+
+
+def identities(values):
+    """
+    Return which of the given parameter values are identical. Parameters that
+    are matched to one of several identical values are only known to be
+    derived correctly for trees where the same values are identical.
+
+    :param values: Parameter values of a fingerprint
+    :return: Tuple with the index of the first value identical to every value
+    """
+
+    first = {}
+    return tuple(
+        first.setdefault(id(value), i) for i, value in enumerate(values))
+
+
+def apply_mapping(mapping, values):
+    """
+    Return parameters derived from the given values, see :func:`align`.
+    """
+
+    return [
+        list(values[i[0]:i[1]]) if i.__class__ is tuple else values[i]
+        for i in mapping]
+
+
+class StatementCache(object):
+    """
+    Bounded LRU cache of compiled SQL keyed on the fingerprint of expression
+    trees. Instances are called like the compiler they wrap.
+
+    Which parameter values are identical is part of the key, see
+    :func:`identities`. Trees of the same shape may therefore use more than one
+    entry, for instance when two values are sometimes the same small integer
+    or interned string and sometimes not.
+
+    .. code-block:: python
+
+        cache = StatementCache(maxsize=256)
+
+        state = state_factory()
+        sql = cache(Select(where=Column("id") == 1), state)
+
+    :param compile: Compiler to use for expressions that are not cached
+    :param maxsize: Maximum number of statements to keep
+    """
+
+    def __init__(self, compile=None, maxsize=128):
+        self.compile = default_compile if compile is None else compile
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        # Lists of SQL, parameter mapping and the time the entry was last used.
+        # Recency is tracked with a counter rather than by ordering entries,
+        # which makes a hit a single dict lookup.
+        self._entries = {}
+        self._clock = 0
+
+    def __call__(self, expr, state=None):
+        if state is None:
+            state = state_factory()
+
+        paramstyle = get_paramstyle(state)
+        offset = len(state.parameters)
+
+        if paramstyle.deduplicate and offset:
+            # Placeholders may refer to parameters bound before this expression
+            self.misses += 1
+            return self.compile(expr, state)
+
+        key, values = fingerprint(expr)
+        if paramstyle.deduplicate:
+            values, pattern = deduplicate(values)
+        else:
+            pattern = None
+
+        key = (
+            state.precedence,
+            paramstyle,
+            offset if paramstyle.addressable else 0,
+            pattern,
+            identities(values),
+            key)
+
+        try:
+            entry = self._entries.get(key)
+        except TypeError:
+            # Trees containing unhashable values can not be cached
+            self.misses += 1
+            return self.compile(expr, state)
+
+        self._clock += 1
+        if entry is not None:
+            entry[2] = self._clock
+            sql = entry[0]
+            if sql is not Uncacheable:
+                self.hits += 1
+                mapping = entry[1]
+                if mapping is not None:
+                    values = apply_mapping(mapping, values)
+                state.parameters.extend(values)
+                return sql
+
+        self.misses += 1
+
+        compiled = self.compile(expr, state)
+        parameters = state.parameters[offset:]
+
+        if entry is not None:
+            return compiled
+
+        # Only cache the shape when the parameters can be reproduced from the
+        # fingerprint
+        if len(parameters) == len(values) and all(
+                p is v for p, v in zip(parameters, values)):
+            entry = [compiled, None, self._clock]
+        else:
+            mapping = align(parameters, values)
+            if mapping is None:
+                entry = [Uncacheable, None, self._clock]
+            else:
+                entry = [compiled, mapping, self._clock]
+
+        entries = self._entries
+        entries[key] = entry
+        if len(entries) > self.maxsize:
+            del entries[min(entries, key=lambda k: entries[k][2])]
+
+        return compiled
+
+    def clear(self):
+        """
+        Remove all statements from the cache and reset hit and miss counters.
+        """
+
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(hits={0.hits}, misses={0.misses}, " \
+            "size={1}, maxsize={0.maxsize})".format(self, len(self))
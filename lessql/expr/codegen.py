@@ -0,0 +1,331 @@
+"""
+LesSQL code generation
+----------------------
+Compiling a tree dispatches a rule for every node, keeps track of precedence
+and pushes state, even when the tree has the same shape as many trees before
+it. :func:`specialize` generates a Python function for the shape of a given
+tree, which checks that another tree has the same shape and returns its SQL and
+parameters using plain attribute access.
+
+.. code-block:: python
+
+    by_name = specialize(Select(
+        tables=[Table("users")], where=Column("name") == "foo"))
+
+    by_name(Select(tables=[Table("users")], where=Column("name") == "bar"))
+    # ("SELECT * FROM users WHERE name = ?", ["bar"])
+
+    by_name(Select(tables=[Table("groups")], where=Column("name") == "bar"))
+    # None, since the table differs
+
+Shapes are the same as for the :class:`~lessql.expr.cache.StatementCache`: node
+classes, literals such as column names, ``None`` values and the lengths of
+lists must be equal, while parameter values may differ.
+
+:class:`CodegenCompiler` is called like a compiler and generates a function the
+first time it sees a shape. Functions are tried in most recently used order
+for every class of root node, which means lookups are fastest when only a few
+shapes are used for every class. Applications that compile many different
+shapes are better served by the statement cache.
+"""
+
+from .._compat import string_type, longint
+from .base import compile as default_compile, state_factory
+from .cache import align, fingerprint, identities
+from .common import Expression, get_layout, structural_key
+from .paramstyles import deduplicate, get_paramstyle, qmark
+from .types import parameter_types
+
+
+__all__ = [
+    "CodegenCompiler",
+    "specialize",
+]
+
+
+# Value of slots that have not been set
+_unset = type("Unset", (), {})()
+
+# Literal types that are compared directly rather than by structural key
+_simple_types = (string_type, int, longint, bool, type(None))
+
+
+class _Generator(object):
+    """
+    Writes the source of a specialized function for the shape of a tree.
+    """
+
+    def __init__(self):
+        self.lines = []
+        self.namespace = {
+            "_unset": _unset,
+            "_parameter_types": frozenset(parameter_types),
+            "_structural_key": structural_key,
+            "_deduplicate": deduplicate,
+        }
+        self._variables = 0
+
+    def constant(self, value):
+        name = "k{:d}".format(len(self.namespace))
+        self.namespace[name] = value
+        return name
+
+    def variable(self):
+        self._variables += 1
+        return "n{:d}".format(self._variables)
+
+    def guard(self, condition):
+        self.lines.append("    if {}: return None".format(condition))
+
+    def assign(self, source):
+        name = self.variable()
+        self.lines.append("    {} = {}".format(name, source))
+        return name
+
+    def literal(self, source, value):
+        if value is None:
+            self.guard("{} is not None".format(source))
+        elif isinstance(value, _simple_types):
+            self.guard("{0}.__class__ is not {1} or {0} != {2}".format(
+                source, self.constant(value.__class__), self.constant(value)))
+        else:
+            self.guard("_structural_key({}) != {}".format(
+                source, self.constant(structural_key(value))))
+
+    def walk(self, expr):
+        """
+        Write guards for the shape of the given tree and return the variables
+        of its parameter values, in the same order as
+        :func:`~lessql.expr.cache.fingerprint`.
+        """
+
+        values = []
+        stack = [(expr, "expr")]
+        while stack:
+            item, source = stack.pop()
+
+            if isinstance(item, parameter_types):
+                self.guard("{}.__class__ not in _parameter_types".format(
+                    source))
+                values.append(source)
+            elif isinstance(item, Expression):
+                cls = item.__class__
+                self.guard("{}.__class__ is not {}".format(
+                    source, self.constant(cls)))
+
+                children = []
+                for name, literal in get_layout(cls):
+                    value = getattr(item, name, _unset)
+                    if value is _unset:
+                        self.guard(
+                            "getattr({}, {!r}, _unset) is not _unset".format(
+                                source, name))
+                        continue
+
+                    attribute = "{}.{}".format(source, name)
+                    if literal:
+                        self.literal(attribute, value)
+                    elif isinstance(value, (Expression, list, tuple)):
+                        children.append((value, self.assign(attribute)))
+                    else:
+                        children.append((value, attribute))
+                stack.extend(reversed(children))
+            elif isinstance(item, (list, tuple)):
+                self.guard("{0}.__class__ is not {1} or len({0}) != {2}".format(
+                    source, self.constant(item.__class__), len(item)))
+                children = []
+                for i, value in enumerate(item):
+                    element = "{}[{:d}]".format(source, i)
+                    if isinstance(value, (Expression, list, tuple)):
+                        element = self.assign(element)
+                    children.append((value, element))
+                stack.extend(reversed(children))
+            else:
+                self.literal(source, item)
+        return values
+
+
+def _generate(expr, sql, parameters, paramstyle):
+    """
+    Return a specialized function for the shape of the given tree, or ``None``
+    if its parameters can not be derived from the tree. The function only
+    accepts trees where the values that are identical in the given tree are
+    identical too, see :func:`~lessql.expr.cache.identities`.
+    """
+
+    _, values = fingerprint(expr)
+    if paramstyle.deduplicate:
+        values, pattern = deduplicate(values)
+    else:
+        pattern = None
+
+    if len(parameters) == len(values) and all(
+            p is v for p, v in zip(parameters, values)):
+        mapping = tuple(range(len(values)))
+    else:
+        mapping = align(parameters, values)
+        if mapping is None:
+            return None
+
+    generator = _Generator()
+    variables = generator.walk(expr)
+    lines = generator.lines
+
+    if pattern is not None:
+        lines.append("    values, pattern = _deduplicate([{}])".format(
+            ", ".join(variables)))
+        generator.guard("pattern != {}".format(generator.constant(pattern)))
+        variables = ["values[{:d}]".format(i) for i in range(len(values))]
+
+    for i, first in enumerate(identities(values)):
+        if first != i:
+            generator.guard("{} is not {}".format(
+                variables[i], variables[first]))
+
+    items = []
+    for i in mapping:
+        if i.__class__ is tuple:
+            items.append("[{}]".format(", ".join(variables[i[0]:i[1]])))
+        else:
+            items.append(variables[i])
+    lines.append("    return {}, [{}]".format(
+        generator.constant(sql), ", ".join(items)))
+
+    source = "\n".join(
+        ["def specialized(expr):", "  try:"] +
+        ["  " + line for line in lines] +
+        ["  except (AttributeError, IndexError, TypeError):",
+         "    return None"])
+
+    namespace = generator.namespace
+    exec(compile(source, "<lessql.expr.codegen>", "exec"), namespace)
+
+    func = namespace["specialized"]
+    func.source = source
+    return func
+
+
+def specialize(expr, compile=None, paramstyle=qmark):
+    """
+    Return a function for the shape of the given tree. The function takes a
+    tree and returns a tuple of its SQL and parameters, or ``None`` if the tree
+    has a different shape.
+
+    :param expr: Expression tree
+    :param compile: Compiler to use, defaults to
+                    :data:`~lessql.expr.base.compile`
+    :param paramstyle: Parameter style to compile with
+    :return: Function
+    :raises ValueError: If the parameters of the compiled tree can not be
+                        derived from the tree, see
+                        :func:`~lessql.expr.cache.align`
+    """
+
+    if compile is None:
+        compile = default_compile
+
+    state = state_factory(paramstyle=paramstyle)
+    sql = compile(expr, state)
+
+    func = _generate(expr, sql, state.parameters, paramstyle)
+    if func is None:
+        raise ValueError(u"Parameters can not be derived from the tree")
+    return func
+
+
+class CodegenCompiler(object):
+    """
+    Compiler that generates a specialized function for every shape it
+    compiles. Instances are called like the compiler they wrap.
+
+    :param compile: Compiler to use for shapes that have not been seen before
+    :param max_shapes: Maximum number of shapes to keep for every class of root
+                       node
+    :param max_nodes: Trees with more nodes are compiled as is, since
+                      generating functions for them takes too long
+    """
+
+    def __init__(self, compile=None, max_shapes=8, max_nodes=1000):
+        self.compile = default_compile if compile is None else compile
+        self.max_shapes = max_shapes
+        self.max_nodes = max_nodes
+        self.hits = 0
+        self.misses = 0
+
+        # Specialized functions, most recently used first, by root class,
+        # precedence and parameter style
+        self._shapes = {}
+
+    def __call__(self, expr, state=None):
+        if state is None:
+            state = state_factory()
+
+        paramstyle = get_paramstyle(state)
+        offset = len(state.parameters)
+        if offset and paramstyle.addressable:
+            # Placeholders refer to parameters bound before this expression
+            self.misses += 1
+            return self.compile(expr, state)
+
+        key = (expr.__class__, state.precedence, paramstyle)
+        funcs = self._shapes.get(key)
+        if funcs is not None:
+            for i, func in enumerate(funcs):
+                result = func(expr)
+                if result is not None:
+                    if i:
+                        del funcs[i]
+                        funcs.insert(0, func)
+                    self.hits += 1
+                    sql, parameters = result
+                    state.parameters.extend(parameters)
+                    return sql
+
+        self.misses += 1
+        sql = self.compile(expr, state)
+
+        if _count_nodes(expr, self.max_nodes) <= self.max_nodes:
+            func = _generate(
+                expr, sql, state.parameters[offset:], paramstyle)
+            if func is not None:
+                funcs = self._shapes.setdefault(key, [])
+                funcs.insert(0, func)
+                del funcs[self.max_shapes:]
+        return sql
+
+    def clear(self):
+        """
+        Forget all specialized functions and reset hit and miss counters.
+        """
+
+        self._shapes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return sum(len(funcs) for funcs in self._shapes.values())
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(hits={0.hits}, misses={0.misses}, " \
+            "size={1}, max_shapes={0.max_shapes})".format(self, len(self))
+
+
+def _count_nodes(expr, limit):
+    """
+    Return the number of nodes and values in the given tree, stopping once the
+    count exceeds ``limit``.
+    """
+
+    count = 0
+    stack = [expr]
+    while stack and count <= limit:
+        item = stack.pop()
+        count += 1
+        if isinstance(item, Expression):
+            stack.extend(
+                getattr(item, name, None)
+                for name, literal in get_layout(item.__class__)
+                if not literal)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return count
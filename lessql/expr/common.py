@@ -1,13 +1,145 @@
+from .._compat import string_type
 from .base import Associativity, Precedence
 
 class Expression(object):
     """
     Base class for all SQL expressions
+
+    Comparison operators build expressions, which means ``==`` can not be used
+    to compare expressions with each other. Use :meth:`structural_key` or
+    :meth:`structurally_equals` instead.
     """
 
     __slots__ = ()
     precedence, associativity = Precedence()
 
+    #: Names of slots whose values are written verbatim into the SQL, such as
+    #: identifiers, rather than compiled as sub-expressions
+    literals = ()
+
+    def structural_key(self):
+        """
+        Return a hashable key that is equal for expression trees with the same
+        structure and values. Values of different types are never equal, which
+        means ``1`` and ``True`` give different keys.
+
+        :return: Tuple
+        :raises TypeError: When hashed, if the tree contains unhashable values
+        """
+
+        return structural_key(self)
+
+    def structural_hash(self):
+        """
+        Return the hash of :meth:`structural_key`.
+        """
+
+        return hash(structural_key(self))
+
+    def structurally_equals(self, other):
+        """
+        Return whether the given expression tree has the same structure and
+        values as this one.
+        """
+
+        return self is other or structural_key(self) == structural_key(other)
+
+
+# Memoized slot layouts per class
+_layouts = {}
+
+
+def get_layout(cls):
+    """
+    Return a tuple of ``(name, is_literal)`` pairs for all slots of the given
+    expression class. Slots are ordered in declaration order starting with the
+    base class.
+
+    :param cls: Expression class
+    :return: Slot names and whether they are literals
+    """
+
+    try:
+        return _layouts[cls]
+    except KeyError:
+        pass
+
+    names = []
+    for parent in reversed(cls.__mro__):
+        slots = parent.__dict__.get("__slots__", ())
+        if isinstance(slots, string_type):
+            slots = (slots,)
+
+        for name in slots:
+            if name not in names and name not in ("__dict__", "__weakref__"):
+                names.append(name)
+
+    layout = _layouts[cls] = tuple(
+        (name, name in cls.literals) for name in names)
+    return layout
+
+
+# Value of slots that have not been set
+_Unset = type("Unset", (), {})()
+
+
+def structural_key(expr):
+    """
+    Return a flat tuple describing the given tree in pre-order. Every node is
+    represented by its class followed by its slots, every list or tuple by its
+    class and length followed by its items, and every other value by its class
+    and the value itself. Deep trees are walked without recursion.
+
+    :param expr: Expression tree
+    :return: Tuple
+    """
+
+    key = []
+    append = key.append
+
+    stack = [expr]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Expression):
+            cls = item.__class__
+            append(cls)
+            stack.extend(reversed([
+                getattr(item, name, _Unset) for name, _ in get_layout(cls)]))
+        elif isinstance(item, (list, tuple)):
+            append(item.__class__)
+            append(len(item))
+            stack.extend(reversed(item))
+        else:
+            append(item.__class__)
+            append(item)
+    return tuple(key)
+
+
+def replace_slots(expr, changes):
+    """
+    Return a copy of the given node with the values of the given slots
+    replaced. Nodes that can not be modified, such as
+    :class:`~lessql.expr.query.Select`, are copied using their ``replace``
+    method.
+
+    :param expr: Expression node
+    :param changes: New values by slot name
+    :return: New expression node
+    """
+
+    replace = getattr(expr, "replace", None)
+    if replace is not None:
+        return replace(**changes)
+
+    cls = expr.__class__
+    new = cls.__new__(cls)
+    for name, _ in get_layout(cls):
+        if name in changes:
+            setattr(new, name, changes[name])
+        elif hasattr(expr, name):
+            setattr(new, name, getattr(expr, name))
+    return new
+
 class LateOperatorOverload(object):
     """
     Helper class for overloading operators at a later stage of execution
@@ -28,6 +160,8 @@ class LateOperatorOverload(object):
     def __div__(self, other):
         return self.perform(self, "divide", other)
 
+    __truediv__ = __div__
+
     def __mod__(self, other):
         return self.perform(self, "modulo", other)
 
@@ -46,6 +180,8 @@ class LateOperatorOverload(object):
     def __rdiv__(self, other):
         return self.perform(other, "divide", self)
 
+    __rtruediv__ = __rdiv__
+
     def __rmod__(self, other):
         return self.perform(other, "modulo", self)
 
@@ -59,6 +195,10 @@ class LateOperatorOverload(object):
     def __ne__(self, other):
         return self.perform(self, "not_equal", other)
 
+    # Python 3 drops the inherited hash of classes that define __eq__, while
+    # nodes such as columns are used as dict keys
+    __hash__ = object.__hash__
+
     def __gt__(self, other):
         return self.perform(self, "greater_than", other)
 
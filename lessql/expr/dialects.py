@@ -0,0 +1,128 @@
+"""
+LesSQL dialects
+---------------
+Compilers for specific databases. They inherit all rules of the default
+:data:`~lessql.expr.base.compile` and only override the ones where the database
+offers something better, or differs from standard SQL.
+
+.. code-block:: python
+
+    from lessql.expr.dialects import postgresql
+
+    postgresql(In(Column("id"), [1, 2, 3]))
+    # id = ANY(?)
+"""
+
+import json
+
+from .base import Compiler, Sql, compile
+from .operators import In, NotIn, compile_in
+from .prepared import Param
+from .query import Select, SetExpression, Values, _values_rows
+from .types import compile_builtins
+
+
+__all__ = [
+    "postgresql",
+    "sqlite",
+]
+
+
+#: Compiler for PostgreSQL. Python lists are passed as array parameters, which
+#: drivers such as psycopg2 adapt to ``ARRAY[...]``
+postgresql = Compiler(parent=compile)
+
+#: Compiler for SQLite, which allows 999 parameters per statement unless it was
+#: built with a higher limit. Lists with more values than that are passed as a
+#: single JSON array parameter
+sqlite = Compiler(parent=compile, max_parameters=999)
+
+
+postgresql.when(list)(compile_builtins)
+
+
+_any = {
+    In: Sql(u" = ANY("),
+    NotIn: Sql(u" <> ALL("),
+}
+_close_bracket = Sql(u")")
+
+
+@postgresql.when(In, NotIn)
+def compile_in_array(compile, expr, state):
+    """
+    Compile lists of values as a single array parameter, which gives the same
+    statement regardless of how many values there are. Placeholders of prepared
+    queries are expected to be given lists too.
+    """
+
+    values = expr.right
+    if isinstance(values, tuple) and values:
+        values = list(values)
+    elif values.__class__ is not Param:
+        return compile_in(compile, expr, state)
+    return [expr.left, _any[expr.__class__], values, _close_bracket]
+
+
+@sqlite.when(In, NotIn)
+def compile_in_json(compile, expr, state):
+    """
+    Compile lists of more values than there may be parameters in a statement as
+    a single JSON array parameter, which is expanded using ``json_each``. The
+    values must be serializable as JSON.
+    """
+
+    values = expr.right
+    if not isinstance(values, tuple) or len(values) <= compile.max_parameters:
+        return compile_in(compile, expr, state)
+    return [
+        expr.left,
+        Sql(u" {} (SELECT value FROM json_each(".format(expr.operator)),
+        json.dumps(values),
+        _json_close_bracket,
+    ]
+
+_json_close_bracket = Sql(u"))")
+
+
+@sqlite.when(Values)
+def compile_values_sqlite(compile, expr, state):
+    """
+    SQLite does not support naming the columns of a table alias and names the
+    columns of VALUES ``column1``, ``column2`` and so on, which means they have
+    to be renamed in a sub-query.
+    """
+
+    columns = u", ".join(
+        u"column{:d} AS {}".format(i, column)
+        for i, column in enumerate(expr.columns, 1))
+
+    parts = [Sql(u"(SELECT {} FROM (".format(columns))]
+    parts.extend(_values_rows(expr))
+    parts.append(Sql(u")) AS {}".format(expr.alias)))
+    return parts
+
+
+@sqlite.when(SetExpression)
+def compile_set_expression_sqlite(compile, expr, state):
+    """
+    SQLite does not allow brackets around the selects of a compound select,
+    such as the ``UNION ALL`` of a recursive common table expression. Selects
+    with ``ORDER BY``, ``LIMIT`` or ``OFFSET`` are selected from as sub-queries
+    instead, since SQLite only allows those clauses at the end of a compound
+    select.
+    """
+
+    parts = _compound_member(expr.left)
+    parts.append(Sql(u" {} ".format(expr.operation)))
+    parts.extend(_compound_member(expr.right))
+    return parts
+
+def _compound_member(expr):
+    if isinstance(expr, Select) and (
+            expr.order_by or expr.limit is not None or
+            expr.offset is not None):
+        return [_select_from, expr, _close_bracket]
+    return [expr]
+
+_select_from = Sql(u"SELECT * FROM (")
@@ -1,4 +1,4 @@
-from .base import compile
+from .base import compile, separated, Sql
 from .common import Expression
 
 __all__ = [
@@ -16,10 +16,15 @@ class Function(Expression):
     def __init__(self, *args):
         self.args = args
 
+_comma = Sql(u", ")
+_close_bracket = Sql(u")")
+
 @compile.when(Function)
 def compile_function(compile, expr, state):
-    return u"{}({})".format(expr.name, u", ".join(
-        compile(arg, state) for arg in expr.args))
+    parts = separated(_comma, expr.args)
+    parts.insert(0, Sql(expr.name + u"("))
+    parts.append(_close_bracket)
+    return parts
 
 
 class Min(Function):
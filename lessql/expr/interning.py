@@ -0,0 +1,156 @@
+"""
+LesSQL interning
+----------------
+Large generated queries tend to repeat the same nodes, such as columns, many
+times. :class:`Interner` replaces structurally equal nodes with a single shared
+instance, which means repeated nodes only use memory once.
+
+.. code-block:: python
+
+    interner = Interner()
+    expr = interner(Or(*[Column("a") == i for i in range(1000)]))
+    # All 1000 comparisons now refer to the same Column("a")
+
+Interning returns a new tree and leaves the given one as is. Nodes must not be
+modified after they have been interned, since they may be shared by many
+trees.
+"""
+
+from .common import Expression, get_layout, replace_slots
+
+
+__all__ = [
+    "Interner",
+]
+
+
+class Interner(object):
+    """
+    Table of shared expression nodes.
+
+    :param subtrees: Intern all nodes rather than only nodes without
+                     sub-expressions, such as :class:`~lessql.expr.query.Column`
+                     and :class:`~lessql.expr.query.Table`. This lets
+                     identical sub-trees share memory too.
+    """
+
+    def __init__(self, subtrees=False):
+        self.subtrees = subtrees
+        self._nodes = {}
+
+    def __call__(self, expr):
+        """
+        Return the given tree with its nodes replaced by shared instances.
+
+        :param expr: Expression tree
+        :return: Expression tree, which may be ``expr`` itself if all of its
+                 nodes were shared already
+        """
+
+        if not isinstance(expr, Expression):
+            return expr
+
+        nodes = self._nodes
+        subtrees = self.subtrees
+
+        # Original and canonical node by id of every node visited in this
+        # call. Originals are kept alive so that their ids are not reused.
+        canonical = {}
+
+        stack = [(expr, False)]
+        while stack:
+            node, visited = stack.pop()
+            if id(node) in canonical:
+                continue
+
+            layout = get_layout(node.__class__)
+            if not visited:
+                stack.append((node, True))
+                for name, literal in layout:
+                    if not literal:
+                        _push_children(stack, getattr(node, name, None))
+                continue
+
+            leaf = True
+            tokens = [node.__class__]
+            changes = {}
+            for name, literal in layout:
+                try:
+                    value = getattr(node, name)
+                except AttributeError:
+                    tokens.append(_unset_token)
+                    continue
+
+                if literal:
+                    tokens.append((value.__class__, value))
+                    continue
+
+                new_value, token, has_nodes = _replace(value, canonical)
+                if new_value is not value:
+                    changes[name] = new_value
+                leaf = leaf and not has_nodes
+                tokens.append(token)
+
+            shared = replace_slots(node, changes) if changes else node
+            if leaf or subtrees:
+                try:
+                    shared = nodes.setdefault(tuple(tokens), shared)
+                except TypeError:
+                    # Nodes with unhashable values are not shared
+                    pass
+            canonical[id(node)] = (node, shared)
+
+        return canonical[id(expr)][1]
+
+    def clear(self):
+        """
+        Forget all shared nodes.
+        """
+
+        self._nodes.clear()
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(subtrees={0.subtrees!r}, " \
+            "size={1})".format(self, len(self))
+
+
+# Token of slots that have not been set
+_unset_token = ("unset",)
+
+
+def _push_children(stack, value):
+    if isinstance(value, Expression):
+        stack.append((value, False))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _push_children(stack, item)
+
+
+def _replace(value, canonical):
+    """
+    Return the value with nodes replaced by their shared instances, a hashable
+    token for it and whether it contains nodes.
+    """
+
+    if isinstance(value, Expression):
+        node = canonical[id(value)][1]
+        return node, id(node), True
+
+    if isinstance(value, (list, tuple)):
+        items = []
+        tokens = [value.__class__]
+        has_nodes = False
+        for item in value:
+            new_item, token, item_has_nodes = _replace(item, canonical)
+            items.append(new_item)
+            tokens.append(token)
+            has_nodes = has_nodes or item_has_nodes
+
+        if any(a is not b for a, b in zip(items, value)):
+            value = value.__class__(items)
+        return value, tuple(tokens), has_nodes
+
+    return value, (value.__class__, value), False
@@ -28,8 +28,11 @@ Precedence  Associativity  Operators
 from collections import namedtuple
 from functools import wraps
 
-from .base import compile, Associativity
-from .common import ComparableExpression, Comparable
+from .._compat import add_metaclass, string_type
+from .base import compile, separated, Associativity, Sql
+from .common import ComparableExpression, Comparable, Expression
+from .paramstyles import get_paramstyle
+from .prepared import Param
 
 
 __alla__ = [
@@ -49,9 +52,8 @@ class MetaOperator(type):
             return '{0.__name__}("{1}")'.format(self, self.operator.strip())
 
 
+@add_metaclass(MetaOperator)
 class Operator(ComparableExpression):
-    __metaclass__ = MetaOperator
-
     __slots__ = ()
     operator = None
 
@@ -71,7 +73,7 @@ class UnaryOperator(Operator):
 
 @compile.when(UnaryOperator)
 def compile_unary_operator(compile, expr, state):
-    return u"{}{}".format(expr.operator, compile(expr.operand, state))
+    return [Sql(expr.operator), expr.operand]
 
 
 class UnaryPlus(UnaryOperator):
@@ -101,10 +103,7 @@ class BinaryOperator(Operator):
 
 @compile.when(BinaryOperator)
 def compile_binary_operator(compile, expr, state):
-    left = compile(expr.left, state)
-    right = compile(expr.right, state)
-
-    return u"{} {} {}".format(left, expr.operator, right)
+    return [expr.left, Sql(u" {} ".format(expr.operator)), expr.right]
 
 # Arithmetic operators
 @Comparable.map("add")
@@ -140,19 +139,164 @@ class Modulo(BinaryOperator):
     operator = u"%"
     precedence = 900
 
+@compile.when(Modulo)
+def compile_modulo(compile, expr, state):
+    operator = get_paramstyle(state).escape(expr.operator)
+    return [expr.left, Sql(u" {} ".format(operator)), expr.right]
+
 
 # Containment operators
+_comma = Sql(u", ")
+_open_bracket = Sql(u"(")
+_close_bracket = Sql(u")")
+
+def _as_values(right):
+    """
+    Return iterables of values as a tuple, which makes generators reusable and
+    lets the values be compiled as a list. Expressions, such as sub-queries, and
+    strings are returned as is.
+    """
+
+    if isinstance(right, (Expression, string_type)) \
+            or not hasattr(right, "__iter__"):
+        return right
+    return tuple(right)
+
+
 class In(BinaryOperator):
+    """
+    Containment test. The right operand may be an expression, such as a
+    sub-query, or an iterable of values.
+    """
+
     __slots__ = ()
     operator = u"IN"
     precedence = 600
     associativity = Associativity.none
 
+    #: SQL used for an empty list of values
+    empty = u"(1 = 0)"
+
+    #: Operator joining the tests of lists that are split into chunks
+    combine = u" OR "
+
+    def __init__(self, left, right):
+        super(In, self).__init__(left, _as_values(right))
+
 class NotIn(BinaryOperator):
+    __slots__ = ()
     operator = u"NOT IN"
     precedence = 600
     associativity = Associativity.none
 
+    empty = u"(1 = 1)"
+    combine = u" AND "
+
+    def __init__(self, left, right):
+        super(NotIn, self).__init__(left, _as_values(right))
+
+#: Largest number of values in a single list of an IN test
+max_in_list = 1024
+
+def in_list_buckets(length, max_parameters=None):
+    """
+    Return the sizes of the lists an IN test of the given number of values is
+    compiled into. Every list is padded to a power of two, which means that the
+    number of distinct statements is logarithmic in the number of values.
+    Lists are at most :data:`max_in_list` or ``max_parameters`` long, and the
+    last one is not padded if that would exceed ``max_parameters``.
+
+    :param length: Number of values
+    :param max_parameters: Parameter limit of the database, or ``None``
+    :return: List of list sizes
+    :raises ValueError: If there are more values than ``max_parameters``, since
+                        all lists are part of the same statement
+    """
+
+    limit = max_in_list
+    if max_parameters is not None:
+        if length > max_parameters:
+            raise ValueError(
+                u"IN test of {:d} values exceeds the limit of {:d} "
+                u"parameters".format(length, max_parameters))
+        limit = min(limit, max_parameters)
+
+    # Largest power of two that is within the limit
+    chunk = 1
+    while chunk * 2 <= limit:
+        chunk *= 2
+
+    buckets = [chunk] * (length // chunk)
+    rest = length % chunk
+    if rest:
+        bucket = 1
+        while bucket < rest:
+            bucket *= 2
+
+        # Don't let padding push a list that fits over the parameter limit
+        if max_parameters is not None and \
+                length <= max_parameters < length - rest + bucket:
+            bucket = rest
+        buckets.append(bucket)
+    return buckets
+
+@compile.when(In, NotIn)
+def compile_in(compile, expr, state):
+    """
+    Compile lists of values as one or more lists of placeholders. Lists are
+    padded to the sizes given by :func:`in_list_buckets` by repeating the last
+    value, which does not change the result of the test. Long lists are split
+    into multiple tests.
+
+    Placeholders of prepared queries can not be used, since a single parameter
+    can not be expanded into a list. Use a dialect that passes lists as arrays,
+    such as :data:`~lessql.expr.dialects.postgresql`.
+    """
+
+    values = expr.right
+    if values.__class__ is Param:
+        raise ValueError(
+            u"{} tests of placeholders are not supported by this "
+            u"compiler".format(expr.operator))
+
+    if isinstance(values, Expression):
+        return [expr.left, Sql(u" {} ".format(expr.operator)), values]
+
+    if not isinstance(values, tuple):
+        raise TypeError(
+            u"{} tests require an expression or an iterable of values, not "
+            u"{!r}".format(expr.operator, values))
+
+    if not values:
+        return [Sql(expr.empty)]
+
+    buckets = in_list_buckets(len(values), compile.max_parameters)
+    test = Sql(u" {} (".format(expr.operator))
+
+    parts = []
+    if len(buckets) > 1:
+        parts.append(_open_bracket)
+
+    start = 0
+    for bucket in buckets:
+        if start:
+            parts.append(Sql(expr.combine))
+
+        chunk = values[start:start + bucket]
+        start += bucket
+
+        if len(chunk) < bucket:
+            chunk += (chunk[-1],) * (bucket - len(chunk))
+
+        parts.append(expr.left)
+        parts.append(test)
+        parts.extend(separated(_comma, chunk))
+        parts.append(_close_bracket)
+
+    if len(buckets) > 1:
+        parts.append(_close_bracket)
+    return parts
+
 # Comparison operators
 class Is(BinaryOperator):
     __slots__ = ()
@@ -188,7 +332,7 @@ def compile_equal(compile, expr, state):
         new_expr = BinaryOperator(expr.left, expr.right)
         new_expr.operator = "="
 
-        return compile(new_expr, state)
+        return [new_expr]
 
 
 @Comparable.map("not_equal")
@@ -210,7 +354,7 @@ def compile_not_equal(compile, expr, state):
         new_expr = BinaryOperator(expr.left, expr.right)
         new_expr.operator = "!="
 
-        return compile(new_expr, state)
+        return [new_expr]
 
 
 @Comparable.map("greater_than")
@@ -255,8 +399,7 @@ class ComparableOperator(Operator):
 
 @compile.when(ComparableOperator)
 def compile_comparable_operator(compile, expr, state):
-    return u" {} ".format(expr.operator).join(
-        compile(e, state) for e in expr.exprs)
+    return separated(Sql(u" {} ".format(expr.operator)), expr.exprs)
 
 
 class And(ComparableOperator):
@@ -0,0 +1,301 @@
+"""
+LesSQL parameter styles
+-----------------------
+Parameter styles decide which placeholders are written to the SQL for values
+that are passed to the database as parameters. The style is read from the
+``paramstyle`` attribute of the compilation state, and defaults to
+:data:`qmark`.
+
+.. code-block:: python
+
+    state = state_factory(paramstyle=Numeric(u"$", deduplicate=True))
+    compile(And(Column("a") == 1, Column("b") == 1), state)
+    # a = $1 AND b = $1
+
+Styles that refer to parameters by index or name can bind identical values
+only once and reuse the placeholder. Values are considered identical when they
+are equal and of the same type, which means ``1`` and ``True`` are bound
+separately.
+"""
+
+__all__ = [
+    "Parameters",
+    "Paramstyle",
+    "QMark",
+    "Format",
+    "Numeric",
+    "Named",
+    "PyFormat",
+]
+
+
+class Parameters(list):
+    """
+    List of parameter values that can look up the position of values, which
+    makes binding identical values only once fast. Values appended using the
+    normal list methods are indexed on the next lookup.
+    """
+
+    __slots__ = ("_indexes", "_indexed")
+
+    def __init__(self, *args):
+        super(Parameters, self).__init__(*args)
+        self._indexes = {}
+        self._indexed = 0
+
+    def copy(self):
+        """
+        Return a copy of this list. The copy is indexed separately, which means
+        values appended to either list are not found in the other.
+        """
+
+        return self.__class__(self)
+
+    __copy__ = copy
+
+    def position(self, value):
+        """
+        Return the one based position of the first value identical to the given
+        one. The value is appended if it is not in the list.
+
+        :param value: Parameter value. Unhashable values are always appended
+        :return: Position of value
+        """
+
+        indexes = self._indexes
+        for i in range(self._indexed, len(self)):
+            try:
+                indexes.setdefault(_identity(self[i]), i + 1)
+            except TypeError:
+                # Unhashable values, such as arrays, are never shared
+                pass
+        self._indexed = len(self)
+
+        key = _identity(value)
+        try:
+            return indexes[key]
+        except KeyError:
+            self.append(value)
+            position = indexes[key] = self._indexed = len(self)
+            return position
+        except TypeError:
+            self.append(value)
+            self._indexed = len(self)
+            return self._indexed
+
+
+def _identity(value):
+    return (value.__class__, value)
+
+
+def deduplicate(values):
+    """
+    Remove identical values from the given list.
+
+    :param values: List of parameter values
+    :return: Tuple of the values without duplicates, and a tuple with the
+             position of every value in the former
+    """
+
+    unique = Parameters()
+    pattern = tuple(unique.position(value) for value in values)
+    return unique, pattern
+
+
+class Paramstyle(object):
+    """
+    Base class for parameter styles.
+
+    :param deduplicate: Bind identical values only once. Only supported by
+                        styles that refer to parameters by index or name.
+    """
+
+    #: Whether placeholders refer to parameters by position or name, which is
+    #: required for deduplication
+    addressable = True
+
+    #: Whether percent signs in SQL must be escaped
+    percent = False
+
+    def __init__(self, deduplicate=False):
+        if deduplicate and not self.addressable:
+            raise ValueError(u"{} does not support deduplication".format(
+                self.__class__.__name__))
+        self.deduplicate = deduplicate
+
+    def bind(self, state, value):
+        """
+        Add value to the parameters of the given state and return its
+        placeholder.
+
+        :param state: Compilation state
+        :param value: Value to bind
+        :return: Placeholder SQL
+        """
+
+        parameters = state.parameters
+        if not self.deduplicate:
+            parameters.append(value)
+            return self.placeholder(len(parameters))
+
+        try:
+            position = parameters.position(value)
+        except AttributeError:
+            # Plain lists have to be searched
+            key = _identity(value)
+            for i, other in enumerate(parameters):
+                if _identity(other) == key:
+                    position = i + 1
+                    break
+            else:
+                parameters.append(value)
+                position = len(parameters)
+        return self.placeholder(position)
+
+    def placeholder(self, position):
+        """
+        Return placeholder for the parameter at the given one based position.
+        """
+
+        raise NotImplementedError()
+
+    def escape(self, sql):
+        """
+        Escape SQL that is not a placeholder, if required by this style.
+        """
+
+        if self.percent:
+            return sql.replace(u"%", u"%%")
+        return sql
+
+    def format_parameters(self, parameters):
+        """
+        Return parameters in the form expected by DB-API drivers for this style.
+        """
+
+        return list(parameters)
+
+    def __eq__(self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.__dict__ == other.__dict__
+
+    def __ne__(self, other):
+        if self.__class__ is not other.__class__:
+            return NotImplemented
+        return self.__dict__ != other.__dict__
+
+    def __hash__(self):
+        return hash((self.__class__, tuple(sorted(self.__dict__.items()))))
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(deduplicate={0.deduplicate!r})".format(
+            self)
+
+
+class QMark(Paramstyle):
+    """
+    Question mark style, ``WHERE name = ?``
+    """
+
+    addressable = False
+
+    def bind(self, state, value):
+        state.parameters.append(value)
+        return u"?"
+
+    def placeholder(self, position):
+        return u"?"
+
+
+class Format(Paramstyle):
+    """
+    ANSI C printf format style, ``WHERE name = %s``
+    """
+
+    addressable = False
+    percent = True
+
+    def bind(self, state, value):
+        state.parameters.append(value)
+        return u"%s"
+
+    def placeholder(self, position):
+        return u"%s"
+
+
+class Numeric(Paramstyle):
+    """
+    Numeric positional style, ``WHERE name = :1``. PostgreSQL uses ``$`` as
+    prefix.
+
+    :param prefix: Prefix to put before the position
+    :param deduplicate: Bind identical values only once
+    """
+
+    def __init__(self, prefix=u":", deduplicate=False):
+        super(Numeric, self).__init__(deduplicate)
+        self.prefix = prefix
+
+    def placeholder(self, position):
+        return u"{}{:d}".format(self.prefix, position)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}({0.prefix!r}, " \
+            "deduplicate={0.deduplicate!r})".format(self)
+
+
+class Named(Paramstyle):
+    """
+    Named style, ``WHERE name = :p1``. Parameters are named after their
+    position.
+    """
+
+    def placeholder(self, position):
+        return u":p{:d}".format(position)
+
+    def format_parameters(self, parameters):
+        return {u"p{:d}".format(i): v for i, v in enumerate(parameters, 1)}
+
+
+class PyFormat(Named):
+    """
+    Python extended format style, ``WHERE name = %(p1)s``
+    """
+
+    percent = True
+
+    def placeholder(self, position):
+        return u"%(p{:d})s".format(position)
+
+
+#: Question mark style, ``?``
+qmark = QMark()
+
+#: Format style, ``%s``. Named with a trailing underscore to not shadow the
+#: built-in function.
+format_ = Format()
+
+#: Numeric style, ``:1``
+numeric = Numeric()
+
+#: Numeric style using dollar signs as used by PostgreSQL, ``$1``
+dollar = Numeric(u"$")
+
+#: Named style, ``:p1``
+named = Named()
+
+#: Python extended format style, ``%(p1)s``
+pyformat = PyFormat()
+
+
+def get_paramstyle(state):
+    """
+    Return the parameter style of the given state, or :data:`qmark` if it has
+    none.
+    """
+
+    try:
+        return state.paramstyle
+    except AttributeError:
+        return qmark
@@ -0,0 +1,147 @@
+"""
+LesSQL prepared queries
+-----------------------
+Hot code paths tend to execute the same query with different values. Rather
+than building and compiling a new tree for every call, the tree can be built
+once with :class:`Param` placeholders and compiled using :func:`prepare`. The
+returned :class:`Prepared` query only has to put the values in order when it is
+executed.
+
+.. code-block:: python
+
+    by_id = prepare(Select(
+        columns=[Column("name")],
+        tables=[Table("users")],
+        where=Column("id") == Param("id")))
+
+    by_id({"id": 1})
+    # ("SELECT name FROM users WHERE id = ?", [1])
+
+Values are bound as is, which means ``None`` is compared using ``= NULL``
+rather than ``IS NULL``, and lists are not expanded for ``IN`` tests. Use the
+:data:`~lessql.expr.dialects.postgresql` compiler to pass lists as arrays.
+"""
+
+from collections import namedtuple
+
+from .base import compile as default_compile, state_factory
+from .common import ComparableExpression
+from .paramstyles import get_paramstyle, qmark
+
+
+__all__ = [
+    "Param",
+    "Prepared",
+    "prepare",
+]
+
+
+class Param(ComparableExpression):
+    """
+    Placeholder for a value that is given when a prepared query is executed.
+    Placeholders with the same name refer to the same value.
+
+    :param name: Name of the value
+    """
+
+    __slots__ = ("name",)
+    literals = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+
+# Parameter value of placeholders, which binds placeholders with the same name
+# only once when the parameter style supports deduplication
+_Placeholder = namedtuple("_Placeholder", ["name"])
+
+
+@default_compile.when(Param)
+def compile_param(compile, expr, state):
+    return get_paramstyle(state).bind(state, _Placeholder(expr.name))
+
+
+class Prepared(object):
+    """
+    Compiled query with placeholders. Calling it with a mapping of values
+    returns the SQL and the parameters in the form expected by the driver.
+
+    :param sql: Compiled SQL
+    :param parameters: Compiled parameters, including the values bound for
+                       placeholders by :func:`compile_param`
+    :param paramstyle: Parameter style the SQL was compiled with
+    :param expr: Expression tree the query was compiled from
+    """
+
+    __slots__ = ("sql", "paramstyle", "expr", "_template", "_names")
+
+    def __init__(self, sql, parameters, paramstyle=qmark, expr=None):
+        self.sql = sql
+        self.paramstyle = paramstyle
+        self.expr = expr
+
+        # Parameters with None in place of placeholders, and the position and
+        # name of every placeholder
+        self._template = []
+        self._names = []
+        for i, value in enumerate(parameters):
+            if value.__class__ is _Placeholder:
+                self._names.append((i, value.name))
+                value = None
+            self._template.append(value)
+
+    @property
+    def names(self):
+        """
+        Set of the names of all placeholders.
+        """
+
+        return set(name for _, name in self._names)
+
+    def parameters(self, values):
+        """
+        Return the parameters for the given values, in the form expected by the
+        driver.
+
+        :param values: Mapping of placeholder names to values
+        :return: Parameters
+        :raises KeyError: If a placeholder has no value
+        """
+
+        parameters = list(self._template)
+        for i, name in self._names:
+            parameters[i] = values[name]
+        return self.paramstyle.format_parameters(parameters)
+
+    def __call__(self, values=None):
+        """
+        Return the SQL and parameters for the given values.
+
+        :param values: Mapping of placeholder names to values
+        :return: Tuple of SQL and parameters
+        """
+
+        return self.sql, self.parameters({} if values is None else values)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}({0.sql!r})".format(self)
+
+
+def prepare(expr, compile=None, paramstyle=qmark):
+    """
+    Compile the given expression tree once for executing it with different
+    values for its :class:`Param` placeholders.
+
+    :param expr: Expression tree
+    :param compile: Compiler to use, defaults to
+                    :data:`~lessql.expr.base.compile`
+    :param paramstyle: Parameter style of the driver
+    :return: Prepared
+    """
+
+    if compile is None:
+        compile = default_compile
+
+    state = state_factory(paramstyle=paramstyle)
+    sql = compile(expr, state)
+    return Prepared(sql, state.parameters, paramstyle, expr)
@@ -0,0 +1,127 @@
+"""
+LesSQL profiling
+----------------
+Profilers are attached to a single compiler rather than installed globally,
+which means a profiler only sees the work of the compiler it is attached to.
+Compilers without a profiler do no extra work at all.
+
+.. code-block:: python
+
+    with profile(compile) as profiler:
+        compile(expr)
+    print(profiler.table())
+
+"""
+
+from contextlib import contextmanager
+from timeit import default_timer
+
+
+__all__ = [
+    "Profiler",
+    "profile",
+]
+
+
+class Profiler(object):
+    """
+    Records the number of calls and the cumulative time spent in compilation
+    rules per node class.
+
+    Time is measured around the rule call itself. Rules that return parts are
+    measured without their sub-expressions, while rules that compile their
+    sub-expressions by calling the compiler include them.
+
+    :param timer: Function returning the current time in seconds
+    """
+
+    def __init__(self, timer=None):
+        self.timer = default_timer if timer is None else timer
+        self.stats = {}
+
+    def wrap(self, cls, rule):
+        """
+        Return a version of the rule that records its calls for the given
+        class.
+
+        :param cls: Class of the nodes the rule is used for
+        :param rule: Compilation rule to profile
+        :return: Profiled rule
+        """
+
+        timer = self.timer
+        stats = self.stats
+
+        def profiled_rule(compile, expr, state):
+            start = timer()
+            try:
+                return rule(compile, expr, state)
+            finally:
+                elapsed = timer() - start
+                try:
+                    entry = stats[cls]
+                except KeyError:
+                    entry = stats[cls] = [0, 0.0]
+                entry[0] += 1
+                entry[1] += elapsed
+
+        profiled_rule.__name__ = getattr(rule, "__name__", "rule")
+        return profiled_rule
+
+    def rows(self):
+        """
+        Return recorded statistics ordered by cumulative time, most expensive
+        first.
+
+        :return: List of ``(cls, calls, seconds)`` tuples
+        """
+
+        rows = [
+            (cls, calls, seconds)
+            for cls, (calls, seconds) in self.stats.items()]
+        return sorted(rows, key=lambda row: (-row[2], row[0].__name__))
+
+    def table(self):
+        """
+        Return recorded statistics formatted as a text table.
+        """
+
+        lines = [u"{:<24} {:>10} {:>12} {:>12}".format(
+            u"class", u"calls", u"total ms", u"per call us")]
+        for cls, calls, seconds in self.rows():
+            lines.append(u"{:<24} {:>10} {:>12.3f} {:>12.3f}".format(
+                cls.__name__, calls, seconds * 1e3, seconds / calls * 1e6))
+        return u"\n".join(lines)
+
+    def reset(self):
+        """
+        Remove all recorded statistics.
+        """
+
+        self.stats.clear()
+
+    def __repr__(self):
+        return "{0.__class__.__name__}({1} classes)".format(
+            self, len(self.stats))
+
+
+@contextmanager
+def profile(compiler, profiler=None):
+    """
+    Attach a profiler to the given compiler for the duration of a ``with``
+    block. The previous profiler, if any, is restored afterwards.
+
+    :param compiler: Compiler to profile
+    :param profiler: Profiler to use, a new one is created when not given
+    :return: Context manager yielding the profiler
+    """
+
+    if profiler is None:
+        profiler = Profiler()
+
+    previous = compiler.profiler
+    compiler.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        compiler.profiler = previous
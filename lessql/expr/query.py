@@ -1,13 +1,28 @@
-from .base import compile
+from itertools import islice
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+from .._compat import string_type
+from .base import compile, separated, Sql
 from .common import Expression, ComparableExpression
+from .operators import And, Equal
+from .paramstyles import get_paramstyle
 
 # WIP
 __all__ = [
+    "Insert",
     "Select",
+    "Update",
+    "Values",
+    "With",
 ]
 
 class Table(Expression):
     __slots__ = ("name")
+    literals = ("name",)
 
     def __init__(self, name):
         self.name = name
@@ -26,6 +41,7 @@ class TableExpression(Table):
 
 class Column(ComparableExpression):
     __slots__ = ("name", "table")
+    literals = ("name", "table")
 
     def __init__(self, name, table=None):
         self.name = name
@@ -34,6 +50,12 @@ class Column(ComparableExpression):
     def get_table(self):
         return Table(self.table)
 
+@compile.when(Column)
+def compile_column(compile, expr, state):
+    if expr.table is None:
+        return expr.name
+    return u"{}.{}".format(expr.table, expr.name)
+
 
 class Alias(Column):
     pass
@@ -44,9 +66,37 @@ class Window(object):
     pass
 
 
+def _frozen(value):
+    # Lists are copied into tuples, which means they can't be changed through
+    # the list that was passed in
+    if value.__class__ is list:
+        return tuple(value)
+    return value
+
+
 class Select(Expression):
+    """
+    Immutable ``SELECT`` statement. Variants are derived using the generative
+    methods, which return new statements that share all unchanged sub-trees
+    with this one. This makes deriving statements cheap, and statements safe to
+    cache and share between threads.
+
+    .. code-block:: python
+
+        users = Select(columns=[Column("name")], tables=[Table("users")])
+        adults = users.filter(Column("age") >= 18)
+        page = adults.add_order_by(Column("name")).replace(limit=10)
+
+    Common table expressions are given as a list of :class:`With` expressions
+    using ``with_``. Lists of columns, tables and ordering are stored as
+    tuples. Sub-trees, such as the ``where`` expression, must not be modified
+    once they are part of a statement.
+    """
+
     # https://www.postgresql.org/docs/9.0/static/sql-select.html#SQL-SELECT
+    # Slots are in the order their clauses are compiled
     __slots__ = (
+        "with_",
         "columns",
         "tables",
         "where",
@@ -57,89 +107,516 @@ class Select(Expression):
         "offset",
         "distinct",
         "window",
-        "with_",
     )
     precedence = 0
+    literals = ("limit", "offset", "distinct")
 
     def __init__(
             self, columns=None, tables=None, where=None, group_by=None,
             having=None, order_by=None, limit=None, offset=None, distinct=None,
             with_=None, window=None):
-        self.columns = columns
-        self.tables = tables
-        self.where = where
-        self.group_by = group_by
-        self.having = having
-        self.order_by = order_by
-        self.limit = limit
-        self.offset = offset
-        self.distinct = distinct
-        self.window = window
-        self.with_ = with_
-
+        init = super(Select, self).__setattr__
+        init("columns", _frozen(columns))
+        init("tables", _frozen(tables))
+        init("where", where)
+        init("group_by", _frozen(group_by))
+        init("having", having)
+        init("order_by", _frozen(order_by))
+        init("limit", limit)
+        init("offset", offset)
+        init("distinct", distinct)
+        init("window", window)
+        init("with_", (with_,) if isinstance(with_, With) else _frozen(with_))
+
+    def __setattr__(self, attr, value):
+        raise AttributeError(u"Select is immutable, use replace() instead")
+
+    def __delattr__(self, attr):
+        raise AttributeError(u"Select is immutable, use replace() instead")
+
+    def replace(self, **changes):
+        """
+        Return a new statement with the given clauses replaced.
+
+        :param changes: New values of clauses, by the names of the constructor
+                        arguments
+        :return: Select
+        :raises TypeError: If a name is not a clause
+        """
+
+        unknown = set(changes) - set(Select.__slots__)
+        if unknown:
+            raise TypeError(u"Unknown clauses {}".format(
+                u", ".join(sorted(unknown))))
+
+        new = Select.__new__(self.__class__)
+        init = super(Select, new).__setattr__
+        for name in Select.__slots__:
+            if name in changes:
+                init(name, _frozen(changes[name]))
+            else:
+                init(name, getattr(self, name))
+        return new
+
+    def filter(self, *conditions):
+        """
+        Return a new statement where all of the given conditions must hold in
+        addition to the current ``where`` expression.
+        """
+
+        where = self.where
+        if where is None:
+            exprs = conditions
+        elif where.__class__ is And:
+            exprs = where.exprs + conditions
+        else:
+            exprs = (where,) + conditions
+
+        if len(exprs) == 1:
+            return self.replace(where=exprs[0])
+        return self.replace(where=And(*exprs))
+
+    def add_columns(self, *columns):
+        """
+        Return a new statement that selects the given columns as well.
+        """
+
+        return self.replace(columns=(self.columns or ()) + columns)
+
+    def add_order_by(self, *columns):
+        """
+        Return a new statement that is ordered by the given columns after the
+        current ones.
+        """
+
+        return self.replace(order_by=(self.order_by or ()) + columns)
+
+
+_comma = Sql(u", ")
+_open_bracket = Sql(u"(")
+_close_bracket = Sql(u")")
 
 @compile.when(Select)
 def compile_select(compile, expr, state):
-    tokens = []
+    parts = []
 
-    # TODO: Handle with statements, self.with_
+    if expr.with_:
+        if any(cte.recursive for cte in expr.with_):
+            parts.append(Sql(u"WITH RECURSIVE "))
+        else:
+            parts.append(Sql(u"WITH "))
+        parts.extend(separated(_comma, expr.with_))
+        parts.append(Sql(u" "))
 
-    tokens.append(u"SELECT")
+    parts.append(Sql(u"SELECT "))
     if expr.columns is None:
-        tokens.append("*")
+        parts.append(Sql(u"*"))
     else:
-        tokens.append(u", ".join(compile(col, state) for col in expr.columns))
+        parts.extend(separated(_comma, expr.columns))
 
     # TODO: Automatically infer tables
     if expr.tables is not None:
-        tokens.append(u"FROM")
-        tokens.append(u", ".join(compile(table, state) for table in expr.tables))
+        parts.append(Sql(u" FROM "))
+        parts.extend(separated(_comma, expr.tables))
 
     # TODO: Do not allow where, etc if there are no tables
 
     if expr.where is not None:
-        tokens.append(u"WHERE")
-        tokens.append(compile(expr.where, state))
+        parts.append(Sql(u" WHERE "))
+        parts.append(expr.where)
 
     if expr.group_by is not None:
-        tokens.append(u"GROUP BY")
-        tokens.append(u", ".join(compile(expr, state) for expr in expr.group_by))
+        parts.append(Sql(u" GROUP BY "))
+        parts.extend(separated(_comma, expr.group_by))
 
     if expr.having is not None:
-        tokens.append(u"HAVING")
-        tokens.append(compile(expr.where, state))
+        parts.append(Sql(u" HAVING "))
+        parts.append(expr.having)
 
     if expr.window is not None:
         # TODO: Implement window
-        #tokens.append(u"WINDOW")
-        #tokens.append(compile(, state))
+        #parts.append(Sql(u" WINDOW "))
         pass
 
     if expr.order_by is not None:
-        tokens.append(u"GROUP BY")
-        tokens.append(u", ".join(compile(expr, state) for expr in expr.order_by))
+        parts.append(Sql(u" ORDER BY "))
+        parts.extend(separated(_comma, expr.order_by))
 
     if expr.limit is not None:
-        tokens.append(u"LIMIT {:d}".format(expr.limit))
+        parts.append(Sql(u" LIMIT {:d}".format(expr.limit)))
 
     if expr.offset is not None:
-        tokens.append(u"OFFSET {:d}".format(expr.offset))
+        parts.append(Sql(u" OFFSET {:d}".format(expr.offset)))
+
+    return parts
+
+class With(Expression):
+    """
+    Common table expression, ``name (columns) AS [NOT] MATERIALIZED (query)``,
+    for the ``with_`` clause of :class:`Select`.
+
+    .. code-block:: python
+
+        tree = With(
+            u"tree",
+            UnionAll(
+                Select(columns=[Column("id")], tables=[Table("nodes")],
+                    where=Column("parent_id") == None),
+                Select(
+                    columns=[Column("id", "nodes")],
+                    tables=[Table("nodes"), Table("tree")],
+                    where=Column("parent_id", "nodes") == Column("id", "tree"))),
+            columns=["id"],
+            recursive=True)
+        Select(tables=[Table("tree")], with_=[tree])
+
+    :param name: Name of the table
+    :param query: Query whose rows make up the table
+    :param columns: Names of the columns, or ``None`` to use the names of the
+                    query
+    :param materialized: ``True`` to compute the query once and store the
+                         result, ``False`` to let the database inline the query
+                         into the statement, or ``None`` to let the database
+                         decide. Supported by PostgreSQL 12 and SQLite 3.35 and
+                         later.
+    :param recursive: Whether the query refers to the table itself. The whole
+                      ``WITH`` clause is ``RECURSIVE`` if any of its expressions
+                      are.
+    """
+
+    __slots__ = ("name", "query", "columns", "materialized", "recursive")
+    literals = ("name", "columns", "materialized", "recursive")
+    precedence = 0
 
-    return u" ".join(tokens)
+    def __init__(
+            self, name, query, columns=None, materialized=None,
+            recursive=False):
+        self.name = name
+        self.query = query
+        self.columns = _frozen(columns)
+        self.materialized = materialized
+        self.recursive = recursive
+
+
+_materialized = {
+    None: u"",
+    True: u"MATERIALIZED ",
+    False: u"NOT MATERIALIZED ",
+}
+
+@compile.when(With)
+def compile_with(compile, expr, state):
+    head = expr.name
+    if expr.columns is not None:
+        head += u" ({})".format(u", ".join(expr.columns))
+    head += u" AS {}(".format(_materialized[expr.materialized])
+    return [Sql(head), expr.query, _close_bracket]
+
+
+class Values(Expression):
+    """
+    List of rows used as a table, ``(VALUES (...), (...)) AS alias (columns)``.
+
+    :param rows: Sequence of rows, where every row is a sequence of one value
+                 per column
+    :param alias: Name of the table
+    :param columns: Names of the columns
+    :param types: SQL types to cast the values of the first row to, or ``None``
+                  per column that needs no cast. Databases such as PostgreSQL
+                  derive the types of the columns from the first row, which
+                  matters when parameters are untyped.
+    """
+
+    __slots__ = ("rows", "alias", "columns", "types")
+    literals = ("alias", "columns", "types")
+
+    def __init__(self, rows, alias, columns, types=None):
+        self.rows = rows
+        self.alias = alias
+        self.columns = tuple(columns)
+        self.types = None if types is None else tuple(types)
+
+def _values_rows(expr):
+    parts = [Sql(u"VALUES ")]
+    types = expr.types
+    for i, row in enumerate(expr.rows):
+        if i:
+            parts.append(_comma)
+        parts.append(_open_bracket)
+
+        for j, value in enumerate(row):
+            if j:
+                parts.append(_comma)
+
+            if i == 0 and types is not None and types[j] is not None:
+                parts.append(Sql(u"CAST("))
+                parts.append(value)
+                parts.append(Sql(u" AS {})".format(types[j])))
+            else:
+                parts.append(value)
+
+        parts.append(_close_bracket)
+    return parts
+
+@compile.when(Values)
+def compile_values(compile, expr, state):
+    parts = [_open_bracket]
+    parts.extend(_values_rows(expr))
+    parts.append(Sql(u") AS {} ({})".format(
+        expr.alias, u", ".join(expr.columns))))
+    return parts
+
+
+class Update(Expression):
+    """
+    Update rows of a table.
+
+    .. code-block:: python
+
+        Update("users", [("name", "foo")], where=Column("id") == 1)
+
+    :param table: Table or table name to update
+    :param values: Non-empty mapping or sequence of ``(column, value)`` pairs,
+                   where columns are columns or column names and values are
+                   values or expressions. Mappings are ordered by column name.
+    :param where: Condition for the rows to update
+    :param from_: Tables to join with the updated table
+    """
+
+    __slots__ = ("table", "columns", "values", "from_", "where")
+    precedence = 0
+    literals = ("columns",)
 
-class Update(object):
-    pass
+    #: Maximum number of rows in one statement of a bulk update, see
+    #: :meth:`bulk`
+    max_rows = 500
 
-class Insert(object):
-    pass
+    def __init__(self, table, values, where=None, from_=None):
+        if isinstance(values, Mapping):
+            values = sorted(values.items(), key=lambda item: _name(item[0]))
+
+        self.table = Table(table) if isinstance(table, string_type) else table
+        self.columns = tuple(_name(column) for column, _ in values)
+        self.values = tuple(value for _, value in values)
+        self.from_ = from_
+        self.where = where
+
+    @classmethod
+    def bulk(
+            cls, table, keys, columns, rows, max_parameters=None, alias=u"v",
+            types=None):
+        """
+        Update many rows with different values using ``UPDATE ... FROM
+        (VALUES ...)`` rather than one statement per row.
+
+        .. code-block:: python
+
+            Update.bulk("users", ["id"], ["name"], [(1, ("foo",))])
+            # UPDATE users SET name = v.name
+            # FROM (VALUES (?, ?)) AS v (id, name) WHERE users.id = v.id
+
+        Rows are split into statements like :meth:`Insert.batches` does.
+
+        :param table: Name of the table to update
+        :param keys: Names of the columns that identify rows
+        :param columns: Names of the columns to update
+        :param rows: Iterable of ``(key, values)`` pairs, where ``key`` is a
+                     value, or a tuple of one value per key column, and
+                     ``values`` is a sequence of one value per updated column
+        :param max_parameters: Parameter limit, usually the ``max_parameters``
+                               of the compiler. ``None`` means no limit.
+        :param alias: Name of the table of new values
+        :param types: SQL types of the key and updated columns, see
+                      :class:`Values`
+        :return: Iterator of updates
+        """
+
+        keys = tuple(keys)
+        columns = tuple(columns)
+        names = keys + columns
+
+        conditions = [
+            Equal(Column(key, table), Column(key, alias)) for key in keys]
+        where = conditions[0] if len(conditions) == 1 else And(*conditions)
+
+        values = [(column, Column(column, alias)) for column in columns]
+
+        def flatten(row):
+            key, new_values = row
+            if not isinstance(key, tuple):
+                key = (key,)
+            return key + tuple(new_values)
+
+        size = batch_size(cls.max_rows, max_parameters, len(names))
+        for batch in batched((flatten(row) for row in rows), size):
+            yield cls(
+                table,
+                values,
+                where=where,
+                from_=[Values(batch, alias, names, types)])
+
+def _name(column):
+    return column.name if isinstance(column, Column) else column
+
+@compile.when(Update)
+def compile_update(compile, expr, state):
+    if not expr.columns:
+        raise ValueError(u"Updates require at least one column")
+
+    parts = [Sql(u"UPDATE "), expr.table, Sql(u" SET ")]
+    for i, (column, value) in enumerate(zip(expr.columns, expr.values)):
+        if i:
+            parts.append(_comma)
+        parts.append(Sql(u"{} = ".format(column)))
+        parts.append(value)
+
+    if expr.from_ is not None:
+        parts.append(Sql(u" FROM "))
+        parts.extend(separated(_comma, expr.from_))
+
+    if expr.where is not None:
+        parts.append(Sql(u" WHERE "))
+        parts.append(expr.where)
+    return parts
+
+def batch_size(max_rows, max_parameters, width):
+    """
+    Return the number of rows of ``width`` values that fit in one statement.
+
+    :param max_rows: Maximum number of rows
+    :param max_parameters: Parameter limit, or ``None`` if there is none
+    :param width: Number of parameters per row
+    :return: Number of rows, at least one
+    """
+
+    if max_parameters is None:
+        return max_rows
+    return max(1, min(max_rows, max_parameters // max(1, width)))
+
+
+def batched(rows, size):
+    """
+    Split rows into lists of ``size`` rows. Rows are read lazily. The remaining
+    rows are split into lists of power of two sizes, which limits the number of
+    distinct statements batches are compiled into.
+
+    :param rows: Iterable of rows
+    :param size: Number of rows per batch
+    :return: Iterator of lists of rows
+    """
+
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if len(batch) == size:
+            yield batch
+            continue
+
+        while batch:
+            part = 1
+            while part * 2 <= len(batch):
+                part *= 2
+            yield batch[:part]
+            batch = batch[part:]
+        return
+
+
+class Insert(Expression):
+    """
+    Insert rows into a table.
+
+    Without rows the insert compiles to a template with a placeholder for every
+    column, which can be passed to ``executemany`` together with the rows.
+
+    Inserts with many rows can be split into inserts that bind a limited number
+    of parameters using :meth:`batches`.
+
+    :param table: Table or table name to insert into
+    :param columns: Columns or column names to insert values for, at least one
+    :param rows: Non-empty sequence of rows, where every row is a sequence of
+                 one value per column. Any iterable may be used when the insert
+                 is only used through :meth:`batches`.
+    """
+
+    __slots__ = ("table", "columns", "rows")
+    precedence = 0
+    literals = ("columns",)
+
+    #: Maximum number of rows in one batch, see :meth:`batches`
+    max_rows = 500
+
+    def __init__(self, table, columns, rows=None):
+        self.table = Table(table) if isinstance(table, string_type) else table
+        self.columns = tuple(
+            c.name if isinstance(c, Column) else c for c in columns)
+        self.rows = rows
+
+    def batches(self, max_parameters=None):
+        """
+        Split the rows of this insert into inserts that bind at most
+        ``max_parameters`` parameters and contain at most :attr:`max_rows` rows.
+        Rows are read lazily, which means generators of any length can be
+        inserted.
+
+        All batches but the last ones have the same number of rows. The
+        remaining rows are split into batches of power of two sizes, which
+        limits the number of distinct statements that have to be prepared.
+
+        :param max_parameters: Parameter limit, usually the ``max_parameters``
+                               of the compiler. ``None`` means no limit.
+        :return: Iterator of inserts
+        """
+
+        size = batch_size(self.max_rows, max_parameters, len(self.columns))
+        for batch in batched(self.rows, size):
+            yield self.__class__(self.table, self.columns, batch)
+
+@compile.when(Insert)
+def compile_insert(compile, expr, state):
+    if not expr.columns:
+        raise ValueError(u"Inserts require at least one column")
+
+    parts = [
+        Sql(u"INSERT INTO "),
+        expr.table,
+        Sql(u" ({})".format(u", ".join(expr.columns))),
+    ]
+
+    if expr.rows is None:
+        # Template for executemany
+        paramstyle = get_paramstyle(state)
+        offset = len(state.parameters)
+        parts.append(Sql(u" VALUES ({})".format(u", ".join(
+            paramstyle.placeholder(offset + i)
+            for i in range(1, len(expr.columns) + 1)))))
+        return parts
+
+    if not isinstance(expr.rows, (list, tuple)):
+        raise TypeError(
+            u"Rows must be a list or tuple to be compiled, use batches()")
+
+    if not expr.rows:
+        raise ValueError(
+            u"Inserts require at least one row, rows must be None for an "
+            u"executemany template")
+
+    parts.append(Sql(u" VALUES "))
+    for i, row in enumerate(expr.rows):
+        if i:
+            parts.append(_comma)
+        parts.append(_open_bracket)
+        parts.extend(separated(_comma, row))
+        parts.append(_close_bracket)
+    return parts
 
 class Replace(object):
     pass
 
 
 
-class SetExpression(object):
+class SetExpression(Expression):
     __slots__ = ("left", "right")
+    precedence = 0
 
     operation = None
 
@@ -149,10 +626,17 @@ class SetExpression(object):
 
 @compile.when(SetExpression)
 def compile_set_expression(compile, expr, state):
-    return u"{left} {operation} {right}".format(
-        left=compile(expr.left, state),
-        operation=expr.operation,
-        right=compile(expr.right, state))
+    parts = _set_member(expr.left)
+    parts.append(Sql(u" {} ".format(expr.operation)))
+    parts.extend(_set_member(expr.right))
+    return parts
+
+def _set_member(expr):
+    # Nested set expressions are not bracketed, which makes chains read as one
+    # compound select
+    if isinstance(expr, SetExpression):
+        return [expr]
+    return [_open_bracket, expr, _close_bracket]
 
 class Union(SetExpression):
     __slots__ = ()
@@ -162,6 +646,10 @@ class Intersect(SetExpression):
     __slots__ = ()
     operation = "INTERSECT"
 
+class UnionAll(SetExpression):
+    __slots__ = ()
+    operation = "UNION ALL"
+
 class Except(SetExpression):
     __slots__ = ()
     operation = "EXCEPT"
@@ -0,0 +1,431 @@
+"""
+LesSQL simplification
+---------------------
+:func:`simplify` rewrites expression trees into shorter trees that give the
+same result in SQL, including when values are ``NULL``. Generated filters tend
+to contain nested ``AND`` and ``OR`` expressions, double negations and constant
+tests, which makes the SQL longer and compilation slower than necessary.
+
+.. code-block:: python
+
+    simplify(And(Column("a") == 1, And(True, Column("b") == 2 + 3)))
+    # And(Column("a") == 1, Column("b") == 5), compiled as "a = ? AND b = ?"
+
+The following rewrites are performed:
+
+- Nested ``AND`` and ``OR`` expressions are flattened, and ones with a single
+  operand are replaced by that operand
+- ``x AND TRUE`` is replaced by ``x``, ``x AND FALSE`` by ``FALSE``, ``x OR
+  FALSE`` by ``x`` and ``x OR TRUE`` by ``TRUE``. This holds for ``NULL`` too,
+  since ``NULL AND FALSE`` is ``FALSE`` and ``NULL OR TRUE`` is ``TRUE``.
+- ``NOT NOT x`` is replaced by ``x`` and ``NOT`` of booleans is folded
+
+``x AND TRUE`` and ``NOT NOT x`` are only replaced by ``x`` when ``x`` is a
+comparison or a logical operator. Other values are converted to booleans by
+the database, for example ``NOT NOT 5`` is ``1`` in SQLite.
+- Arithmetic and comparisons of integer constants are folded
+
+Only integers within the range of a 32-bit ``integer`` are folded, since the
+database would raise an error on overflow. Expressions are never folded into
+``None``, since comparing to ``None`` compiles into ``IS NULL``. Functions such
+as :class:`~lessql.expr.functions.Sqrt` and
+:class:`~lessql.expr.functions.Power` are not folded, since they return double
+precision numbers, which are not passed as parameters. Their arguments are
+simplified though.
+
+:func:`canonicalize` sorts the operands of commutative operators, which means
+that trees built in different orders compile into the same SQL. This raises the
+hit rate of statement caches in drivers and databases, and makes statistics
+such as ``pg_stat_statements`` group the statements together.
+
+.. code-block:: python
+
+    compile(canonicalize(And(Column("b") == 2, Column("a") == 1)))
+    # "a = ? AND b = ?", the same as for And(Column("a") == 1, Column("b") == 2)
+
+Trees are not modified by either function. Sub-trees that do not change are
+shared by the new tree.
+"""
+
+import operator
+
+from .._compat import longint
+from .common import Expression, get_layout, replace_slots, structural_key
+from .operators import (
+    Add, And, Divide, Equal, GreaterThan, GreaterThanEqual, In, Is, IsNot,
+    LessThan, LessThanEqual, Modulo, Multiply, Not, NotEqual, NotIn, Or,
+    Subtract, UnaryMinus, UnaryPlus)
+
+
+__all__ = [
+    "canonicalize",
+    "simplify",
+]
+
+
+def simplify(expr):
+    """
+    Return a simplified version of the given tree.
+
+    :param expr: Expression tree
+    :return: Expression tree, or a constant such as ``True``
+    """
+
+    if not isinstance(expr, Expression):
+        return expr
+
+    # Original and simplified node by id of every node visited. Originals are
+    # kept alive so that their ids are not reused.
+    results = {}
+
+    # Operands of flattened AND and OR expressions by id. Chains of nested
+    # expressions are flattened at once, since flattening them one level at a
+    # time takes quadratic time.
+    flattened = {}
+
+    stack = [(expr, False)]
+    while stack:
+        node, visited = stack.pop()
+        if id(node) in results:
+            continue
+
+        cls = node.__class__
+        if not visited:
+            stack.append((node, True))
+            if cls in _logical:
+                operands = flattened[id(node)] = _flatten(node)
+                _push_children(stack, operands)
+            else:
+                for name, literal in get_layout(cls):
+                    if not literal:
+                        _push_children(stack, getattr(node, name, None))
+            continue
+
+        if cls in _logical:
+            operands = flattened.pop(id(node))
+            new = _fold_logical(
+                node, _substitute(operands, results), *_logical[cls])
+        else:
+            new = _rebuild(node, get_layout(cls), results)
+            rule = _rules.get(new.__class__)
+            if rule is not None:
+                folded = rule(new)
+                if folded is not None:
+                    new = folded
+        results[id(node)] = (node, new)
+
+    return results[id(expr)][1]
+
+
+def _flatten(expr):
+    """
+    Return the operands of the given expression, with operands of nested
+    expressions of the same kind in their place.
+    """
+
+    cls = expr.__class__
+    operands = []
+    stack = [expr.exprs]
+    while stack:
+        exprs = stack.pop()
+        for i, operand in enumerate(exprs):
+            if operand.__class__ is cls:
+                stack.append(exprs[i + 1:])
+                stack.append(operand.exprs)
+                break
+            operands.append(operand)
+    return tuple(operands)
+
+
+def _push_children(stack, value):
+    if isinstance(value, Expression):
+        stack.append((value, False))
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _push_children(stack, item)
+
+
+def _substitute(value, results):
+    if isinstance(value, Expression):
+        return results[id(value)][1]
+
+    if isinstance(value, (list, tuple)):
+        items = [_substitute(item, results) for item in value]
+        if any(a is not b for a, b in zip(items, value)):
+            return value.__class__(items)
+    return value
+
+
+def _rebuild(node, layout, results):
+    """
+    Return the given node with its children replaced by their simplified
+    versions. The node itself is returned if no children changed.
+    """
+
+    changes = {}
+    for name, literal in layout:
+        if literal or not hasattr(node, name):
+            continue
+
+        value = getattr(node, name)
+        new_value = _substitute(value, results)
+        if new_value is not value:
+            changes[name] = new_value
+
+    if not changes:
+        return node
+    return replace_slots(node, changes)
+
+
+_min_integer = -2 ** 31
+_max_integer = 2 ** 31 - 1
+
+def _is_integer(value):
+    return value.__class__ in (int, longint) and \
+        _min_integer <= value <= _max_integer
+
+
+def _fold_logical(expr, operands, identity, absorbing):
+    """
+    Return an expression of the given operands without identity values.
+    Operands that were simplified into expressions of the same kind are
+    flattened too.
+    """
+
+    cls = expr.__class__
+    exprs = []
+    dropped = False
+    for operand in operands:
+        if operand.__class__ is cls:
+            nested = operand.exprs
+        else:
+            nested = (operand,)
+
+        for operand in nested:
+            if operand is absorbing:
+                return absorbing
+            if operand is identity:
+                dropped = True
+            else:
+                exprs.append(operand)
+
+    if not exprs:
+        return identity
+
+    if len(exprs) == 1 and exprs[0] is not None:
+        if not dropped or _is_boolean(exprs[0]):
+            return exprs[0]
+
+        # Keep the identity, which converts the operand into a boolean
+        exprs.append(identity)
+
+    if len(exprs) == len(expr.exprs) and \
+            all(a is b for a, b in zip(exprs, expr.exprs)):
+        return expr
+    return cls(*exprs)
+
+
+def _fold_not(expr):
+    operand = expr.operand
+    if operand is True or operand is False:
+        return not operand
+    if operand.__class__ is Not and _is_boolean(operand.operand):
+        return operand.operand
+    return None
+
+
+def _fold_unary(func):
+    def fold(expr):
+        if _is_integer(expr.operand):
+            value = func(expr.operand)
+            if _is_integer(value):
+                return value
+        return None
+    return fold
+
+
+def _fold_binary(func):
+    def fold(expr):
+        left, right = expr.left, expr.right
+        if _is_integer(left) and _is_integer(right):
+            value = func(left, right)
+            if value is not None and (value is True or value is False or
+                    _is_integer(value)):
+                return value
+        return None
+    return fold
+
+
+def _divide(left, right):
+    # SQL truncates integer division while Python floors it. They only agree
+    # when there is no remainder.
+    if right and left % right == 0:
+        return left // right
+    return None
+
+def _modulo(left, right):
+    # The sign of the result follows the left operand in SQL and the right one
+    # in Python
+    if right > 0 and left >= 0:
+        return left % right
+    return None
+
+
+#: Operators that always give a boolean or ``NULL``
+_boolean = frozenset([
+    And, Or, Not, Equal, NotEqual, GreaterThan, GreaterThanEqual, LessThan,
+    LessThanEqual, Is, IsNot, In, NotIn])
+
+def _is_boolean(value):
+    return value is True or value is False or value.__class__ in _boolean
+
+
+#: Identity and absorbing values of logical operators
+_logical = {
+    And: (True, False),
+    Or: (False, True),
+}
+
+_rules = {
+    Not: _fold_not,
+    UnaryMinus: _fold_unary(operator.neg),
+    UnaryPlus: _fold_unary(operator.pos),
+    Add: _fold_binary(operator.add),
+    Subtract: _fold_binary(operator.sub),
+    Multiply: _fold_binary(operator.mul),
+    Divide: _fold_binary(_divide),
+    Modulo: _fold_binary(_modulo),
+    Equal: _fold_binary(operator.eq),
+    NotEqual: _fold_binary(operator.ne),
+    GreaterThan: _fold_binary(operator.gt),
+    GreaterThanEqual: _fold_binary(operator.ge),
+    LessThan: _fold_binary(operator.lt),
+    LessThanEqual: _fold_binary(operator.le),
+}
+
+
+def canonicalize(expr):
+    """
+    Return a version of the given tree where the operands of ``AND``, ``OR``,
+    ``=``, ``+`` and ``*`` are sorted. Operands are ordered by their structure
+    first, which means that trees that only differ in parameter values always
+    compile into the same SQL. The order is the same in every process.
+
+    Comparisons with ``None`` are left as is, since ``x = NULL`` compiles into
+    ``x IS NULL`` while ``NULL = x`` does not.
+
+    :param expr: Expression tree
+    :return: Expression tree
+    """
+
+    if not isinstance(expr, Expression):
+        return expr
+
+    # Original and canonical node by id of every node visited
+    results = {}
+
+    # Sort keys by id of canonical nodes
+    keys = {}
+
+    stack = [(expr, False)]
+    while stack:
+        node, visited = stack.pop()
+        if id(node) in results:
+            continue
+
+        cls = node.__class__
+        layout = get_layout(cls)
+        if not visited:
+            stack.append((node, True))
+            for name, literal in layout:
+                if not literal:
+                    _push_children(stack, getattr(node, name, None))
+            continue
+
+        new = _rebuild(node, layout, results)
+        order = _orderings.get(cls)
+        if order is not None:
+            new = order(new, keys)
+        keys[id(new)] = _node_key(new, layout, keys)
+        results[id(node)] = (node, new)
+
+    return results[id(expr)][1]
+
+
+def _class_name(cls):
+    return u"{}.{}".format(cls.__module__, cls.__name__)
+
+
+def _sort_key(value, keys):
+    """
+    Return a pair of the structure and the parameter values of the given value.
+    Nodes must have been given a key already.
+    """
+
+    if isinstance(value, Expression):
+        return keys[id(value)]
+
+    if isinstance(value, (list, tuple)):
+        items = [_sort_key(item, keys) for item in value]
+        return (
+            (2, _class_name(value.__class__), tuple(s for s, _ in items)),
+            tuple(v for _, v in items))
+
+    return (1, _class_name(value.__class__)), value
+
+
+def _literal_key(value):
+    # Literals are part of the structure, and may contain nodes such as
+    # columns. Classes are replaced by their names to make the order stable.
+    return tuple(
+        _class_name(item) if isinstance(item, type) else item
+        for item in structural_key(value))
+
+
+def _node_key(node, layout, keys):
+    shape = [0, _class_name(node.__class__)]
+    values = []
+    for name, literal in layout:
+        if not hasattr(node, name):
+            shape.append((3,))
+        elif literal:
+            shape.append((4, _literal_key(getattr(node, name))))
+        else:
+            item_shape, item_values = _sort_key(getattr(node, name), keys)
+            shape.append(item_shape)
+            values.append(item_values)
+    return tuple(shape), tuple(values)
+
+
+def _order_operands(expr, keys):
+    try:
+        exprs = sorted(expr.exprs, key=lambda e: _sort_key(e, keys))
+    except (TypeError, RuntimeError):
+        # Values that can't be ordered, or trees too deep to compare
+        return expr
+
+    if all(a is b for a, b in zip(exprs, expr.exprs)):
+        return expr
+    return expr.__class__(*exprs)
+
+
+def _order_binary(expr, keys):
+    left, right = expr.left, expr.right
+    if left is None or right is None:
+        return expr
+
+    try:
+        if _sort_key(right, keys) < _sort_key(left, keys):
+            return expr.__class__(right, left)
+    except (TypeError, RuntimeError):
+        pass
+    return expr
+
+
+_orderings = {
+    And: _order_operands,
+    Or: _order_operands,
+    Equal: _order_binary,
+    Add: _order_binary,
+    Multiply: _order_binary,
+}
@@ -1,16 +1,17 @@
 from .._compat import ustr, bstr, longint
 from .base import compile
+from .paramstyles import get_paramstyle
 
 # Functions here are not intended to be used
 __all__ = []
 
-@compile.when(
-    int, longint,
-    bstr, ustr, # basestring is not used since this makes lookup faster
-    bool, type(None))
+#: Types that are passed to the database as parameters. basestring is not used
+#: since this makes lookup faster
+parameter_types = (int, longint, bstr, ustr, bool)
+
+@compile.when(*parameter_types)
 def compile_builtins(compile, expr, state):
-    state.parameters.append(expr)
-    return u"?"
+    return get_paramstyle(state).bind(state, expr)
 
 @compile.when(None)
 def compile_none(compile, expr, state):
@@ -0,0 +1,397 @@
+"""
+LesSQL connection pool
+----------------------
+:class:`Database` hands out :class:`~lessql.connection.Connection` objects to
+threads. Connections are created on demand up to ``max_size``, kept open down
+to ``min_size`` and closed when they have been idle for too long.
+
+.. code-block:: python
+
+    import sqlite3
+    from functools import partial
+
+    db = Database(
+        partial(sqlite3.connect, "app.db", check_same_thread=False),
+        compile=sqlite,
+        max_size=4)
+
+    with db.connection() as conn:
+        conn.hooks.append(log_statement)
+        conn.execute(Select(tables=[Table("users")])).fetchall()
+
+Debug hooks are attached to a single checked out connection rather than the
+whole pool, and are removed when the connection is returned.
+"""
+
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from timeit import default_timer
+
+from .connection import Connection
+from .expr.paramstyles import qmark
+
+
+__all__ = [
+    "Database",
+    "PoolTimeout",
+]
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection became available within the timeout.
+    """
+
+
+def ping(conn):
+    """
+    Default health check that runs ``SELECT 1`` on the given connection.
+
+    :param conn: DB-API connection
+    :return: ``True`` if the connection works
+    """
+
+    try:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(u"SELECT 1")
+            cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+class Database(object):
+    """
+    Thread-safe pool of connections.
+
+    :param connect: Function that returns a new DB-API connection. Connections
+                    must be usable from other threads than the one that created
+                    them.
+    :param compile: Compiler to use for all connections
+    :param paramstyle: Parameter style of the driver
+    :param min_size: Number of connections to keep open even when idle
+    :param max_size: Maximum number of connections
+    :param max_idle: Seconds after which idle connections above ``min_size``
+                     are closed
+    :param timeout: Default number of seconds to wait for a connection, or
+                    ``None`` to wait forever
+    :param health_check: Function taking a DB-API connection that returns
+                         whether it works, ``None`` to disable checks
+    :param check_after: Seconds a connection must have been idle before it is
+                        checked when handed out
+    :param timer: Function returning the current time in seconds
+    """
+
+    def __init__(
+            self, connect, compile=None, paramstyle=qmark, min_size=1,
+            max_size=10, max_idle=300.0, timeout=None, health_check=ping,
+            check_after=30.0, timer=None):
+        if not 0 <= min_size <= max_size or max_size < 1:
+            raise ValueError(u"Expected 0 <= min_size <= max_size and 1 <= "
+                u"max_size")
+
+        self.connect = connect
+        self.compile = compile
+        self.paramstyle = paramstyle
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.health_check = health_check
+        self.check_after = check_after
+        self.timer = default_timer if timer is None else timer
+
+        #: Number of connections handed out
+        self.acquisitions = 0
+
+        #: Number of acquisitions that had to wait for a connection
+        self.waits = 0
+
+        #: Total and longest number of seconds spent waiting for connections
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+        #: Number of connections opened
+        self.created = 0
+
+        #: Number of idle connections closed by :meth:`evict_idle`
+        self.evictions = 0
+
+        #: Number of connections that failed their health check
+        self.failed_checks = 0
+
+        self._lock = threading.Condition(threading.Lock())
+
+        # Idle connections as (connection, time released) pairs, most recently
+        # released last
+        self._idle = deque()
+        self._in_use = set()
+
+        # Connections being opened, which count towards max_size
+        self._opening = 0
+        self._closed = False
+
+        for _ in range(min_size):
+            self._idle.append((self._open(), self.timer()))
+
+    @property
+    def size(self):
+        """
+        Number of open connections, both idle and in use.
+        """
+
+        with self._lock:
+            return len(self._idle) + len(self._in_use) + self._opening
+
+    @property
+    def idle(self):
+        """
+        Number of idle connections.
+        """
+
+        with self._lock:
+            return len(self._idle)
+
+    @property
+    def in_use(self):
+        """
+        Number of connections that are handed out.
+        """
+
+        with self._lock:
+            return len(self._in_use)
+
+    def _open(self):
+        conn = Connection(
+            self.connect(), self.compile, paramstyle=self.paramstyle)
+        with self._lock:
+            self.created += 1
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def acquire(self, timeout=Ellipsis):
+        """
+        Return a connection, waiting for one to be released if the pool is
+        full. Connections must be returned using :meth:`release`.
+
+        :param timeout: Seconds to wait, defaults to the pool's timeout
+        :return: Connection
+        :raises PoolTimeout: If no connection became available in time
+        """
+
+        if timeout is Ellipsis:
+            timeout = self.timeout
+
+        timer = self.timer
+        start = timer()
+        waited = False
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise ValueError(u"Database is closed")
+
+                while not self._idle and \
+                        len(self._in_use) + self._opening >= self.max_size:
+                    remaining = None
+                    if timeout is not None:
+                        remaining = timeout - (timer() - start)
+                        if remaining <= 0:
+                            raise PoolTimeout(
+                                u"No connection available within {} "
+                                u"seconds".format(timeout))
+
+                    waited = True
+                    self._lock.wait(remaining)
+
+                    if self._closed:
+                        raise ValueError(u"Database is closed")
+
+                if self._idle:
+                    conn, released = self._idle.pop()
+                    self._in_use.add(conn)
+                else:
+                    conn = released = None
+                    self._opening += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                finally:
+                    with self._lock:
+                        self._opening -= 1
+                        if conn is not None:
+                            self._in_use.add(conn)
+                        else:
+                            self._lock.notify()
+            elif self.health_check is not None and \
+                    timer() - released >= self.check_after and \
+                    not self.health_check(conn.connection):
+                with self._lock:
+                    self.failed_checks += 1
+                self._discard(conn)
+                continue
+            break
+
+        elapsed = timer() - start
+        with self._lock:
+            self.acquisitions += 1
+            if waited:
+                self.waits += 1
+                self.wait_time += elapsed
+                self.max_wait_time = max(self.max_wait_time, elapsed)
+        return conn
+
+    def release(self, conn, discard=False):
+        """
+        Return a connection to the pool. Its debug hooks are removed.
+
+        :param conn: Connection returned by :meth:`acquire`
+        :param discard: Close the connection rather than reusing it
+        """
+
+        del conn.hooks[:]
+
+        if discard:
+            self._discard(conn)
+            return
+
+        with self._lock:
+            self._in_use.remove(conn)
+            if self._closed:
+                self._close(conn)
+            else:
+                self._idle.append((conn, self.timer()))
+            self._lock.notify()
+
+        self.evict_idle()
+
+    def _discard(self, conn):
+        with self._lock:
+            self._in_use.discard(conn)
+            self._lock.notify()
+        self._close(conn)
+
+    def evict_idle(self):
+        """
+        Close connections above ``min_size`` that have been idle for longer
+        than ``max_idle``. This is done whenever a connection is released.
+
+        :return: Number of connections closed
+        """
+
+        now = self.timer()
+        evicted = []
+        with self._lock:
+            idle = self._idle
+            while idle and len(idle) + len(self._in_use) > self.min_size and \
+                    now - idle[0][1] >= self.max_idle:
+                evicted.append(idle.popleft()[0])
+            self.evictions += len(evicted)
+
+        for conn in evicted:
+            self._close(conn)
+        return len(evicted)
+
+    @contextmanager
+    def connection(self, timeout=Ellipsis):
+        """
+        Context manager that acquires a connection and releases it when done.
+        The transaction is committed if the block succeeds and rolled back
+        otherwise. Connections are discarded if rolling back fails.
+        """
+
+        conn = self.acquire(timeout)
+        try:
+            yield conn
+        except:
+            try:
+                conn.rollback()
+            except Exception:
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+            raise
+        else:
+            try:
+                conn.commit()
+            finally:
+                self.release(conn)
+
+    def execute(self, expr):
+        """
+        Execute an expression on a connection from the pool and commit.
+
+        :param expr: Expression tree
+        :return: List of result rows, empty for statements without results
+        """
+
+        with self.connection() as conn:
+            cursor = conn.execute(expr)
+            if cursor.description is None:
+                return []
+            return cursor.fetchall()
+
+    def stream(self, expr, batch_size=1000):
+        """
+        Execute an expression on a connection from the pool and yield its rows
+        as they are fetched, see :meth:`Connection.stream`. The connection is
+        released when all rows have been read or iteration stops early.
+
+        :param expr: Expression tree
+        :param batch_size: Number of rows to fetch at a time
+        :return: Iterator of rows
+        """
+
+        with self.connection() as conn:
+            with conn.stream(expr, batch_size) as result:
+                for row in result:
+                    yield row
+
+    def stats(self):
+        """
+        Return a dict of pool metrics.
+        """
+
+        with self._lock:
+            return {
+                "size": len(self._idle) + len(self._in_use) + self._opening,
+                "idle": len(self._idle),
+                "in_use": len(self._in_use),
+                "acquisitions": self.acquisitions,
+                "waits": self.waits,
+                "wait_time": self.wait_time,
+                "max_wait_time": self.max_wait_time,
+                "created": self.created,
+                "evictions": self.evictions,
+                "failed_checks": self.failed_checks,
+            }
+
+    def close(self):
+        """
+        Close all idle connections. Connections in use are closed when they are
+        released.
+        """
+
+        with self._lock:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._lock.notify_all()
+
+        for conn in idle:
+            self._close(conn)
+
+    def __repr__(self):
+        return "{0.__class__.__name__}(min_size={0.min_size}, " \
+            "max_size={0.max_size}, size={0.size})".format(self)
@@ -0,0 +1,148 @@
+"""
+LesSQL rows
+-----------
+Row types are tuples with attribute access by column name. They have no
+per-instance ``__dict__``, which means a row uses exactly as much memory as a
+plain tuple of its values.
+
+.. code-block:: python
+
+    rows = conn.fetch(Select(
+        columns=[Column("id"), Column("name")], tables=[Table("users")]))
+    rows[0].name
+
+A row type is generated once per list of column names and reused for every
+statement with the same columns.
+"""
+
+import keyword
+import re
+
+from operator import itemgetter
+
+from .expr.query import Column, Select
+
+
+__all__ = [
+    "Row",
+    "row_type",
+    "row_type_for",
+]
+
+
+class Row(tuple):
+    """
+    Base class of generated row types.
+    """
+
+    __slots__ = ()
+
+    #: Attribute names of the columns
+    _fields = ()
+
+    #: Column names as given to :func:`row_type`
+    _names = ()
+
+    @classmethod
+    def _make(cls, values):
+        return tuple.__new__(cls, values)
+
+    def _asdict(self):
+        """
+        Return a dict of column names and values.
+        """
+
+        return dict(zip(self._names, self))
+
+    def __reduce__(self):
+        # Generated classes can not be looked up by name when unpickling
+        return (_rebuild, (self._names, tuple(self)))
+
+    def __repr__(self):
+        return u"Row({})".format(u", ".join(
+            u"{}={!r}".format(name, value)
+            for name, value in zip(self._fields, self)))
+
+
+def _rebuild(names, values):
+    return row_type(names)._make(values)
+
+
+_identifier = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+def _fields(names):
+    """
+    Return attribute names for the given column names. Names that are not
+    valid identifiers, or that have been used before, are replaced by ``_``
+    followed by their index.
+    """
+
+    fields = []
+    for i, name in enumerate(names):
+        if name is None or not _identifier.match(name) or \
+                keyword.iskeyword(name) or name in fields:
+            name = u"_{:d}".format(i)
+        fields.append(name)
+    return tuple(fields)
+
+
+# Generated row types per tuple of column names
+_row_types = {}
+
+
+def row_type(names):
+    """
+    Return a row type for the given column names, generating it if needed.
+
+    :param names: Column names. Names that are not valid Python identifiers
+                  are only accessible by index, or as ``_`` followed by their
+                  index.
+    :return: Subclass of :class:`Row`
+    """
+
+    names = tuple(names)
+    try:
+        return _row_types[names]
+    except KeyError:
+        pass
+
+    fields = _fields(names)
+    namespace = {
+        "__slots__": (),
+        "_fields": fields,
+        "_names": names,
+    }
+    for i, field in enumerate(fields):
+        namespace[str(field)] = property(itemgetter(i))
+
+    cls = _row_types[names] = type(str("Row"), (Row,), namespace)
+    return cls
+
+
+def row_type_for(expr, description=None):
+    """
+    Return a row type for the results of the given expression. Names are taken
+    from the columns of selects. Columns that are expressions rather than
+    plain columns are named after the cursor description if given.
+
+    :param expr: Expression tree that was executed
+    :param description: DB-API cursor description
+    :return: Subclass of :class:`Row`
+    """
+
+    names = None
+    if isinstance(expr, Select) and expr.columns is not None:
+        names = [
+            column.name if isinstance(column, Column) else None
+            for column in expr.columns]
+
+    if description is not None:
+        if names is None or len(names) != len(description):
+            names = [None] * len(description)
+        names = [
+            description[i][0] if name is None else name
+            for i, name in enumerate(names)]
+
+    if names is None:
+        raise ValueError(u"Column names are unknown")
+    return row_type(names)
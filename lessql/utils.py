@@ -1,8 +1,9 @@
 import inspect
 
-from collections import MutableMapping
 from weakref import WeakValueDictionary
 
+from ._compat import MutableMapping
+
 __all__ = [
     "ClassDict",
     "get_class",
@@ -16,32 +17,57 @@ class ClassDict(MutableMapping):
 
     The constructor accepts the same arguments as ``dict``.
 
+    Lookups are memoized per class, which means that resolving the same class
+    twice only costs a single dict lookup. The memo is cleared whenever keys are
+    added or removed.
+
     :param mapping_or_iterable: Mapping or iterable like the first argument of
                                 ``dict()``.
     """
 
     def __init__(self, mapping_or_iterable=None):
         self.data = {}
+        self.resolved = {}
 
         if mapping_or_iterable is None:
             return
 
-        for k, v in dict(mapping_or_iterable).iteritems():
+        for k, v in dict(mapping_or_iterable).items():
             self[k] = v
 
-    def __getitem__(self, item):
-        for cls in get_class(item).__mro__:
-            if cls in self.data:
-                return self.data[cls]
+    def resolve(self, cls):
+        """
+        Return the value for the given class or its closest parent in the method
+        resolution order. Unlike ``__getitem__`` this requires a class and will
+        not accept instances.
+
+        :param cls: Class to look up value for
+        :return: Value associated with the class or closest parent
+        :raises KeyError: If neither the class nor any parent class has a value
+        """
 
-        raise KeyError(u"No data for class '{}'".format(
-            get_class(item).__name__))
+        try:
+            return self.resolved[cls]
+        except KeyError:
+            pass
+
+        for parent in cls.__mro__:
+            if parent in self.data:
+                value = self.resolved[cls] = self.data[parent]
+                return value
+
+        raise KeyError(u"No data for class '{}'".format(cls.__name__))
+
+    def __getitem__(self, item):
+        return self.resolve(get_class(item))
 
     def __setitem__(self, item, value):
         self.data[get_class(item)] = value
+        self.resolved.clear()
 
     def __delitem__(self, item):
         del self.data[get_class(item)]
+        self.resolved.clear()
 
     def __iter__(self):
         for item in self.data:
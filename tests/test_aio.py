@@ -0,0 +1,114 @@
+import pytest
+import sqlite3
+import threading
+
+from functools import partial
+
+from lessql.expr.query import Column, Insert, Select, Table
+from lessql.pool import Database
+
+asyncio = pytest.importorskip("asyncio")
+
+from lessql.aio import AsyncDatabase, interrupt
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = str(tmpdir.join(u"test.db"))
+    conn = sqlite3.connect(path)
+    conn.execute(u"CREATE TABLE users (id INTEGER, name TEXT)")
+    conn.execute(u"INSERT INTO users VALUES (1, 'foo'), (2, 'bar')")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def db(path):
+    db = Database(
+        partial(sqlite3.connect, path, check_same_thread=False), max_size=3)
+    yield db
+    db.close()
+
+
+def select_name(i):
+    return Select(
+        columns=[Column(u"name")],
+        tables=[Table(u"users")],
+        where=Column(u"id") == i)
+
+
+def test_fetch(loop, db):
+    adb = AsyncDatabase(db)
+    assert loop.run_until_complete(adb.fetch(select_name(1))) == [(u"foo",)]
+    adb.close()
+
+
+def test_execute(loop, db):
+    adb = AsyncDatabase(db)
+    insert = Insert(u"users", [u"id", u"name"], [(3, u"baz"), (4, u"qux")])
+    assert loop.run_until_complete(adb.execute(insert)) == 2
+    assert loop.run_until_complete(adb.fetch(select_name(4))) == [(u"qux",)]
+    adb.close()
+
+
+def test_fetch_many_overlaps(loop, path):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def connect():
+        conn = sqlite3.connect(path, check_same_thread=False)
+
+        # Both queries must run at the same time to pass the barrier
+        conn.set_trace_callback(
+            lambda sql: barrier.wait() if sql.startswith(u"SELECT") else None)
+        return conn
+
+    db = Database(connect, max_size=2, health_check=None)
+    adb = AsyncDatabase(db)
+    rows = loop.run_until_complete(
+        adb.fetch_many([select_name(1), select_name(2)]))
+    assert rows == [[(u"foo",)], [(u"bar",)]]
+    adb.close()
+    db.close()
+
+
+def test_max_in_flight(loop, db):
+    adb = AsyncDatabase(db, max_in_flight=1)
+    assert adb.executor._max_workers == 1
+    adb.close()
+
+
+def test_cancel_pending(loop, db):
+    adb = AsyncDatabase(db, max_in_flight=1)
+    event = threading.Event()
+
+    blocker = loop.run_in_executor(adb.executor, event.wait)
+    future = adb.execute(Insert(u"users", [u"id"], [(5,)]))
+    future.cancel()
+    event.set()
+    loop.run_until_complete(blocker)
+
+    assert loop.run_until_complete(adb.fetch(select_name(5))) == []
+    adb.close()
+
+
+def test_interrupt():
+    class Driver(object):
+        interrupted = False
+
+        def interrupt(self):
+            self.interrupted = True
+
+    driver = Driver()
+    assert interrupt(driver)
+    assert driver.interrupted
+    assert not interrupt(object())
@@ -0,0 +1,99 @@
+import pytest
+import struct
+
+from lessql._compat import is_python2
+from lessql.bulk import CopyEncoder, CopyReader, binary_header, binary_trailer
+
+
+def test_statement():
+    assert CopyEncoder(u"users", [u"id", u"name"]).statement() == \
+        u"COPY users (id, name) FROM STDIN"
+    assert CopyEncoder(u"users", [u"id"], u"binary").statement() == \
+        u"COPY users (id) FROM STDIN WITH (FORMAT binary)"
+
+
+@pytest.mark.parametrize("row, data", [
+    ((1, u"foo"), b"1\tfoo\n"),
+    ((None, u""), b"\\N\t\n"),
+    ((True, False), b"t\tf\n"),
+    ((2 ** 70, u"a\tb\nc\\d\r"), b"1180591620717411303424\ta\\tb\\nc\\\\d\\r\n"),
+    ((-1, u"\xe5"), b"-1\t\xc3\xa5\n"),
+])
+def test_encode_text_row(row, data):
+    assert CopyEncoder(u"t", [u"a", u"b"]).encode_row(row) == data
+
+
+@pytest.mark.skipif(is_python2, reason="Binary strings are text on Python 2")
+def test_encode_text_bytea():
+    assert CopyEncoder(u"t", [u"a"]).encode_row((b"\x00\xff",)) == \
+        b"\\\\x00ff\n"
+
+
+def test_encode_binary_row():
+    encoder = CopyEncoder(u"t", [u"a", u"b", u"c", u"d"], u"binary")
+    assert encoder.encode_row((1, u"foo", None, True)) == b"".join([
+        struct.pack("!h", 4),
+        struct.pack("!iq", 8, 1),
+        struct.pack("!i", 3), b"foo",
+        struct.pack("!i", -1),
+        struct.pack("!i", 1), b"\x01",
+    ])
+
+
+def test_encode_binary_types():
+    encoder = CopyEncoder(u"t", [u"a", u"b"], u"binary", [u"int2", u"int4"])
+    assert encoder.encode_row((1, 2)) == struct.pack("!hihii", 2, 2, 1, 4, 2)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"format": u"csv"},
+    {"types": [u"int4"]},
+    {"types": [u"int4", u"money"]},
+])
+def test_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        CopyEncoder(u"t", [u"a", u"b"], **kwargs)
+
+
+def test_invalid_rows():
+    encoder = CopyEncoder(u"t", [u"a"])
+    with pytest.raises(ValueError):
+        encoder.encode_row((1, 2))
+    with pytest.raises(KeyError):
+        encoder.encode_row((object(),))
+
+
+def test_chunks_bounded():
+    encoder = CopyEncoder(u"t", [u"a"], buffer_size=10)
+    rows = ((i,) for i in range(1000, 1010))
+    chunks = list(encoder.chunks(rows))
+    assert all(len(c) <= 10 for c in chunks)
+    assert len(chunks) == 5
+    assert b"".join(chunks) == b"".join(
+        u"{}\n".format(i).encode("ascii") for i in range(1000, 1010))
+
+
+def test_chunks_binary():
+    encoder = CopyEncoder(u"t", [u"a"], u"binary")
+    payload = b"".join(encoder.chunks([(1,), (2,)]))
+    assert payload.startswith(binary_header)
+    assert payload.endswith(binary_trailer)
+    assert len(payload) == len(binary_header) + 2 * 14 + 2
+
+    assert b"".join(encoder.chunks([])) == binary_header + binary_trailer
+
+
+def test_reader():
+    reader = CopyEncoder(u"t", [u"a"]).reader((i,) for i in range(3))
+    assert reader.readline() == b"0\n"
+    assert reader.read(3) == b"1\n2"
+    assert reader.read() == b"\n"
+    assert reader.read(10) == b""
+
+
+def test_reader_chunks():
+    reader = CopyReader([b"ab", b"c\nd", b"ef"])
+    assert reader.read(1) == b"a"
+    assert reader.readline() == b"bc\n"
+    assert reader.readline(2) == b"de"
+    assert reader.read(-1) == b"f"
@@ -0,0 +1,301 @@
+import pytest
+import sqlite3
+
+from lessql.connection import (
+    Connection, PostgresStatementManager, Result, StatementManager)
+from lessql.expr.dialects import sqlite
+from lessql.expr.operators import In
+from lessql.expr.paramstyles import format_, named
+from lessql.expr.prepared import Param
+from lessql.expr.query import Column, Insert, Select, Table, Update
+
+
+@pytest.fixture
+def conn():
+    conn = Connection(sqlite3.connect(":memory:"), sqlite, maxsize=2)
+    conn.execute_sql(u"CREATE TABLE users (id INTEGER, name TEXT)")
+    conn.execute_sql(
+        u"INSERT INTO users VALUES (1, 'foo'), (2, 'bar'), (3, 'baz')")
+    conn.statements.clear()
+    yield conn
+    conn.close()
+
+
+def select_names(where):
+    return Select(
+        columns=[Column(u"name")], tables=[Table(u"users")], where=where)
+
+
+def test_execute(conn):
+    cursor = conn.execute(select_names(Column(u"id") == 2))
+    assert cursor.fetchall() == [(u"bar",)]
+
+
+def test_execute_in_list(conn):
+    cursor = conn.execute(select_names(In(Column(u"id"), [1, 3])))
+    assert sorted(cursor.fetchall()) == [(u"baz",), (u"foo",)]
+
+
+def test_statement_reuse(conn):
+    for i in range(1, 4):
+        conn.execute(select_names(Column(u"id") == i)).fetchall()
+
+    statements = conn.statements
+    assert (statements.hits, statements.misses) == (2, 1)
+    assert statements.prepares == 1
+    assert statements.hit_rate == pytest.approx(2 / 3.0)
+    assert conn.compiler.hits == 2
+
+
+def test_statement_eviction(conn):
+    for where in [Column(u"id") == 1, Column(u"id") > 1, Column(u"id") < 1]:
+        conn.execute(select_names(where)).fetchall()
+
+    statements = conn.statements
+    assert len(statements) == 2
+    assert statements.evictions == 1
+    assert u"SELECT name FROM users WHERE id = ?" not in statements
+    assert u"SELECT name FROM users WHERE id < ?" in statements
+
+
+def test_statement_interleaved(conn):
+    # Executing the same statement while reading the results of another
+    # execution must not affect them
+    cursor = conn.execute(select_names(Column(u"id") > 0))
+    names = []
+    for row in cursor:
+        names.append(row[0])
+        assert conn.execute(select_names(Column(u"id") > 2)).fetchall() == \
+            [(u"baz",)]
+    assert names == [u"foo", u"bar", u"baz"]
+    assert (conn.statements.hits, conn.statements.misses) == (3, 1)
+
+
+def test_statement_eviction_keeps_cursors(conn):
+    first = conn.execute(select_names(Column(u"id") == 1))
+    conn.execute(select_names(Column(u"id") > 1)).fetchall()
+    conn.execute(select_names(Column(u"id") < 1)).fetchall()
+    assert conn.statements.evictions == 1
+    assert first.fetchall() == [(u"foo",)]
+
+
+def test_statement_manager_deallocate():
+    closed = []
+
+    class Recording(StatementManager):
+        def deallocate(self, sql, statement):
+            closed.append(sql)
+            super(Recording, self).deallocate(sql, statement)
+
+    conn = Connection(
+        sqlite3.connect(":memory:"), maxsize=1, statement_manager=Recording)
+    conn.execute_sql(u"SELECT 1")
+    conn.execute_sql(u"SELECT 2")
+    assert closed == [u"SELECT 1"]
+
+    conn.close()
+    assert closed == [u"SELECT 1", u"SELECT 2"]
+
+
+def test_postgres_statement_manager():
+    class Cursor(object):
+        def __init__(self, driver, name=None):
+            self.driver = driver
+            self.name = name
+
+        def execute(self, sql, parameters=None):
+            self.driver.calls.append((self.name, sql, parameters))
+
+        def executemany(self, sql, parameters):
+            self.driver.calls.append((self.name, sql, list(parameters)))
+
+        def fetchmany(self, size):
+            return []
+
+        def close(self):
+            pass
+
+    class Driver(object):
+        def __init__(self):
+            self.calls = []
+
+        def cursor(self, name=None):
+            return Cursor(self, name)
+
+        def close(self):
+            pass
+
+    driver = Driver()
+    conn = Connection(
+        driver, paramstyle=format_, maxsize=1,
+        statement_manager=PostgresStatementManager)
+    query = Select(
+        columns=[Column(u"a") % 2], tables=[Table(u"t")],
+        where=Column(u"a") > 1)
+
+    conn.execute(query)
+    conn.execute(query)
+    assert driver.calls == [
+        (None, u"PREPARE lessql_statement_1 AS "
+               u"SELECT a % $1 FROM t WHERE a > $2", None),
+        (None, u"EXECUTE lessql_statement_1 (%s, %s)", [2, 1]),
+        (None, u"EXECUTE lessql_statement_1 (%s, %s)", [2, 1]),
+    ]
+    assert conn.statements.prepares == 1
+
+    del driver.calls[:]
+    conn.executemany(Insert(u"t", [u"a"]), [(1,), (2,)])
+    assert driver.calls == [
+        (None, u"PREPARE lessql_statement_2 AS INSERT INTO t (a) VALUES ($1)",
+         None),
+        (None, u"DEALLOCATE lessql_statement_1", None),
+        (None, u"EXECUTE lessql_statement_2 (%s)", [[1], [2]]),
+    ]
+
+    del driver.calls[:]
+    list(conn.stream(query))
+    assert driver.calls[-1] == (
+        u"lessql_1", u"SELECT a %% %s FROM t WHERE a > %s", [2, 1])
+
+    del driver.calls[:]
+    conn.close()
+    assert driver.calls == [(None, u"DEALLOCATE lessql_statement_3", None)]
+
+
+def test_named_paramstyle():
+    conn = Connection(sqlite3.connect(":memory:"), paramstyle=named)
+    assert conn.compile(Column(u"a") == 1) == (u"a = :p1", {u"p1": 1})
+    conn.execute_sql(u"CREATE TABLE t (a INTEGER)")
+    conn.execute_sql(u"INSERT INTO t VALUES (1)")
+    assert conn.execute(
+        Select(columns=[Column(u"a") == 1], tables=[Table(u"t")])
+    ).fetchall() == [(1,)]
+
+
+def test_insert(conn):
+    rows = ((i, u"user{}".format(i)) for i in range(4, 1004))
+    assert conn.insert(Insert(u"users", [u"id", u"name"], rows)) == 1000
+
+    # 999 parameters allow 499 rows per statement, which means 1000 rows are
+    # inserted as 499 + 499 + 2
+    assert (conn.statements.hits, conn.statements.misses) == (1, 2)
+    assert conn.execute_sql(u"SELECT COUNT(*) FROM users").fetchone() == \
+        (1003,)
+
+
+def test_executemany(conn):
+    rows = [(i, u"user{}".format(i)) for i in range(4, 14)]
+    conn.executemany(Insert(u"users", [u"id", u"name"]), rows)
+    assert conn.statements.misses == 1
+    assert conn.execute_sql(u"SELECT COUNT(*) FROM users").fetchone() == (13,)
+
+
+def test_executemany_named():
+    conn = Connection(sqlite3.connect(":memory:"), paramstyle=named)
+    conn.execute_sql(u"CREATE TABLE t (a INTEGER, b INTEGER)")
+    conn.executemany(Insert(u"t", [u"a", u"b"]), [(1, 2), (3, 4)])
+    assert conn.execute_sql(u"SELECT a, b FROM t").fetchall() == \
+        [(1, 2), (3, 4)]
+
+
+def test_bulk_update(conn):
+    rows = [(1, (u"FOO",)), (3, (u"BAZ",))]
+    for update in Update.bulk(u"users", [u"id"], [u"name"], rows):
+        conn.execute(update)
+
+    cursor = conn.execute_sql(u"SELECT id, name FROM users ORDER BY id")
+    assert cursor.fetchall() == [(1, u"FOO"), (2, u"bar"), (3, u"BAZ")]
+
+
+def test_stream(conn):
+    conn.insert(Insert(u"users", [u"id", u"name"], (
+        (i, u"user{}".format(i)) for i in range(4, 104))))
+
+    result = conn.stream(Select(
+        columns=[Column(u"id")], tables=[Table(u"users")]), batch_size=7)
+    assert [row[0] for row in result] == list(range(1, 104))
+    assert result.closed
+    assert conn.named_cursors is False
+
+
+def test_stream_statement(conn):
+    query = Select(columns=[Column(u"id")], tables=[Table(u"users")])
+    assert list(conn.stream(query)) == [(1,), (2,), (3,)]
+    assert list(conn.stream(query)) == [(1,), (2,), (3,)]
+    assert conn.statements.hits == 1
+    assert conn.statements.misses == 1
+
+
+def test_stream_batches(conn):
+    class Cursor(object):
+        def __init__(self, cursor):
+            self.cursor = cursor
+            self.fetches = []
+            self.closed = False
+
+        def fetchmany(self, size):
+            rows = self.cursor.fetchmany(size)
+            self.fetches.append(len(rows))
+            return rows
+
+        def close(self):
+            self.closed = True
+
+    cursor = conn.connection.cursor()
+    cursor.execute(u"SELECT id FROM users")
+    cursor = Cursor(cursor)
+
+    result = Result(cursor, batch_size=2)
+    for row in result:
+        break
+    assert cursor.fetches == [2]
+    assert cursor.closed
+    assert result.closed
+    assert list(result) == []
+
+
+def test_stream_context_manager(conn):
+    with conn.stream(Select(tables=[Table(u"users")])) as result:
+        pass
+    assert result.closed
+
+
+def test_stream_named_cursors():
+    class Driver(object):
+        def __init__(self):
+            self.names = []
+
+        def cursor(self, name=None):
+            self.names.append(name)
+            return sqlite3.connect(":memory:").cursor()
+
+    driver = Driver()
+    conn = Connection(driver)
+    assert list(conn.stream(Select(columns=[1]))) == [(1,)]
+    assert conn.named_cursors is True
+    assert driver.names == [u"lessql_1"]
+
+
+def test_fetch_named(conn):
+    rows = conn.fetch(Select(
+        columns=[Column(u"id"), Column(u"name")],
+        tables=[Table(u"users")],
+        where=Column(u"id") < 3))
+    assert [(r.id, r.name) for r in rows] == [(1, u"foo"), (2, u"bar")]
+    assert rows[0].__class__ is rows[1].__class__
+
+
+def test_stream_named(conn):
+    result = conn.stream(Select(tables=[Table(u"users")]), named=True)
+    assert [r.name for r in result] == [u"foo", u"bar", u"baz"]
+
+
+def test_prepare(conn):
+    by_id = conn.prepare(select_names(Column(u"id") == Param(u"id")))
+    assert conn.execute(by_id, {u"id": 2}).fetchall() == [(u"bar",)]
+    assert conn.fetch(by_id, values={u"id": 3})[0].name == u"baz"
+
+    with conn.stream(by_id, named=True, values={u"id": 1}) as result:
+        assert [row.name for row in result] == [u"foo"]
+
+    assert conn.compiler.misses == 0
@@ -1,7 +1,9 @@
 import pytest
 import sys
 
-from lessql.expr.base import Associativity, Precedence, State, state_factory
+from lessql.expr.paramstyles import qmark
+from lessql.expr.base import (
+    Associativity, Compiler, Precedence, Sql, State, separated, state_factory)
 
 
 def test_associativity_order():
@@ -10,7 +12,7 @@ def test_associativity_order():
 
 def test_precedence_default():
     p = Precedence()
-    assert p.precedence == sys.maxint
+    assert p.precedence == sys.maxsize
     assert p.associativity == Associativity.none
 
 
@@ -159,3 +161,212 @@ def test_default_state():
     state = state_factory()
     assert state.parameters == []
     assert state.precedence == Precedence(0)
+
+
+def test_compiler_when_invalidates_dispatch():
+    class A(object):
+        pass
+
+    class B(A):
+        pass
+
+    compile = Compiler()
+
+    @compile.when(A)
+    def compile_a(compile, expr, state):
+        return u"a"
+
+    assert compile(B()) == u"a"
+
+    @compile.when(B)
+    def compile_b(compile, expr, state):
+        return u"b"
+
+    assert compile(A()) == u"a"
+    assert compile(B()) == u"b"
+
+
+def test_separated():
+    sep = Sql(u", ")
+    assert separated(sep, []) == []
+    assert separated(sep, [1]) == [1]
+    assert separated(sep, [1, 2, 3]) == [1, sep, 2, sep, 3]
+
+
+def test_compiler_parts():
+    class Pair(object):
+        precedence = 10
+
+        def __init__(self, left, right):
+            self.left = left
+            self.right = right
+
+    class Legacy(Pair):
+        precedence = 20
+
+    compile = Compiler()
+
+    @compile.when(int)
+    def compile_int(compile, expr, state):
+        state.parameters.append(expr)
+        return u"?"
+
+    @compile.when(Pair)
+    def compile_pair(compile, expr, state):
+        return [expr.left, Sql(u", "), expr.right]
+
+    @compile.when(Legacy)
+    def compile_legacy(compile, expr, state):
+        return u"{}; {}".format(
+            compile(expr.left, state), compile(expr.right, state))
+
+    state = state_factory()
+    expr = Pair(Legacy(1, Pair(2, 3)), Pair(4, 5))
+    assert compile(expr, state) == u"?; (?, ?), ?, ?"
+    assert state.parameters == [1, 2, 3, 4, 5]
+    assert len(state) == 2
+    assert state.precedence == Precedence(0)
+
+
+def test_state_setattr_restored_on_pop():
+    state = State(foo=u"bar")
+
+    with state():
+        state.foo = u"foobar"
+        state.biz = u"baz"
+        assert state.foo == u"foobar"
+        assert list(state.getall(u"foo")) == [u"foobar", u"bar"]
+
+    assert state.foo == u"bar"
+    with pytest.raises(AttributeError):
+        state.biz
+
+
+def test_state_precedence():
+    state = State()
+    with pytest.raises(AttributeError):
+        state.precedence
+
+    state.precedence = Precedence(1)
+    with state(precedence=Precedence(2)):
+        assert state.precedence == Precedence(2)
+        assert state.parent.precedence == Precedence(1)
+
+        with state(foo=u"bar"):
+            assert state.precedence == Precedence(2)
+            assert list(state.getall(u"precedence")) == [
+                Precedence(2), Precedence(1)]
+    assert state.precedence == Precedence(1)
+
+
+def test_state_compact():
+    state = State(foo=u"bar", precedence=Precedence(1))
+    with state(foo=u"foobar", biz=u"baz"):
+        assert state.compact() == {
+            u"foo": u"foobar",
+            u"biz": u"baz",
+            u"precedence": Precedence(1),
+        }
+    assert state.compact() == {u"foo": u"bar", u"precedence": Precedence(1)}
+
+
+def test_state_parent_after_push():
+    state = state_factory()
+    assert state.parent.paramstyle is state.paramstyle
+    assert state.parent.precedence == Precedence(0)
+
+    state.push()
+    assert state.parent.parameters is state.parameters
+
+    state.push(precedence=Precedence(1))
+    assert state.parent.parameters is state.parameters
+    assert state.parent.precedence == Precedence(0)
+    assert len(state.parent) == 3
+
+
+def test_state_parent_of_root():
+    state = State(foo=u"bar")
+    assert len(state.parent) == 1
+    with pytest.raises(AttributeError):
+        state.parent.foo
+
+
+def test_compiler_rule_state_restored():
+    class Node(object):
+        def __init__(self, *children):
+            self.children = children
+
+    compile = Compiler()
+
+    @compile.when(Node)
+    def compile_node(compile, expr, state):
+        state.depth = getattr(state, "depth", 0) + 1
+        return [Sql(u"{}(".format(state.depth))] + list(expr.children) + [
+            Sql(u")")]
+
+    state = state_factory()
+    assert compile(Node(Node(), Node(Node())), state) == u"1(1()1(1()))"
+    assert state.compact() == {
+        u"parameters": [],
+        u"paramstyle": qmark,
+        u"precedence": Precedence(0),
+    }
+
+
+def test_compiler_parent():
+    class A(object):
+        pass
+
+    class B(A):
+        pass
+
+    class C(B):
+        pass
+
+    parent = Compiler()
+    child = Compiler(parent)
+    grandchild = Compiler(child)
+
+    @parent.when(A)
+    def compile_a(compile, expr, state):
+        return u"a"
+
+    assert child(A()) == u"a"
+    assert grandchild(C()) == u"a"
+
+    @child.when(A)
+    def compile_child_a(compile, expr, state):
+        return u"child a"
+
+    assert parent(A()) == u"a"
+    assert child(A()) == u"child a"
+    assert grandchild(C()) == u"child a"
+
+    # The closest class wins, regardless of which compiler registered it
+    @parent.when(B)
+    def compile_b(compile, expr, state):
+        return u"b"
+
+    assert child(A()) == u"child a"
+    assert child(B()) == u"b"
+    assert grandchild(C()) == u"b"
+
+
+def test_compiler_parent_flattened():
+    class A(object):
+        pass
+
+    parent = Compiler()
+    child = Compiler(parent)
+
+    @parent.when(A)
+    def compile_a(compile, expr, state):
+        return u"a"
+
+    child(A())
+    assert child._dispatch[A][0] is parent._map.resolve(A)
+    assert child._get_table() is child._get_table()
+
+    parent.when(int)(lambda compile, expr, state: u"?")
+    assert child._table is None
+    assert child._dispatch == {}
@@ -0,0 +1,226 @@
+import pytest
+
+from lessql.expr import compile, state_factory
+from lessql.expr.base import Compiler
+from lessql.expr.cache import StatementCache, align, fingerprint
+from lessql.expr.common import Expression
+from lessql.expr.operators import And, In, Or
+from lessql.expr.paramstyles import Numeric, dollar
+from lessql.expr.query import Column, Select, Table
+
+
+def select(value):
+    return Select(
+        columns=[Column(u"id")],
+        tables=[Table(u"users")],
+        where=And(Column(u"name") == value, Column(u"age") > 18),
+        limit=10)
+
+
+def test_fingerprint_ignores_parameters():
+    key_a, values_a = fingerprint(select(u"foo"))
+    key_b, values_b = fingerprint(select(u"bar"))
+
+    assert key_a == key_b
+    assert values_a == [u"foo", 18]
+    assert values_b == [u"bar", 18]
+
+
+@pytest.mark.parametrize("a, b", [
+    (Column(u"a") == 1, Column(u"b") == 1),
+    (Column(u"a") == 1, Column(u"a") == None),
+    (Column(u"a") == 1, Column(u"a") != 1),
+    (And(1, 2), And(1, 2, 3)),
+    (And(1, 2), Or(1, 2)),
+    (Select(limit=1), Select(limit=2)),
+    (Select(tables=[Table(u"a")]), Select(tables=[Table(u"b")])),
+])
+def test_fingerprint_shape(a, b):
+    assert fingerprint(a)[0] != fingerprint(b)[0]
+
+
+def test_fingerprint_deep_tree():
+    expr = Column(u"a")
+    for i in range(10000):
+        expr = expr + i
+
+    key, values = fingerprint(expr)
+    assert values == list(range(10000))
+
+
+def test_cache_hit(state):
+    cache = StatementCache()
+
+    sql = cache(select(u"foo"), state)
+    assert sql == compile(select(u"foo"))
+    assert state.parameters == [u"foo", 18]
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    other_state = state_factory()
+    assert cache(select(u"bar"), other_state) == sql
+    assert other_state.parameters == [u"bar", 18]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_miss_on_none():
+    cache = StatementCache()
+
+    assert cache(Column(u"a") == 1) == u"a = ?"
+    assert cache(Column(u"a") == None) == u"a IS NULL"
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_cache_lru_eviction():
+    cache = StatementCache(maxsize=2)
+
+    cache(Column(u"a") == 1)
+    cache(Column(u"b") == 1)
+    cache(Column(u"a") == 2)
+    cache(Column(u"c") == 1)
+    assert len(cache) == 2
+
+    # b was least recently used and should be evicted
+    cache(Column(u"a") == 3)
+    cache(Column(u"b") == 2)
+    assert (cache.hits, cache.misses) == (2, 4)
+
+
+def test_cache_uncacheable_order():
+    class Reversed(Expression):
+        __slots__ = ("left", "right")
+
+        def __init__(self, left, right):
+            self.left = left
+            self.right = right
+
+    custom = Compiler()
+    custom.when(int)(compile._map[int])
+
+    @custom.when(Reversed)
+    def compile_reversed(compile, expr, state):
+        right = compile(expr.right, state)
+        return u"{}, {}".format(right, compile(expr.left, state))
+
+    cache = StatementCache(custom)
+    for i in range(2):
+        state = state_factory()
+        assert cache(Reversed(i, 2), state) == u"?, ?"
+        assert state.parameters == [2, i]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    # Identical values say nothing about the order of parameters
+    cache = StatementCache(custom)
+    for i in [2, 1]:
+        state = state_factory()
+        assert cache(Reversed(i, 2), state) == u"?, ?"
+        assert state.parameters == [2, i]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_cache_ambiguous():
+    cache = StatementCache()
+
+    def run(a, b):
+        state = state_factory()
+        sql = cache(And(Column(u"a") == a, Column(u"b") == b), state)
+        return sql, state.parameters
+
+    # Trees where different values are identical are cached separately
+    assert run(1, 1) == (u"a = ? AND b = ?", [1, 1])
+    assert run(1, 2) == (u"a = ? AND b = ?", [1, 2])
+    assert run(3, 3) == (u"a = ? AND b = ?", [3, 3])
+    assert run(4, 5) == (u"a = ? AND b = ?", [4, 5])
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert len(cache) == 2
+
+
+def test_cache_unhashable():
+    cache = StatementCache()
+
+    class Name(type(u"")):
+        __hash__ = None
+
+    expr = Column(u"a", Name(u"t")) == 1
+
+    state = state_factory()
+    assert cache(expr, state) == u"t.a = ?"
+    assert state.parameters == [1]
+    assert len(cache) == 0
+
+
+def test_cache_clear():
+    cache = StatementCache()
+    cache(select(u"foo"))
+    cache(select(u"foo"))
+
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_cache_numeric_offset():
+    cache = StatementCache()
+
+    state = state_factory(paramstyle=dollar)
+    assert cache(Column(u"a") == 1, state) == u"a = $1"
+    assert cache(Column(u"a") == 2, state) == u"a = $2"
+    assert state.parameters == [1, 2]
+    assert (cache.hits, cache.misses) == (0, 2)
+
+    state = state_factory(paramstyle=dollar)
+    assert cache(Column(u"a") == 3, state) == u"a = $1"
+    assert state.parameters == [3]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cache_deduplicate():
+    cache = StatementCache()
+    paramstyle = Numeric(u"$", deduplicate=True)
+
+    def run(a, b):
+        state = state_factory(paramstyle=paramstyle)
+        sql = cache(And(Column(u"a") == a, Column(u"b") == b), state)
+        return sql, state.parameters
+
+    assert run(1, 1) == (u"a = $1 AND b = $1", [1])
+    assert run(2, 2) == (u"a = $1 AND b = $1", [2])
+    assert run(1, 2) == (u"a = $1 AND b = $2", [1, 2])
+    assert run(1, True) == (u"a = $1 AND b = $2", [1, True])
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_cache_deduplicate_bound_parameters():
+    cache = StatementCache()
+
+    state = state_factory(paramstyle=Numeric(u"$", deduplicate=True))
+    assert cache(Column(u"a") == 1, state) == u"a = $1"
+    assert cache(Column(u"b") == 1, state) == u"b = $1"
+    assert state.parameters == [1]
+    assert len(cache) == 1
+
+
+def test_cache_padded_in_list():
+    cache = StatementCache()
+
+    def run(values, b):
+        state = state_factory()
+        sql = cache(And(In(Column(u"a"), values), Column(u"b") == b), state)
+        return sql, state.parameters
+
+    sql = u"a IN (?, ?, ?, ?) AND b = ?"
+    assert run([1, 2, 3], 7) == (sql, [1, 2, 3, 3, 7])
+    assert run([4, 5, 6], 8) == (sql, [4, 5, 6, 6, 8])
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.parametrize("parameters, values, mapping", [
+    ([1, 2], [1, 2], (0, 1)),
+    ([1, 2, 2], [1, 2], (0, 1, 1)),
+    ([[1, 2], 3], [1, 2, 3], ((0, 2), 2)),
+    ([1, 1], [1, 1], None),
+    ([1, 3], [1, 2], None),
+    ([1], [1, 2], None),
+    ([[1, 2, 3]], [1, 2], None),
+])
+def test_align(parameters, values, mapping):
+    assert align(parameters, values) == mapping
@@ -0,0 +1,126 @@
+import pytest
+
+from lessql.expr import compile, state_factory
+from lessql.expr.base import Associativity, Precedence
+from lessql.expr.codegen import CodegenCompiler, specialize
+from lessql.expr.dialects import postgresql
+from lessql.expr.operators import And, In, Or
+from lessql.expr.paramstyles import Numeric
+from lessql.expr.query import Column, Insert, Select, Table
+
+
+def select(name, age, table=u"users"):
+    return Select(
+        columns=[Column(u"id"), Column(u"name")],
+        tables=[Table(table)],
+        where=And(Column(u"name") == name, Column(u"age") > age),
+        limit=10)
+
+
+def compiled(expr, compiler=compile, **kwargs):
+    state = state_factory(**kwargs)
+    return compiler(expr, state), state.parameters
+
+
+def test_specialize():
+    func = specialize(select(u"foo", 18))
+    assert func(select(u"bar", 21)) == compiled(select(u"bar", 21))
+    assert u"def specialized" in func.source
+
+
+@pytest.mark.parametrize("expr", [
+    select(u"bar", 21, u"groups"),
+    select(None, 21),
+    select(u"bar", Column(u"min_age")),
+    Select(tables=[Table(u"users")]),
+    Column(u"a"),
+    Select(
+        columns=[Column(u"id")],
+        tables=[Table(u"users")],
+        where=And(Column(u"name") == u"bar", Column(u"age") > 21),
+        limit=10),
+])
+def test_specialize_other_shape(expr):
+    func = specialize(select(u"foo", 18))
+    assert func(expr) is None
+
+
+def test_specialize_unset_slot():
+    expr = Column(u"a") == 1
+    del expr.right
+
+    func = specialize(Column(u"a") == 1)
+    assert func(expr) is None
+
+
+def test_specialize_in_list():
+    func = specialize(In(Column(u"a"), [1, 2, 3]))
+    assert func(In(Column(u"a"), [4, 5, 6])) == (
+        u"a IN (?, ?, ?, ?)", [4, 5, 6, 6])
+    assert func(In(Column(u"a"), [4, 5])) is None
+
+
+def test_specialize_array():
+    func = specialize(In(Column(u"a"), [1, 2, 3]), postgresql)
+    assert func(In(Column(u"a"), [4, 5, 6])) == (u"a = ANY(?)", [[4, 5, 6]])
+
+
+def test_specialize_deduplicate():
+    paramstyle = Numeric(u"$", deduplicate=True)
+    func = specialize(
+        Or(Column(u"a") == 1, Column(u"b") == 1), paramstyle=paramstyle)
+    assert func(Or(Column(u"a") == 2, Column(u"b") == 2)) == (
+        u"a = $1 OR b = $1", [2])
+    assert func(Or(Column(u"a") == 2, Column(u"b") == 3)) is None
+
+
+def test_specialize_literal_list():
+    func = specialize(Insert(Table(u"t"), [Column(u"a")], [[1]]))
+    assert func(Insert(Table(u"t"), [Column(u"a")], [[2]])) == (
+        u"INSERT INTO t (a) VALUES (?)", [2])
+    assert func(Insert(Table(u"t"), [Column(u"b")], [[2]])) is None
+
+
+def test_specialize_identical_values():
+    func = specialize(And(Column(u"a") == 1, Column(u"b") == 1))
+    assert func(And(Column(u"a") == 2, Column(u"b") == 2)) == (
+        u"a = ? AND b = ?", [2, 2])
+    assert func(And(Column(u"a") == 2, Column(u"b") == 3)) is None
+
+
+def test_codegen_compiler():
+    codegen = CodegenCompiler(max_shapes=2)
+    for name, age in [(u"foo", 1), (u"bar", 2)]:
+        for table in [u"users", u"groups"]:
+            expr = select(name, age, table)
+            assert compiled(expr, codegen) == compiled(expr)
+
+    assert (codegen.hits, codegen.misses) == (2, 2)
+    assert len(codegen) == 2
+
+    codegen(Column(u"a") == 1)
+    codegen(select(u"baz", 3, u"roles"))
+    assert len(codegen) == 3
+
+    # The least recently used shape of selects was dropped
+    codegen(select(u"baz", 3, u"users"))
+    assert codegen.misses == 5
+
+    codegen.clear()
+    assert (len(codegen), codegen.hits, codegen.misses) == (0, 0, 0)
+
+
+def test_codegen_compiler_precedence():
+    codegen = CodegenCompiler()
+    expr = Or(Column(u"a") == 1, Column(u"b") == 2)
+    codegen(expr)
+    assert codegen(expr, state_factory(
+        precedence=Precedence(And.precedence, Associativity.left))) == \
+        u"(a = ? OR b = ?)"
+    assert codegen.misses == 2
+
+
+def test_codegen_compiler_max_nodes():
+    codegen = CodegenCompiler(max_nodes=5)
+    codegen(select(u"foo", 18))
+    assert len(codegen) == 0
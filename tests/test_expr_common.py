@@ -1,7 +1,10 @@
 import pytest
 import operator
 
-from lessql.expr.common import LateOperatorOverload, operator_mapping_factory
+from lessql.expr.common import (
+    LateOperatorOverload, get_layout, operator_mapping_factory, replace_slots)
+from lessql.expr.operators import And, Or
+from lessql.expr.query import Column, Insert, Select, Table
 from mock import Mock
 
 
@@ -14,7 +17,7 @@ def test_perform_not_implemented_error():
     (u"add", operator.add),
     (u"subtract", operator.sub),
     (u"multiply", operator.mul),
-    (u"divide", operator.div),
+    (u"divide", operator.truediv),
     (u"modulo", operator.mod),
     (u"power", operator.pow),
     (u"equal", operator.eq),
@@ -38,7 +41,7 @@ def test_late_operator_overload_operators(name, operation):
     (u"add", operator.add),
     (u"subtract", operator.sub),
     (u"multiply", operator.mul),
-    (u"divide", operator.div),
+    (u"divide", operator.truediv),
     (u"modulo", operator.mod),
     (u"power", operator.pow),
 ])
@@ -70,3 +73,61 @@ def test_operator_mappning_factory_map():
 
     A() + None
     assert mock.called
+
+
+def test_structural_key_equal_trees():
+    a = Or(Column(u"a") == 1, Column(u"b", u"t") > 2)
+    b = Or(Column(u"a") == 1, Column(u"b", u"t") > 2)
+    assert a is not b
+    assert a.structural_key() == b.structural_key()
+    assert a.structural_hash() == b.structural_hash()
+    assert a.structurally_equals(b)
+
+
+@pytest.mark.parametrize("a, b", [
+    (Column(u"a") == 1, Column(u"a") == True),
+    (Column(u"a") == 1, Column(u"a") == 1.0),
+    (Column(u"a") == 1, Column(u"b") == 1),
+    (Column(u"a") == 1, Column(u"a") != 1),
+    (Column(u"a"), Column(u"a", u"t")),
+    (And(Column(u"a"), Column(u"b")), And(And(Column(u"a")), Column(u"b"))),
+])
+def test_structural_key_different_trees(a, b):
+    assert a.structural_key() != b.structural_key()
+    assert not a.structurally_equals(b)
+
+
+def test_structural_key_as_dict_key():
+    seen = {(Column(u"a") == 1).structural_key(): 1}
+    assert seen[(Column(u"a") == 1).structural_key()] == 1
+
+
+def test_structural_key_unhashable():
+    expr = Insert(Table(u"t"), [Column(u"a")], [[{}]])
+    assert expr.structurally_equals(
+        Insert(Table(u"t"), [Column(u"a")], [[{}]]))
+    with pytest.raises(TypeError):
+        expr.structural_hash()
+
+
+def test_structural_key_deep_tree():
+    expr = Column(u"a")
+    for i in range(10000):
+        expr = expr + i
+    assert len(expr.structural_key()) > 10000
+
+
+def test_get_layout():
+    assert get_layout(Column) == (("name", True), ("table", True))
+
+
+def test_replace_slots():
+    expr = Column(u"a") == 1
+    new = replace_slots(expr, {"right": 2})
+    assert (new.left, new.right) == (expr.left, 2)
+    assert expr.right == 1
+
+    query = Select(tables=[Table(u"t")])
+    new = replace_slots(query, {"limit": 1})
+    assert (new.tables, new.limit) == (query.tables, 1)
+    assert query.limit is None
@@ -0,0 +1,127 @@
+import pytest
+import sqlite3
+
+from lessql.expr.base import state_factory
+from lessql.expr.cache import StatementCache
+from lessql.expr.dialects import postgresql, sqlite
+from lessql.expr.operators import And, In, NotIn
+from lessql.expr.paramstyles import Numeric
+from lessql.expr.query import (
+    Column, Select, Table, Union, UnionAll, Values, With)
+
+
+@pytest.mark.parametrize("expr, sql, params", [
+    (In(Column(u"a"), [1, 2, 3]), u"a = ANY(?)", [[1, 2, 3]]),
+    (NotIn(Column(u"a"), (1, 2)), u"a <> ALL(?)", [[1, 2]]),
+    (In(Column(u"a"), []), u"(1 = 0)", []),
+    (In(Column(u"a"), [1, 2]) == True, u"(a = ANY(?)) = ?", [[1, 2], True]),
+])
+def test_postgresql_in_array(expr, sql, params, state):
+    assert postgresql(expr, state) == sql
+    assert state.parameters == params
+
+
+def test_postgresql_array_deduplicate():
+    state = state_factory(paramstyle=Numeric(u"$", deduplicate=True))
+    expr = And(In(Column(u"a"), [1]), In(Column(u"b"), [1]), Column(u"c") == 1)
+    assert postgresql(expr, state) == \
+        u"a = ANY($1) AND b = ANY($2) AND c = $3"
+    assert state.parameters == [[1], [1], 1]
+
+
+def test_postgresql_array_cache():
+    cache = StatementCache(postgresql)
+    for values in ([1, 2, 3], [4, 5, 6]):
+        state = state_factory()
+        assert cache(And(In(Column(u"a"), values), Column(u"b") == 7), state) \
+            == u"a = ANY(?) AND b = ?"
+        assert state.parameters == [values, 7]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_sqlite_max_parameters(state):
+    assert sqlite.max_parameters == 999
+    assert postgresql.max_parameters is None
+
+    sqlite(In(Column(u"a"), range(999)), state)
+    assert len(state.parameters) == 999
+
+
+
+def test_sqlite_in_json(state):
+    assert sqlite(In(Column(u"a"), range(1000)), state) == \
+        u"a IN (SELECT value FROM json_each(?))"
+    assert len(state.parameters) == 1
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute(u"CREATE TABLE t (a INTEGER, b TEXT)")
+    conn.executemany(u"INSERT INTO t VALUES (?, ?)", [
+        (i, u"v{}".format(i)) for i in range(5)])
+
+    texts = [u"v{}".format(i) for i in range(3000)]
+    for expr, rows in [
+            (In(Column(u"a"), range(2, 2000)), [2, 3, 4]),
+            (NotIn(Column(u"a"), range(2, 2000)), [0, 1]),
+            (In(Column(u"b"), texts), [0, 1, 2, 3, 4])]:
+        state = state_factory()
+        query = Select(
+            columns=[Column(u"a")], tables=[Table(u"t")], where=expr,
+            order_by=[Column(u"a")])
+        sql = sqlite(query, state)
+        assert [row[0] for row in conn.execute(sql, state.parameters)] == rows
+
+
+def test_sqlite_values(state):
+    ast = Values([(1, u"a")], u"v", [u"id", u"name"])
+    assert sqlite(ast, state) == \
+        u"(SELECT column1 AS id, column2 AS name FROM (VALUES (?, ?))) AS v"
+
+
+def test_sqlite_compound_select(state):
+    ast = Union(Select(columns=[1]), Select(columns=[2]))
+    assert sqlite(ast, state) == u"SELECT ? UNION SELECT ?"
+    assert state.parameters == [1, 2]
+
+
+def test_sqlite_compound_select_limit(state):
+    ast = Union(
+        Select(columns=[Column(u"a")], tables=[Table(u"t")], limit=1,
+               order_by=[Column(u"a")]),
+        Union(Select(columns=[3]), Select(columns=[4], limit=5, offset=0)))
+    sql = sqlite(ast, state)
+    assert sql == (
+        u"SELECT * FROM (SELECT a FROM t ORDER BY a LIMIT 1) UNION "
+        u"SELECT ? UNION SELECT * FROM (SELECT ? LIMIT 5 OFFSET 0)")
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute(u"CREATE TABLE t (a INTEGER)")
+    conn.executemany(u"INSERT INTO t VALUES (?)", [(2,), (1,)])
+    assert sorted(conn.execute(sql, state.parameters).fetchall()) == \
+        [(1,), (3,), (4,)]
+
+
+def test_sqlite_recursive_with():
+    counter = With(
+        u"counter",
+        UnionAll(
+            Select(columns=[0]),
+            Select(
+                columns=[Column(u"n") + 1],
+                tables=[Table(u"counter")],
+                where=Column(u"n") < 4)),
+        columns=[u"n"],
+        materialized=True,
+        recursive=True)
+    ast = Select(
+        columns=[Column(u"n")], tables=[Table(u"counter")], with_=counter)
+
+    cache = StatementCache(sqlite)
+    for _ in range(2):
+        state = state_factory()
+        sql = cache(ast, state)
+        assert sql == (
+            u"WITH RECURSIVE counter (n) AS MATERIALIZED (SELECT ? UNION ALL "
+            u"SELECT n + ? FROM counter WHERE n < ?) SELECT n FROM counter")
+        rows = sqlite3.connect(":memory:").execute(sql, state.parameters)
+        assert rows.fetchall() == [(0,), (1,), (2,), (3,), (4,)]
+    assert cache.hits == 1
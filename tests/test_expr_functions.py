@@ -31,3 +31,13 @@ def test_compile_power(state):
 
     with pytest.raises(TypeError):
         Power(1, 2, 3)
+
+
+def test_compile_nested(state):
+    assert compile(Max(Min(1, 2), Sqrt(3)), state) == u"max(min(?, ?), sqrt(?))"
+    assert state.parameters == [1, 2, 3]
+
+
+def test_compile_no_args(state):
+    assert compile(Max(), state) == u"max()"
+    assert state.parameters == []
@@ -0,0 +1,84 @@
+from lessql.expr import compile
+from lessql.expr.interning import Interner
+from lessql.expr.operators import And, Or
+from lessql.expr.query import Column, Insert, Select, Table
+
+
+def test_interner_leaf_nodes():
+    expr = Or(*[Column(u"a") == i for i in range(10)])
+    interner = Interner()
+    interned = interner(expr)
+    assert len(set(id(e.left) for e in interned.exprs)) == 1
+    assert len(interner) == 1
+    assert compile(interned) == u" OR ".join([u"a = ?"] * 10)
+
+    # The given tree is left as is, and trees whose nodes are shared already
+    # are returned as is
+    assert len(set(id(e.left) for e in expr.exprs)) == 10
+    assert interner(interned) is interned
+
+
+def test_interner_select():
+    interner = Interner()
+    query = Select(
+        columns=[Column(u"a")], tables=[Table(u"t")], where=Column(u"a") == 1)
+    interned = interner(query)
+    assert interned is not query
+    assert interned.columns[0] is interned.where.left
+    assert query.columns[0] is not query.where.left
+    assert compile(interned) == compile(query)
+
+
+def test_interner_across_trees():
+    interner = Interner()
+    a = interner(Column(u"a") == 1)
+    b = interner(Column(u"a") == 2)
+    assert a.left is b.left
+    assert a is not b
+
+
+def test_interner_subtrees():
+    interner = Interner(subtrees=True)
+    expr = interner(And(Column(u"a") + 1 == 2, Column(u"a") + 1 == 2))
+    assert expr.exprs[0] is expr.exprs[1]
+    assert not interner(Column(u"a") + 1 == 3) is expr.exprs[0]
+    assert interner(Column(u"a") + 1 == 2) is expr.exprs[0]
+
+
+def test_interner_keeps_types_apart():
+    interner = Interner(subtrees=True)
+    a = interner(Column(u"a") == 1)
+    b = interner(Column(u"a") == True)
+    assert a is not b
+    assert b.right is True
+
+
+def test_interner_lists():
+    interner = Interner()
+    expr = interner(Insert(
+        Table(u"t"), [Column(u"a"), Column(u"b")],
+        [[Column(u"a"), 1], [Column(u"a"), 2]]))
+    assert expr.rows[0][0] is expr.rows[1][0]
+    assert expr.rows[1][1] == 2
+
+
+def test_interner_unhashable():
+    interner = Interner(subtrees=True)
+    expr = interner(Column(u"a") == {})
+    assert expr.right == {}
+    assert len(interner) == 1
+
+
+def test_interner_deep_tree():
+    expr = Column(u"a")
+    for i in range(10000):
+        expr = expr + i
+    Interner(subtrees=True)(expr)
+
+
+def test_interner_clear():
+    interner = Interner()
+    interner(Column(u"a"))
+    interner.clear()
+    assert len(interner) == 0
+    assert repr(interner) == u"Interner(subtrees=False, size=0)"
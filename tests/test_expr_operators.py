@@ -1,7 +1,10 @@
 import pytest
+import sys
 
 from lessql.expr.base import compile, state_factory
 from lessql.expr.operators import *
+from lessql.expr.prepared import Param
+from lessql.expr.query import Column
 
 
 @pytest.mark.parametrize("expr, sql, params", [
@@ -13,7 +16,7 @@ from lessql.expr.operators import *
     (Multiply(1, 2), u"? * ?", [1, 2]),
     (Divide(1, 2), u"? / ?", [1, 2]),
     (Modulo(1, 2), u"? % ?", [1, 2]),
-    (In(1, 2), u"? IN ?", [1, 2]),
+    (In(1, [2]), u"? IN (?)", [1, 2]),
     (Is(1, 2), u"? IS ?", [1, 2]),
     (IsNot(1, 2), u"? IS NOT ?", [1, 2]),
     (Equal(1, 2), u"? = ?", [1, 2]),
@@ -121,3 +124,104 @@ def test_repr(cls, rep):
 
 def test_repr_undefined_operator():
     assert repr(Operator) == u"Operator()"
+
+
+def test_deep_left_chain(state):
+    depth = sys.getrecursionlimit() * 10
+
+    expr = Add(0, 1)
+    for i in range(2, depth):
+        expr = Add(expr, i)
+
+    assert compile(expr, state) == u" + ".join([u"?"] * depth)
+    assert state.parameters == list(range(depth))
+
+
+def test_deep_nested_or(state):
+    depth = sys.getrecursionlimit() * 10
+
+    expr = Equal(0, 0)
+    for i in range(1, depth):
+        expr = Or(Equal(i, i), expr)
+
+    assert compile(expr, state) == u" OR ".join([u"? = ?"] * depth)
+    assert len(state.parameters) == depth * 2
+
+
+def test_deep_bracketed_chain(state):
+    depth = sys.getrecursionlimit() * 10
+
+    expr = Multiply(0, 1)
+    for i in range(depth):
+        expr = Multiply(Add(expr, i), i)
+
+    sql = compile(expr, state)
+    assert sql.startswith(u"(" * depth + u"? * ? + ?) * ?")
+    assert len(state.parameters) == depth * 2 + 2
+
+
+@pytest.mark.parametrize("values, sql, params", [
+    ([1], u"a IN (?)", [1]),
+    ([1, 2], u"a IN (?, ?)", [1, 2]),
+    ([1, 2, 3], u"a IN (?, ?, ?, ?)", [1, 2, 3, 3]),
+    ((i for i in range(5)), u"a IN ({})".format(u", ".join([u"?"] * 8)),
+        [0, 1, 2, 3, 4, 4, 4, 4]),
+])
+def test_in_list(values, sql, params, state):
+    assert compile(In(Column(u"a"), values), state) == sql
+    assert state.parameters == params
+
+
+@pytest.mark.parametrize("cls, sql", [
+    (In, u"(1 = 0)"),
+    (NotIn, u"(1 = 1)"),
+])
+def test_in_empty_list(cls, sql, state):
+    assert compile(Not(cls(1, [])), state) == u"NOT " + sql
+    assert state.parameters == []
+
+
+def test_in_list_chunks(state):
+    sql = compile(NotIn(1, range(max_in_list + 1)), state)
+    assert sql.startswith(u"(? NOT IN (?, ")
+    assert sql.endswith(u", ?) AND ? NOT IN (?))")
+    assert len(state.parameters) == max_in_list + 3
+
+
+@pytest.mark.parametrize("length, max_parameters, buckets", [
+    (1, None, [1]),
+    (5, None, [8]),
+    (max_in_list, None, [max_in_list]),
+    (max_in_list + 3, None, [max_in_list, 4]),
+    (999, 999, [512, 487]),
+    (600, 999, [512, 128]),
+])
+def test_in_list_buckets(length, max_parameters, buckets):
+    assert in_list_buckets(length, max_parameters) == buckets
+
+
+@pytest.mark.parametrize("length, max_parameters", [
+    (1000, 999),
+    (2000, 999),
+])
+def test_in_list_buckets_over_limit(length, max_parameters):
+    with pytest.raises(ValueError):
+        in_list_buckets(length, max_parameters)
+
+
+def test_in_param(state):
+    with pytest.raises(ValueError):
+        compile(In(Column(u"a"), Param(u"ids")), state)
+
+
+@pytest.mark.parametrize("values", [2, u"abc", None])
+def test_in_not_list(values, state):
+    with pytest.raises(TypeError):
+        compile(In(Column(u"a"), values), state)
+
+
+def test_in_subquery(state):
+    from lessql.expr.query import Column, Select
+
+    sql = compile(In(Column(u"a"), Select(columns=[Column(u"b")])), state)
+    assert sql == u"a IN (SELECT b)"
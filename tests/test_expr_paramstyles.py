@@ -0,0 +1,128 @@
+from copy import copy
+import pytest
+
+from lessql.expr import compile, state_factory, And, Equal, Modulo
+from lessql.expr.base import State, Precedence
+from lessql.expr.query import Column
+from lessql.expr.paramstyles import *
+from lessql.expr.paramstyles import (
+    deduplicate, dollar, format_, named, numeric, pyformat, qmark)
+
+
+@pytest.mark.parametrize("paramstyle, sql", [
+    (qmark, u"? = ? AND ? = ?"),
+    (format_, u"%s = %s AND %s = %s"),
+    (numeric, u":1 = :2 AND :3 = :4"),
+    (dollar, u"$1 = $2 AND $3 = $4"),
+    (named, u":p1 = :p2 AND :p3 = :p4"),
+    (pyformat, u"%(p1)s = %(p2)s AND %(p3)s = %(p4)s"),
+])
+def test_paramstyle(paramstyle, sql):
+    state = state_factory(paramstyle=paramstyle)
+    assert compile(And(Equal(1, 2), Equal(1, 2)), state) == sql
+    assert state.parameters == [1, 2, 1, 2]
+
+
+@pytest.mark.parametrize("paramstyle, sql", [
+    (Numeric(deduplicate=True), u":1 = :2 AND :1 = :3"),
+    (Numeric(u"$", deduplicate=True), u"$1 = $2 AND $1 = $3"),
+    (Named(deduplicate=True), u":p1 = :p2 AND :p1 = :p3"),
+    (PyFormat(deduplicate=True), u"%(p1)s = %(p2)s AND %(p1)s = %(p3)s"),
+])
+def test_paramstyle_deduplicate(paramstyle, sql):
+    state = state_factory(paramstyle=paramstyle)
+    assert compile(And(Equal(1, 2), Equal(1, True)), state) == sql
+    assert state.parameters == [1, 2, True]
+    assert type(state.parameters[2]) is bool
+
+
+def test_paramstyle_deduplicate_plain_list():
+    state = State(
+        precedence=Precedence(0),
+        parameters=[],
+        paramstyle=Numeric(deduplicate=True))
+    assert compile(And(Equal(1, 2), Equal(2, 1)), state) == \
+        u":1 = :2 AND :2 = :1"
+    assert state.parameters == [1, 2]
+
+
+def test_paramstyle_default():
+    state = State(precedence=Precedence(0), parameters=[])
+    assert compile(Equal(1, 2), state) == u"? = ?"
+    assert state.parameters == [1, 2]
+
+
+@pytest.mark.parametrize("cls", [QMark, Format])
+def test_paramstyle_deduplicate_unsupported(cls):
+    with pytest.raises(ValueError):
+        cls(deduplicate=True)
+
+
+@pytest.mark.parametrize("paramstyle, sql", [
+    (qmark, u"? % ?"),
+    (numeric, u":1 % :2"),
+    (format_, u"%s %% %s"),
+    (pyformat, u"%(p1)s %% %(p2)s"),
+])
+def test_paramstyle_escape(paramstyle, sql):
+    assert compile(Modulo(1, 2), state_factory(paramstyle=paramstyle)) == sql
+
+
+def test_format_parameters():
+    assert qmark.format_parameters([1, 2]) == [1, 2]
+    assert numeric.format_parameters((1, 2)) == [1, 2]
+    assert named.format_parameters([1, 2]) == {u"p1": 1, u"p2": 2}
+    assert pyformat.format_parameters([1, 2]) == {u"p1": 1, u"p2": 2}
+
+
+def test_parameters_position():
+    parameters = Parameters([1, 2])
+    parameters.append(3)
+
+    assert parameters.position(3) == 3
+    assert parameters.position(1) == 1
+    assert parameters.position(4) == 4
+    assert parameters.position(True) == 5
+    assert parameters == [1, 2, 3, 4, True]
+
+
+def test_deduplicate():
+    assert deduplicate([1, 2, 1, True, 2]) == ([1, 2, True], (1, 2, 1, 3, 2))
+
+
+def test_parameters_unhashable():
+    parameters = Parameters([[1]])
+    assert parameters.position(1) == 2
+    assert parameters.position([1]) == 3
+    assert parameters.position(1) == 2
+
+
+def test_parameters_copy():
+    parameters = Parameters([1])
+    assert parameters.position(2) == 2
+
+    other = copy(parameters)
+    assert type(other) is Parameters
+    assert other.position(3) == 3
+    assert parameters.position(4) == 3
+    assert (parameters, other) == ([1, 2, 4], [1, 2, 3])
+
+
+def test_parameters_copy_scope():
+    column = Column(u"a") == 7
+    state = state_factory(paramstyle=Numeric(u"$", deduplicate=True))
+    with state("parameters"):
+        assert compile(column, state) == u"a = $1"
+        assert state.parameters == [7]
+
+    assert compile(Column(u"b") == 7, state) == u"b = $1"
+    assert state.parameters == [7]
+
+
+def test_paramstyle_equality():
+    assert Numeric(u"$") == dollar
+    assert hash(Numeric(u"$")) == hash(dollar)
+    assert Numeric(u"$") != numeric
+    assert Numeric(u"$") != Numeric(u"$", deduplicate=True)
+    assert Named() != PyFormat()
+    assert len(set([qmark, QMark(), format_, Format()])) == 2
@@ -0,0 +1,63 @@
+import pytest
+
+from lessql.expr import compile
+from lessql.expr.cache import StatementCache
+from lessql.expr.dialects import postgresql
+from lessql.expr.operators import And, In, Or
+from lessql.expr.paramstyles import Numeric, named
+from lessql.expr.prepared import Param, Prepared, prepare
+from lessql.expr.query import Column, Insert, Select, Table
+
+
+def test_prepare():
+    prepared = prepare(Select(
+        columns=[Column(u"name")],
+        tables=[Table(u"users")],
+        where=And(Column(u"id") == Param(u"id"), Column(u"active") == True)))
+
+    assert isinstance(prepared, Prepared)
+    assert prepared.sql == \
+        u"SELECT name FROM users WHERE id = ? AND active = ?"
+    assert prepared.names == {u"id"}
+    assert prepared({u"id": 1}) == (prepared.sql, [1, True])
+    assert prepared({u"id": 2}) == (prepared.sql, [2, True])
+
+
+def test_prepare_missing_value():
+    prepared = prepare(Column(u"id") == Param(u"id"))
+    with pytest.raises(KeyError):
+        prepared({})
+
+
+def test_prepare_same_name():
+    expr = Or(Column(u"a") == Param(u"x"), Column(u"b") == Param(u"x"))
+    assert prepare(expr)({u"x": 1}) == (u"a = ? OR b = ?", [1, 1])
+
+    prepared = prepare(expr, paramstyle=Numeric(u"$", deduplicate=True))
+    assert prepared({u"x": 1}) == (u"a = $1 OR b = $1", [1])
+
+
+def test_prepare_named():
+    prepared = prepare(
+        Insert(Table(u"t"), [Column(u"a"), Column(u"b")],
+            [[Param(u"a"), Param(u"b")]]),
+        paramstyle=named)
+    assert prepared({u"a": 1, u"b": u"x"}) == (
+        u"INSERT INTO t (a, b) VALUES (:p1, :p2)", {u"p1": 1, u"p2": u"x"})
+
+
+def test_prepare_array():
+    prepared = prepare(In(Column(u"id"), Param(u"ids")), postgresql)
+    assert prepared({u"ids": [1, 2, 3]}) == (u"id = ANY(?)", [[1, 2, 3]])
+
+
+def test_prepare_without_params():
+    prepared = prepare(Column(u"a") == 1)
+    assert prepared() == (u"a = ?", [1])
+    assert prepared.names == set()
+
+
+def test_param_in_cache():
+    cache = StatementCache()
+    expr = Column(u"a") == Param(u"x")
+    assert cache(expr) == compile(expr)
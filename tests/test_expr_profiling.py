@@ -0,0 +1,76 @@
+import pytest
+
+from itertools import count
+
+from lessql.expr import compile, Add, Max, Profiler, profile
+from lessql.expr.base import Compiler
+
+
+def test_profile_counts(state):
+    ticks = count()
+    profiler = Profiler(timer=lambda: next(ticks))
+
+    with profile(compile, profiler):
+        assert compile(Max(Add(1, 2), 3), state) == u"max((? + ?), ?)"
+
+    assert profiler.rows() == [
+        (int, 3, 3),
+        (Add, 1, 1),
+        (Max, 1, 1),
+    ]
+    assert compile.profiler is None
+
+
+def test_profile_disabled_has_no_wrappers():
+    compile(Add(1, 2))
+    assert compile._dispatch[Add][0] is compile._map.resolve(Add)
+
+    with profile(compile):
+        compile(Add(1, 2))
+        assert compile._dispatch[Add][0] is not compile._map.resolve(Add)
+
+    compile(Add(1, 2))
+    assert compile._dispatch[Add][0] is compile._map.resolve(Add)
+
+
+def test_profile_per_compiler():
+    other = Compiler()
+
+    @other.when(int)
+    def compile_int(compile, expr, state):
+        return u"1"
+
+    with profile(compile) as profiler:
+        other(1)
+    assert profiler.rows() == []
+
+
+def test_profile_exception():
+    class Broken(object):
+        pass
+
+    other = Compiler()
+
+    @other.when(Broken)
+    def compile_broken(compile, expr, state):
+        raise ValueError()
+
+    with profile(other) as profiler:
+        with pytest.raises(ValueError):
+            other(Broken())
+    assert [row[:2] for row in profiler.rows()] == [(Broken, 1)]
+
+
+def test_table():
+    profiler = Profiler()
+    profiler.stats[Add] = [4, 0.002]
+    profiler.stats[int] = [8, 0.001]
+
+    assert profiler.table().splitlines() == [
+        u"class                         calls     total ms  per call us",
+        u"Add                               4        2.000      500.000",
+        u"int                               8        1.000      125.000",
+    ]
+
+    profiler.reset()
+    assert profiler.rows() == []
@@ -1,7 +1,9 @@
 import pytest
 
-from lessql.expr import compile, Add
-from lessql.expr.query import Select, Table
+from lessql.expr import compile, state_factory, Add, And, Or
+from lessql.expr.paramstyles import named, qmark
+from lessql.expr.query import (
+    Column, Insert, Select, Table, Union, UnionAll, Update, Values, With)
 
 def test_select_minimal(state):
     ast = Select(columns=[Add(1, 2)])
@@ -13,3 +15,212 @@ def test_select_table(state):
     ast = Select(tables=[Table(u"table")])
     assert compile(ast, state) == u"SELECT * FROM table"
     assert state.parameters == []
+
+
+def test_column():
+    assert compile(Column(u"name")) == u"name"
+    assert compile(Column(u"name", u"users")) == u"users.name"
+
+
+def test_select_clauses(state):
+    ast = Select(
+        columns=[Column(u"name")],
+        tables=[Table(u"users")],
+        where=Column(u"age") > 18,
+        group_by=[Column(u"name")],
+        having=Column(u"name") != u"root",
+        order_by=[Column(u"name")],
+        limit=10,
+        offset=20)
+    assert compile(ast, state) == (
+        u"SELECT name FROM users WHERE age > ? GROUP BY name "
+        u"HAVING name != ? ORDER BY name LIMIT 10 OFFSET 20")
+    assert state.parameters == [18, u"root"]
+
+
+def test_select_immutable():
+    columns = [Column(u"name")]
+    ast = Select(columns=columns, tables=[Table(u"users")])
+    columns.append(Column(u"age"))
+    assert len(ast.columns) == 1
+
+    with pytest.raises(AttributeError):
+        ast.limit = 10
+    with pytest.raises(AttributeError):
+        del ast.where
+
+
+def test_select_replace():
+    users = Select(columns=[Column(u"name")], tables=[Table(u"users")])
+    page = users.replace(limit=10, offset=20)
+    assert compile(page) == u"SELECT name FROM users LIMIT 10 OFFSET 20"
+    assert compile(users) == u"SELECT name FROM users"
+    assert page.columns is users.columns
+    assert page.tables is users.tables
+
+    with pytest.raises(TypeError):
+        users.replace(wher=Column(u"a") == 1)
+
+
+def test_select_filter(state):
+    users = Select(tables=[Table(u"users")])
+    adults = users.filter(Column(u"age") >= 18)
+    named = adults.filter(Column(u"name") != None, Column(u"name") != u"")
+    assert users.where is None
+    assert adults.where.__class__ is not And
+    assert named.where.exprs[0] is adults.where
+    assert compile(named, state) == (
+        u"SELECT * FROM users WHERE age >= ? AND name IS NOT NULL AND "
+        u"name != ?")
+    assert state.parameters == [18, u""]
+
+    either = users.replace(where=Or(Column(u"a") == 1, Column(u"b") == 2))
+    assert compile(either.filter(Column(u"c") == 3)) == \
+        u"SELECT * FROM users WHERE (a = ? OR b = ?) AND c = ?"
+
+
+def test_select_add_columns_order_by():
+    users = Select(tables=[Table(u"users")])
+    ast = users.add_columns(Column(u"id")).add_columns(Column(u"name")) \
+        .add_order_by(Column(u"name")).add_order_by(Column(u"id"))
+    assert compile(ast) == u"SELECT id, name FROM users ORDER BY name, id"
+    assert users.columns is None
+
+
+def test_select_with(state):
+    active = With(
+        u"active",
+        Select(tables=[Table(u"users")], where=Column(u"active") == True),
+        materialized=False)
+    ast = Select(
+        columns=[Column(u"name")],
+        tables=[Table(u"active")],
+        where=Column(u"age") > 18,
+        with_=active)
+    assert compile(ast, state) == (
+        u"WITH active AS NOT MATERIALIZED (SELECT * FROM users WHERE "
+        u"active = ?) SELECT name FROM active WHERE age > ?")
+    assert state.parameters == [True, 18]
+
+
+def test_select_with_many():
+    ast = Select(tables=[Table(u"b")], with_=[
+        With(u"a", Select(columns=[1]), [u"x"], materialized=True),
+        With(u"b", Select(tables=[Table(u"a")])),
+    ])
+    assert compile(ast) == (
+        u"WITH a (x) AS MATERIALIZED (SELECT ?), b AS (SELECT * FROM a) "
+        u"SELECT * FROM b")
+
+
+def test_select_with_recursive():
+    tree = With(
+        u"tree",
+        UnionAll(
+            Select(columns=[Column(u"id")], tables=[Table(u"nodes")],
+                where=Column(u"parent_id") == None),
+            Select(
+                columns=[Column(u"id", u"nodes")],
+                tables=[Table(u"nodes"), Table(u"tree")],
+                where=Column(u"parent_id", u"nodes") == Column(u"id", u"tree"))),
+        columns=[u"id"],
+        recursive=True)
+    ast = Select(tables=[Table(u"tree")], with_=[
+        With(u"roots", Select(tables=[Table(u"nodes")])), tree])
+    assert compile(ast) == (
+        u"WITH RECURSIVE roots AS (SELECT * FROM nodes), tree (id) AS ("
+        u"(SELECT id FROM nodes WHERE parent_id IS NULL) UNION ALL "
+        u"(SELECT nodes.id FROM nodes, tree WHERE nodes.parent_id = tree.id)) "
+        u"SELECT * FROM tree")
+
+
+def test_union(state):
+    ast = Union(
+        Select(columns=[1], tables=[Table(u"a")]),
+        Select(columns=[2], tables=[Table(u"b")]))
+    assert compile(ast, state) == \
+        u"(SELECT ? FROM a) UNION (SELECT ? FROM b)"
+    assert state.parameters == [1, 2]
+
+
+def test_insert(state):
+    ast = Insert(u"users", [Column(u"id"), u"name"], [(1, u"foo"), (2, u"bar")])
+    assert compile(ast, state) == \
+        u"INSERT INTO users (id, name) VALUES (?, ?), (?, ?)"
+    assert state.parameters == [1, u"foo", 2, u"bar"]
+
+
+@pytest.mark.parametrize("paramstyle, sql", [
+    (qmark, u"INSERT INTO users (id, name) VALUES (?, ?)"),
+    (named, u"INSERT INTO users (id, name) VALUES (:p1, :p2)"),
+])
+def test_insert_template(paramstyle, sql):
+    state = state_factory(paramstyle=paramstyle)
+    assert compile(Insert(Table(u"users"), [u"id", u"name"]), state) == sql
+    assert state.parameters == []
+
+
+def test_insert_rows_must_be_sequence():
+    with pytest.raises(TypeError):
+        compile(Insert(u"users", [u"id"], iter([(1,)])))
+
+
+@pytest.mark.parametrize("columns, rows", [
+    ([u"id"], []),
+    ([], [(1,)]),
+    ([], None),
+])
+def test_insert_empty(columns, rows):
+    with pytest.raises(ValueError):
+        compile(Insert(u"users", columns, rows))
+
+
+@pytest.mark.parametrize("rows, max_parameters, sizes", [
+    (0, None, []),
+    (3, None, [2, 1]),
+    (1000, None, [500, 500]),
+    (1100, 999, [499, 499, 64, 32, 4, 2]),
+    (10, 1, [1] * 10),
+])
+def test_insert_batches(rows, max_parameters, sizes):
+    ast = Insert(u"t", [u"a", u"b"], ((i, i) for i in range(rows)))
+    batches = list(ast.batches(max_parameters))
+    assert [len(b.rows) for b in batches] == sizes
+    assert [r for b in batches for r in b.rows] == [(i, i) for i in range(rows)]
+
+
+def test_update(state):
+    ast = Update(
+        u"users",
+        {u"name": u"foo", Column(u"age"): Column(u"age") + 1},
+        where=Column(u"id") == 1)
+    assert compile(ast, state) == \
+        u"UPDATE users SET age = age + ?, name = ? WHERE id = ?"
+    assert state.parameters == [1, u"foo", 1]
+
+
+@pytest.mark.parametrize("values", [{}, []])
+def test_update_empty(values):
+    with pytest.raises(ValueError):
+        compile(Update(u"users", values, where=Column(u"id") == 1))
+
+
+def test_values(state):
+    ast = Values([(1, u"a"), (2, u"b")], u"v", [u"id", u"name"], [u"int", None])
+    assert compile(ast, state) == \
+        u"(VALUES (CAST(? AS int), ?), (?, ?)) AS v (id, name)"
+    assert state.parameters == [1, u"a", 2, u"b"]
+
+
+def test_update_bulk():
+    rows = [((i, i), (u"name{}".format(i),)) for i in range(5)]
+    updates = list(Update.bulk(
+        u"t", [u"a", u"b"], [u"name"], rows, max_parameters=9))
+    assert [len(u.from_[0].rows) for u in updates] == [3, 2]
+
+    state = state_factory()
+    assert compile(updates[1], state) == (
+        u"UPDATE t SET name = v.name "
+        u"FROM (VALUES (?, ?, ?), (?, ?, ?)) AS v (a, b, name) "
+        u"WHERE t.a = v.a AND t.b = v.b")
+    assert state.parameters == [3, 3, u"name3", 4, 4, u"name4"]
@@ -0,0 +1,204 @@
+import pytest
+
+from lessql.expr import compile
+from lessql.expr.functions import Power, Sqrt
+from lessql.expr.operators import *
+from lessql.expr.query import Column, Select, Table
+from lessql.expr.simplify import canonicalize, simplify
+
+
+a = Column(u"a")
+b = Column(u"b")
+c = Column(u"c")
+
+
+def test_simplify_flatten():
+    expr = simplify(And(a == 1, And(b == 2, And(c == 3))))
+    assert isinstance(expr, And)
+    assert len(expr.exprs) == 3
+    assert compile(expr) == u"a = ? AND b = ? AND c = ?"
+
+
+def test_simplify_flatten_keeps_mixed():
+    expr = simplify(Or(a == 1, And(b == 2, c == 3)))
+    assert compile(expr) == u"a = ? OR b = ? AND c = ?"
+    assert len(expr.exprs) == 2
+
+
+def test_simplify_flatten_deep():
+    expr = a == 0
+    for i in range(1, 10000):
+        expr = And(expr, a == i)
+    expr = simplify(expr)
+    assert len(expr.exprs) == 10000
+    assert expr.exprs[0].right == 0
+    assert expr.exprs[-1].right == 9999
+
+
+@pytest.mark.parametrize("expr, sql", [
+    (And(a == 1, True), u"a = ?"),
+    (And(True, a == 1, True, b == 2), u"a = ? AND b = ?"),
+    (Or(a == 1, False), u"a = ?"),
+    (Or(a == 1), u"a = ?"),
+    (Or(And(a == 1, True), False), u"a = ?"),
+    (Not(Not(a == 1)), u"a = ?"),
+    (Not(Not(Not(a == 1))), u"NOT a = ?"),
+])
+def test_simplify_identities(expr, sql):
+    assert compile(simplify(expr)) == sql
+
+
+@pytest.mark.parametrize("expr, value", [
+    (And(a == 1, False), False),
+    (And(a == 1, And(b == 2, False)), False),
+    (Or(a == 1, True), True),
+    (And(), True),
+    (Or(), False),
+    (And(True, True), True),
+    (Not(True), False),
+    (Not(And(a == 1, False)), True),
+])
+def test_simplify_constant(expr, value):
+    assert simplify(expr) is value
+
+
+@pytest.mark.parametrize("expr, value", [
+    (Add(1, 2), 3),
+    (Subtract(1, 2), -1),
+    (Multiply(Add(1, 2), 4), 12),
+    (Divide(6, 3), 2),
+    (Divide(-6, 3), -2),
+    (Modulo(7, 3), 1),
+    (UnaryMinus(3), -3),
+    (UnaryPlus(3), 3),
+    (Equal(1, 1), True),
+    (NotEqual(1, 1), False),
+    (LessThan(1, 2), True),
+    (GreaterThanEqual(1, 2), False),
+])
+def test_simplify_fold(expr, value):
+    result = simplify(expr)
+    assert result == value
+    assert result.__class__ is value.__class__
+
+
+@pytest.mark.parametrize("expr", [
+    # Integer division truncates in SQL
+    Divide(7, 2),
+    Divide(-7, 2),
+    Divide(1, 0),
+    # The sign of modulo differs between SQL and Python
+    Modulo(-7, 3),
+    Modulo(7, -3),
+    # Overflow raises an error in SQL
+    Multiply(2 ** 30, 4),
+    Add(2 ** 40, 1),
+    # Booleans are not integers in SQL
+    Add(True, 1),
+    Equal(u"a", u"a"),
+    Equal(a, None),
+])
+def test_simplify_not_folded(expr):
+    assert simplify(expr) is expr
+
+
+@pytest.mark.parametrize("expr, sql", [
+    (And(a, True), u"a AND ?"),
+    (And(True, a, True), u"a AND ?"),
+    (Or(Add(a, 1), False), u"a + ? OR ?"),
+    (Not(Not(a)), u"NOT NOT a"),
+    (And(a), u"a"),
+])
+def test_simplify_non_boolean(expr, sql):
+    assert compile(simplify(expr)) == sql
+
+
+def test_simplify_never_folds_into_none():
+    expr = Equal(a, And(None))
+    assert simplify(expr) is expr
+    assert compile(simplify(expr)) == u"a = (NULL)"
+
+    expr = Not(Not(None))
+    assert simplify(expr) is expr
+
+
+def test_simplify_functions():
+    expr = simplify(Power(a, Add(1, 2)))
+    assert isinstance(expr, Power)
+    assert expr.args == (a, 3)
+
+    expr = Sqrt(4)
+    assert simplify(expr) is expr
+
+
+def test_simplify_shares_unchanged():
+    left = a + b
+    expr = And(left == 3, Add(1, 1) == c)
+    result = simplify(expr)
+    assert result.exprs[0] is expr.exprs[0]
+    assert result.exprs[1].left == 2
+    assert expr.exprs[1].left.left == 1
+
+
+def test_simplify_select():
+    query = Select(tables=[Table(u"t")], where=And(True, a == Add(1, 2)))
+    result = simplify(query)
+    assert isinstance(result, Select)
+    assert result is not query
+    assert compile(result) == u"SELECT * FROM t WHERE a = ?"
+    assert compile(query) == u"SELECT * FROM t WHERE ? AND a = ? + ?"
+    assert result.tables is query.tables
+
+
+def test_simplify_non_expression():
+    assert simplify(1) == 1
+
+
+@pytest.mark.parametrize("x, y", [
+    (And(a == 1, b == 2), And(b == 2, a == 1)),
+    (Or(a == 1, b == 2, c == 3), Or(c == 3, a == 1, b == 2)),
+    (Equal(a, 1), Equal(1, a)),
+    (Add(a, b) * 2, 2 * Add(b, a)),
+    (And(a + 1 == b, a + 2 == c), And(c == 2 + a, b == a + 1)),
+])
+def test_canonicalize_same_sql(x, y):
+    assert compile(canonicalize(x)) == compile(canonicalize(y))
+
+
+def test_canonicalize_ignores_values():
+    # Operands are ordered by structure first, which means that the parameter
+    # values can't change the SQL
+    x = canonicalize(And(a + 1 == b, a + 2 == c))
+    y = canonicalize(And(a + 2 == b, a + 1 == c))
+    assert compile(x) == compile(y)
+
+
+def test_canonicalize_orders_values():
+    expr = canonicalize(Or(a == 2, a == 1))
+    assert [e.right for e in expr.exprs] == [1, 2]
+
+
+def test_canonicalize_none():
+    expr = Equal(None, a)
+    assert canonicalize(expr) is expr
+    assert compile(canonicalize(Equal(a, None))) == u"a IS NULL"
+
+
+def test_canonicalize_non_commutative():
+    expr = Subtract(1, a)
+    assert canonicalize(expr) is expr
+
+    expr = LessThan(1, a)
+    assert canonicalize(expr) is expr
+
+
+def test_canonicalize_shares_unchanged():
+    expr = Or(c == 3, And(a == 1, b == 2))
+    result = canonicalize(expr)
+    assert result is not expr
+    assert result.exprs[0] is expr.exprs[1]
+
+
+def test_canonicalize_unorderable():
+    expr = Or(a == {u"x": 1}, a == {u"y": 2})
+    assert canonicalize(expr).exprs == expr.exprs
@@ -6,7 +6,7 @@ from lessql.expr import compile
 
 @pytest.mark.parametrize("param", [
     1,
-    sys.maxint + 1,
+    sys.maxsize + 1,
     b"foobar",
     u"foobar",
     True,
@@ -0,0 +1,192 @@
+import pytest
+import sqlite3
+import threading
+import time
+
+from functools import partial
+
+from lessql.expr.dialects import sqlite
+from lessql.expr.query import Column, Insert, Select, Table
+from lessql.pool import Database, PoolTimeout
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def path(tmpdir):
+    path = str(tmpdir.join(u"test.db"))
+    conn = sqlite3.connect(path)
+    conn.execute(u"CREATE TABLE users (id INTEGER, name TEXT)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def db(path, clock):
+    db = Database(
+        partial(sqlite3.connect, path, check_same_thread=False),
+        sqlite,
+        min_size=1,
+        max_size=2,
+        max_idle=10,
+        timer=clock)
+    yield db
+    db.close()
+
+
+def test_execute(db):
+    assert db.execute(Insert(u"users", [u"id", u"name"], [(1, u"foo")])) == []
+    assert db.execute(Select(tables=[Table(u"users")])) == [(1, u"foo")]
+    assert db.stats()["acquisitions"] == 2
+    assert db.created == 1
+
+
+def test_invalid_sizes(path):
+    with pytest.raises(ValueError):
+        Database(partial(sqlite3.connect, path), min_size=2, max_size=1)
+
+
+def test_connection_rollback(db):
+    with pytest.raises(ZeroDivisionError):
+        with db.connection() as conn:
+            conn.execute(Insert(u"users", [u"id"], [(1,)]))
+            1 / 0
+
+    assert db.execute(Select(tables=[Table(u"users")])) == []
+    assert db.idle == 1
+
+
+def test_timeout(db):
+    a = db.acquire()
+    b = db.acquire()
+    assert db.size == 2
+
+    with pytest.raises(PoolTimeout):
+        db.acquire(timeout=0)
+
+    db.release(a)
+    assert db.acquire(timeout=0) is a
+    db.release(a)
+    db.release(b)
+
+
+def test_wait_metrics(path):
+    db = Database(
+        partial(sqlite3.connect, path, check_same_thread=False), max_size=1)
+    conn = db.acquire()
+    acquired = []
+
+    thread = threading.Thread(target=lambda: acquired.append(db.acquire()))
+    thread.start()
+    time.sleep(0.05)
+    db.release(conn)
+    thread.join()
+
+    assert acquired == [conn]
+    assert db.waits == 1
+    assert db.wait_time > 0
+    assert db.max_wait_time == db.wait_time
+    db.release(conn)
+    db.close()
+
+
+def test_idle_eviction(db, clock):
+    a = db.acquire()
+    b = db.acquire()
+    db.release(a)
+
+    clock.now = 5
+    db.release(b)
+    assert db.idle == 2
+
+    clock.now = 12
+    assert db.evict_idle() == 1
+    assert db.idle == 1
+    assert db.evictions == 1
+
+    # min_size connections are never evicted
+    clock.now = 100
+    assert db.evict_idle() == 0
+
+
+def test_health_check(db, clock):
+    checked = []
+
+    def health_check(conn):
+        checked.append(conn)
+        return len(checked) > 1
+
+    db.health_check = health_check
+    conn = db.acquire()
+    db.release(conn)
+    assert checked == []
+
+    clock.now = db.check_after
+    new = db.acquire()
+    assert new is not conn
+    assert db.failed_checks == 1
+    assert db.created == 2
+    db.release(new)
+
+
+def test_hooks_are_per_checkout(db):
+    calls = []
+
+    with db.connection() as conn:
+        conn.hooks.append(lambda *args: calls.append(args[1:3]))
+        conn.execute(Select(
+            tables=[Table(u"users")], where=Column(u"id") == 1)).fetchall()
+
+    with db.connection() as conn:
+        assert conn.hooks == []
+        conn.execute(Select(tables=[Table(u"users")])).fetchall()
+
+    assert calls == [(u"SELECT * FROM users WHERE id = ?", [1])]
+
+
+def test_threads(db):
+    errors = []
+
+    def worker(i):
+        try:
+            for j in range(20):
+                db.execute(Insert(u"users", [u"id", u"name"], [(i, u"x")]))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert db.execute(Select(
+        columns=[Column(u"COUNT(*)")], tables=[Table(u"users")])) == [(160,)]
+    assert db.size <= 2
+    assert db.acquisitions == 161
+
+
+def test_stream(db):
+    db.execute(Insert(u"users", [u"id", u"name"], [(i, u"x") for i in range(10)]))
+
+    rows = db.stream(Select(columns=[Column(u"id")], tables=[Table(u"users")]))
+    assert next(rows) == (0,)
+    assert db.in_use == 1
+
+    rows.close()
+    assert db.in_use == 0
+    assert [r[0] for r in db.stream(Select(
+        columns=[Column(u"id")], tables=[Table(u"users")]), 3)] == list(range(10))
@@ -0,0 +1,62 @@
+import pickle
+import pytest
+import sys
+
+from lessql.expr.operators import Add
+from lessql.expr.query import Column, Select, Table
+from lessql.rows import Row, row_type, row_type_for
+
+
+def test_row_type():
+    User = row_type([u"id", u"name"])
+    user = User._make((1, u"foo"))
+
+    assert user == (1, u"foo")
+    assert (user.id, user.name) == (1, u"foo")
+    assert user._fields == (u"id", u"name")
+    assert user._asdict() == {u"id": 1, u"name": u"foo"}
+    assert repr(user) == u"Row(id=1, name={!r})".format(u"foo")
+    assert isinstance(user, Row)
+
+
+def test_row_type_cached():
+    assert row_type([u"a", u"b"]) is row_type((u"a", u"b"))
+    assert row_type([u"a", u"b"]) is not row_type([u"b", u"a"])
+
+
+def test_row_memory():
+    row = row_type([u"a", u"b", u"c"])._make((1, 2, 3))
+    assert sys.getsizeof(row) == sys.getsizeof((1, 2, 3))
+    assert not hasattr(row, "__dict__")
+
+
+@pytest.mark.parametrize("names, fields", [
+    ([u"COUNT(*)", u"a"], (u"_0", u"a")),
+    ([u"a", u"a"], (u"a", u"_1")),
+    ([u"class", u"_private", None], (u"_0", u"_1", u"_2")),
+])
+def test_row_type_invalid_names(names, fields):
+    assert row_type(names)._fields == fields
+    assert row_type(names)._names == tuple(names)
+
+
+def test_row_pickle():
+    row = row_type([u"x", u"y"])._make((1, 2))
+    assert pickle.loads(pickle.dumps(row)).y == 2
+
+
+def test_row_type_for_select():
+    expr = Select(columns=[Column(u"id", u"users"), Add(1, 2)])
+    assert row_type_for(expr)._names == (u"id", None)
+
+    description = [(u"id",) + (None,) * 6, (u"total",) + (None,) * 6]
+    assert row_type_for(expr, description)._fields == (u"id", u"total")
+
+
+def test_row_type_for_description():
+    description = [(u"a",) + (None,) * 6]
+    assert row_type_for(Select(tables=[Table(u"t")]), description)._fields == \
+        (u"a",)
+
+    with pytest.raises(ValueError):
+        row_type_for(Select(tables=[Table(u"t")]))
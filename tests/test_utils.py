@@ -1,6 +1,6 @@
 import pytest
 
-from collections import MutableMapping
+from lessql._compat import MutableMapping
 from lessql.utils import ClassDict, get_class
 
 
@@ -162,3 +162,37 @@ def test_get_class():
 def test_get_class_from_instance():
     assert get_class(A()) is A
     assert get_class(D()) is D
+
+
+def test_resolve():
+    d = ClassDict({A: "a", C: "c"})
+
+    assert d.resolve(A) == "a"
+    assert d.resolve(D) == "a"
+    assert d.resolve(C) == "c"
+
+    with pytest.raises(KeyError):
+        d.resolve(object)
+
+
+def test_resolve_memoized():
+    d = ClassDict({A: "a"})
+
+    assert d.resolve(D) == "a"
+    assert d.resolved == {D: "a"}
+
+
+def test_resolve_invalidated_on_set():
+    d = ClassDict({A: "a"})
+    assert d[D] == "a"
+
+    d[B] = "b"
+    assert d[D] == "b"
+
+
+def test_resolve_invalidated_on_delete():
+    d = ClassDict({A: "a", B: "b"})
+    assert d[D] == "b"
+
+    del d[B]
+    assert d[D] == "a"